@@ -1,8 +1,8 @@
 import streamlit as st
 import uuid
+from datetime import date
 from rdflib import Graph
 import os
-from openai import OpenAI
 from config import WCD_URL, WCD_API_KEY, OPENAI_API_KEY
 from dotenv import load_dotenv
 import os
@@ -11,21 +11,47 @@ load_dotenv()  # Load environment variables from .env
 
 from query_function.rdf_query import (
     download_rdf_file,
-    query_rdf,
+    query_rdf_index,
     get_concept_triples_for_term,
+    get_concept_triples_for_terms,
     get_all_narrower_concepts,
     sanitize_term
 )
+from query_function.expansion_cache import get_expansion_cache
+from query_function.mesh_index import get_mesh_index_stats
+from query_function.result_cache import get_search_result_cache
 from query_function.weaviate_queries import (
-    initialize_weaviate_client,
+    get_vector_client,
+    get_query_embedding_cache,
+    get_weaviate_client_stats,
+    reset_weaviate_client,
     query_weaviate_articles,
-    query_weaviate_terms
+    query_weaviate_terms,
+    query_weaviate_both,
+    fetch_articles_by_uuid,
+    collection_property_names
 )
-import ast
+from query_function.records import ARTICLE_TABLE_PROPERTIES, to_article_results
+from query_function.article_filter import ArticleFilter
+from query_function.summarize import (
+    DEFAULT_CONTEXT_TOKENS,
+    DEFAULT_MODEL,
+    DEFAULT_USER_QUERY,
+    article_text,
+    pack_abstracts,
+    stream_map_reduce_summary,
+    stream_summary
+)
+from query_function.summary_cache import get_summary_cache, summary_key
+from query_function.article_summaries import get_article_summary_store, with_article_summaries
 
 # --- Initialization ---
 if "article_results" not in st.session_state:
     st.session_state.article_results = []
+if "article_records" not in st.session_state:
+    st.session_state.article_records = []
+if "article_abstracts" not in st.session_state:
+    st.session_state.article_abstracts = {}  # Full abstracts fetched on demand, keyed by article UUID
 if "selected_terms" not in st.session_state:
     st.session_state.selected_terms = {}
 if "expanded_terms" not in st.session_state:
@@ -43,6 +69,52 @@ if "node_widget_ids" not in st.session_state:
 if "node_counter" not in st.session_state:
     st.session_state.node_counter = 0
 
+
+# --- Helpers to store search results in session state ---
+def store_article_results(article_results):
+    # Decode the raw results once; meshMajor becomes a list here
+    records = to_article_results(article_results)
+
+    # Store article_uris in the session state
+    st.session_state.article_uris = [record.article_uri for record in records if record.article_uri]
+    st.session_state.article_records = records
+    st.session_state.article_abstracts = {}
+
+    # Hybrid searches rank by fused score and have no distance
+    st.session_state.article_results = [
+        {
+            "Title": record.title,
+            **({"Distance": record.distance} if record.score is None else {"Score": record.score}),
+            "MeSH Terms": ", ".join(record.mesh_terms),
+        }
+        for record in records
+    ]
+
+
+def store_term_results(term_results):
+    # Collect unique sanitized terms
+    sanitized_terms = set()
+    for result in term_results:
+        sanitized_term = sanitize_term(result["properties"].get("meshTerm", "N/A"))
+        sanitized_terms.add(sanitized_term)
+
+    st.session_state.current_search_terms = list(sanitized_terms)
+
+    # Initialize selected_terms if needed
+    for term in st.session_state.current_search_terms:
+        if term not in st.session_state.selected_terms:
+            st.session_state.selected_terms[term] = False
+
+
+def reset_term_tree():
+    st.session_state.search_session_id += 1
+    # Clear displayed terms and expansions
+    st.session_state.current_search_terms.clear()
+    st.session_state.node_registry = {}
+    st.session_state.node_data = {}
+    st.session_state.node_counter = 0
+
+
 st.title("Graph RAG for Medicine")
 st.subheader("Semantic Search and Retrieval-Augmented Generation for Medical Journal Articles")
 
@@ -54,40 +126,87 @@ with tab_search:
     st.header("Search Articles (Vector Query)")
     query_text = st.text_input("Enter your vector search term (e.g., Mouth Neoplasms):", key="vector_search")
 
+    with st.expander("Search options"):
+        article_limit = st.number_input("Number of articles to retrieve:", min_value=1, max_value=200, value=10)
+        # 1.0 keeps the pure vector search; lower values mix in BM25 keyword matching
+        alpha = st.slider("Vector weight (alpha):", min_value=0.0, max_value=1.0, value=1.0, step=0.05)
+        filter_terms = st.text_input("Only articles with any of these MeSH terms (comma-separated):")
+        # Collections loaded before ingestion recorded publication dates cannot be filtered on them
+        try:
+            has_dates = "datePublished" in collection_property_names(get_vector_client(), "Article")
+        except Exception:
+            has_dates = False
+        filter_by_date = False
+        if has_dates:
+            filter_by_date = st.checkbox("Filter by publication date")
+        else:
+            st.caption("The Article collection has no publication dates to filter on.")
+        published_after = published_before = None
+        if filter_by_date:
+            published_after = st.date_input("Published on or after:", value=date(2000, 1, 1))
+            published_before = st.date_input("Published on or before:", value=date.today())
+
+    # Pre-filters are applied inside the vector query, so the candidates passed to Tab 3 already match them
+    article_filter = ArticleFilter(
+        mesh_terms=tuple(term.strip() for term in filter_terms.split(",")),
+        published_after=published_after,
+        published_before=published_before,
+    )
+    search_options = {
+        "limit": int(article_limit),
+        "alpha": alpha if alpha < 1.0 else None,
+        "filters": article_filter if not article_filter.is_empty() else None,
+    }
+
     if st.button("Search Articles", key="search_articles_btn"):
         try:
-            client = initialize_weaviate_client()
-            article_results = query_weaviate_articles(client, query_text)
-
-            # Extract URIs here
-            article_uris = [
-                result["properties"].get("article_URI")
-                for result in article_results
-                if result["properties"].get("article_URI")
-            ]
+            client = get_vector_client()
+            article_results = query_weaviate_articles(
+                client, query_text, embedding_cache=get_query_embedding_cache(),
+                return_properties=ARTICLE_TABLE_PROPERTIES, **search_options
+            )
 
-            # Store article_uris in the session state
-            st.session_state.article_uris = article_uris
-
-            st.session_state.article_results = [
-                {
-                    "Title": result["properties"].get("title", "N/A"),
-                    "Abstract": (result["properties"].get("abstractText", "N/A")[:100] + "..."),
-                    "Distance": result["distance"],
-                    "MeSH Terms": ", ".join(
-                        ast.literal_eval(result["properties"].get("meshMajor", "[]"))
-                        if result["properties"].get("meshMajor") else []
-                    ),
-                }
-                for result in article_results
-            ]
-            client.close()
+            store_article_results(article_results)
         except Exception as e:
+            reset_weaviate_client()
             st.error(f"Error during article search: {e}")
 
+    if st.button("Search Articles and MeSH Terms", key="search_both_btn"):
+        try:
+            # Both collections are queried concurrently, so this takes as long as the slower search. The article
+            # limit only applies to articles; the term search keeps its own, like "Search MeSH Terms"
+            reset_term_tree()
+            article_results, term_results = query_weaviate_both(
+                query_text, embedding_cache=get_query_embedding_cache(), article_properties=ARTICLE_TABLE_PROPERTIES,
+                term_properties=["meshTerm"], term_limit=10, **search_options
+            )
+            store_article_results(article_results)
+            store_term_results(term_results)
+        except Exception as e:
+            reset_weaviate_client()
+            st.error(f"Error during combined search: {e}")
+
     if st.session_state.article_results:
         st.write("**Search Results for Articles:**")
         st.table(st.session_state.article_results)
+
+        if st.checkbox("Show abstracts", key="show_abstracts_chk"):
+            # Fetch the abstracts not loaded yet in one batch
+            missing = [
+                record.uuid for record in st.session_state.article_records
+                if record.uuid not in st.session_state.article_abstracts
+            ]
+            if missing:
+                try:
+                    fetched = fetch_articles_by_uuid(get_vector_client(), missing)
+                    for article_uuid, properties in fetched.items():
+                        st.session_state.article_abstracts[article_uuid] = properties.get("abstractText") or "N/A"
+                except Exception as e:
+                    reset_weaviate_client()
+                    st.error(f"Error fetching abstracts: {e}")
+            for record in st.session_state.article_records:
+                with st.expander(record.title):
+                    st.write(st.session_state.article_abstracts.get(record.uuid, "N/A"))
     else:
         st.write("No articles found yet.")
 
@@ -166,6 +285,9 @@ def display_term(term, path=None, visited=None, level=0):
             for n in narrower_concepts:
                 narrower_concepts[n] = list(dict.fromkeys(narrower_concepts[n]))
 
+            # Resolve the children's alternative names in one batched request so expanding them is a cache hit
+            get_concept_triples_for_terms([child for children in narrower_concepts.values() for child in children])
+
             # Store processed data
             st.session_state.node_data[node_id]["alt_names"] = alt_names
             st.session_state.node_data[node_id]["narrower_concepts"] = narrower_concepts
@@ -208,32 +330,17 @@ with tab_refine:
     mesh_query_text = st.text_input("Enter a MeSH term for refinement:", key="mesh_search_input")
 
     if st.button("Search MeSH Terms", key="search_mesh_terms_btn"):
-        st.session_state.search_session_id += 1
         try:
-            # Clear displayed terms and expansions
-            st.session_state.current_search_terms.clear()
-            st.session_state.node_registry = {}
-            st.session_state.node_data = {}
-            st.session_state.node_counter = 0
+            reset_term_tree()
+            client = get_vector_client()
+            term_results = query_weaviate_terms(
+                client, mesh_query_text, embedding_cache=get_query_embedding_cache(), return_properties=["meshTerm"]
+            )
 
-            client = initialize_weaviate_client()
-            term_results = query_weaviate_terms(client, mesh_query_text)
+            store_term_results(term_results)
 
-            # Collect unique sanitized terms
-            sanitized_terms = set()
-            for result in term_results:
-                sanitized_term = sanitize_term(result["properties"].get("meshTerm", "N/A"))
-                sanitized_terms.add(sanitized_term)
-
-            st.session_state.current_search_terms = list(sanitized_terms)
-
-            # Initialize selected_terms if needed
-            for term in st.session_state.current_search_terms:
-                if term not in st.session_state.selected_terms:
-                    st.session_state.selected_terms[term] = False
-
-            client.close()
         except Exception as e:
+            reset_weaviate_client()
             st.error(f"Error during term search: {e}")
 
     # Display only current search terms (fresh results)
@@ -254,12 +361,39 @@ with st.sidebar:
     else:
         st.write("No terms selected yet.")
 
+    client_stats = get_weaviate_client_stats()
+    st.caption(
+        f"Weaviate connection: {client_stats['connects']} connects, {client_stats['reuses']} reuses, "
+        f"~{client_stats['seconds_saved']:.1f}s of handshakes saved"
+    )
+
+    result_stats = get_search_result_cache().stats()
+    st.caption(
+        f"Search result cache: {result_stats['hits']} hits, {result_stats['misses']} misses, "
+        f"{result_stats['stale_evictions']} invalidated by ingestion"
+    )
+
+    embedding_cache = get_query_embedding_cache()
+    if embedding_cache is not None:
+        embedding_stats = embedding_cache.stats()
+        st.caption(
+            f"Query embedding cache: {embedding_stats['hit_rate']:.0%} hit rate, "
+            f"~{embedding_stats['seconds_saved']:.1f}s of embedding saved"
+        )
+
+    expansion_stats = get_expansion_cache().stats()
+    st.caption(
+        f"MeSH expansion cache: {expansion_stats['hits']} hits, {expansion_stats['misses']} misses "
+        f"({expansion_stats['hit_rate']:.0%} hit rate)"
+    )
+
 
 # --- TAB 3: Filter & Summarize ---
 with tab_filter:
     st.header("Filter and Summarize Results")
     final_terms = [t for t, selected in st.session_state.selected_terms.items() if selected]
     LOCAL_FILE_PATH = "data/PubMedGraph.ttl"
+    top_k = st.number_input("Number of articles to keep:", min_value=1, max_value=500, value=10, step=1)
 
     if final_terms:
         st.write("**Final Bucket of Terms for Filtering:**")
@@ -278,49 +412,25 @@ with tab_filter:
                 # Check if we have URIs from tab 1
                 if "article_uris" in st.session_state and st.session_state.article_uris:
                     article_uris = st.session_state.article_uris
-
-                    # Convert list of URIs into a string for the VALUES clause or FILTER
-                    article_uris_string = ", ".join([f"<{str(uri)}>" for uri in article_uris])
-
-                    SPARQL_QUERY = """
-                    PREFIX schema: <http://schema.org/>
-                    PREFIX ex: <http://example.org/>
-
-                    SELECT ?article ?title ?abstract ?datePublished ?access ?meshTerm
-                    WHERE {{
-                      ?article a ex:Article ;
-                               schema:name ?title ;
-                               schema:description ?abstract ;
-                               schema:datePublished ?datePublished ;
-                               ex:access ?access ;
-                               schema:about ?meshTerm .
-
-                      ?meshTerm a ex:MeSHTerm .
-
-                      FILTER (?article IN ({article_uris}))
-                    }}
-                    """
-                    # Insert the article URIs into the query
-                    query = SPARQL_QUERY.format(article_uris=article_uris_string)
                 else:
                     st.write("No articles selected from Tab 1.")
                     st.stop()
 
                 # Query the RDF and save results in session state
-                top_articles = query_rdf(LOCAL_FILE_PATH, query, final_terms)
+                top_articles = query_rdf_index(LOCAL_FILE_PATH, article_uris, final_terms, top_k=int(top_k))
                 st.session_state.filtered_articles = top_articles
 
-                if top_articles:
-                    # Combine abstracts from top articles and save in session state
-                    def combine_abstracts(ranked_articles):
-                        combined_text = " ".join(
-                            [f"Title: {data['title']} Abstract: {data['abstract']}" for article_uri, data in
-                             ranked_articles]
-                        )
-                        return combined_text
-
+                index_stats = get_mesh_index_stats()
+                st.caption(
+                    f"MeSH index from {index_stats['source']} "
+                    f"({'already loaded' if index_stats['cached'] else 'loaded'} in {index_stats['seconds']:.2f}s)"
+                )
 
-                    st.session_state.combined_text = combine_abstracts(top_articles)
+                if top_articles:
+                    # Pack the abstracts of the top articles, by rank, into the prompt's token budget
+                    packed = pack_abstracts(top_articles, max_tokens=DEFAULT_CONTEXT_TOKENS)
+                    st.session_state.combined_text = packed["text"]
+                    st.session_state.packed_context = packed
 
                 else:
                     st.write("No articles found for the selected terms.")
@@ -329,7 +439,7 @@ with tab_filter:
 
         # Summarize with LLM button
         if "user_query" not in st.session_state:
-            st.session_state.user_query = "Summarize the key information here in bullet points. Make it understandable to someone without a medical degree."
+            st.session_state.user_query = DEFAULT_USER_QUERY
 
         # Update the user query directly from the text area
         st.session_state.user_query = st.text_area(
@@ -350,37 +460,82 @@ with tab_filter:
                     st.write(f"- {mesh_term}")
                 st.write("---")
 
+        summary_mode = st.radio(
+            "Summarization mode:",
+            ["Single prompt", "Map-reduce"],
+            horizontal=True,
+            help="Map-reduce summarizes groups of articles in parallel and combines them; use it for large "
+                 "result sets that do not fit one prompt.",
+        )
+        article_summary_store = get_article_summary_store()
+        use_article_summaries = st.checkbox(
+            "Build the answer from precomputed article summaries",
+            value=False,
+            disabled=article_summary_store is None,
+            help="Uses the short per-article summaries of `python -m query_function.article_summaries` instead "
+                 "of full abstracts, where available.",
+        )
+
+        # Pack the text that will actually be sent, so the counts below describe the model's input
+        ranked_articles = st.session_state.get("filtered_articles") or []
+        packed = st.session_state.get("packed_context")
+        summarized = 0
+        if use_article_summaries and ranked_articles:
+            ranked_articles, summarized = with_article_summaries(ranked_articles, article_summary_store)
+            packed = pack_abstracts(ranked_articles, max_tokens=DEFAULT_CONTEXT_TOKENS)
+        if packed and packed["articles"]:
+            st.caption(
+                f"Summarizing {packed['articles']} of {packed['total']} articles ({packed['tokens']} tokens"
+                f"{', last abstract cut to fit' if packed['truncated'] else ''})"
+            )
+
         # Summarize with LLM button
         if st.button("Summarize with LLM"):
             try:
                 if "combined_text" in st.session_state and st.session_state["combined_text"].strip():
-                    combined_text = st.session_state["combined_text"]
+                    combined_text = packed["text"] if packed else st.session_state["combined_text"]
                     user_query = st.session_state.user_query
+                    map_reduce = summary_mode == "Map-reduce"
+                    if use_article_summaries:
+                        st.caption(f"Using precomputed summaries for {summarized} of {len(ranked_articles)} articles")
+                    if map_reduce:
+                        # Every ranked article goes into a map-reduce summary, not just the packed ones
+                        combined_text = "\n".join(article_text(data) for _, data in ranked_articles)
+                    summary_cache = get_summary_cache()
+                    cache_key = summary_key(
+                        [article_uri for article_uri, _ in ranked_articles], user_query,
+                        f"{DEFAULT_MODEL}/map-reduce" if map_reduce else DEFAULT_MODEL, combined_text
+                    )
 
-
-                    def generate_summary(combined_text, user_query):
-                        client = OpenAI(api_key=OPENAI_API_KEY)
-
-                        GPT_MODELS = ["gpt-4o", "gpt-4o-mini"]
-                        response = client.chat.completions.create(
-                            messages=[
-                                {'role': 'system', 'content': 'You summarize medical texts.'},
-                                {'role': 'user', 'content': f"{user_query}\n\n{combined_text}"},
-                            ],
-                            model=GPT_MODELS[1],
-                            temperature=0,
-                        )
-
-                        # Extract the summary from the assistant's response
-                        summary = response.choices[0].message.content.strip()
-                        return summary
-
-
-                    # Generate and display the summary
-                    with st.spinner("Generating summary..."):
-                        summary = generate_summary(combined_text, user_query)
                     st.subheader("Summary")
-                    st.write(summary)
+                    cached = summary_cache.get(cache_key)
+                    if cached is not None:
+                        st.write(cached["summary"])
+                        st.caption(
+                            f"Summary cache hit: saved {cached['generation_seconds']:.2f}s "
+                            f"({summary_cache.stats()['seconds_saved']:.1f}s saved so far)"
+                        )
+                    else:
+                        # Stream the summary to the page as it is generated, then cache it
+                        timings = {}
+                        if map_reduce:
+                            summary = st.write_stream(
+                                stream_map_reduce_summary(ranked_articles, user_query, stats=timings)
+                            )
+                            st.caption(
+                                f"Summarized {timings['chunks'] - timings['failed_chunks']} of "
+                                f"{timings['chunks']} article groups in {timings['map_seconds']:.2f}s"
+                            )
+                        else:
+                            summary = st.write_stream(stream_summary(combined_text, user_query, timings=timings))
+                        # Answers missing article groups are not cached, so a later click can complete them
+                        if isinstance(summary, str) and summary.strip() and not timings.get("failed_chunks"):
+                            summary_cache.set(cache_key, summary.strip(), timings["total_seconds"], DEFAULT_MODEL)
+                        if "first_token_seconds" in timings:
+                            st.caption(
+                                f"Summary cache miss: first token after {timings['first_token_seconds']:.2f}s, "
+                                f"complete after {timings['total_seconds']:.2f}s"
+                            )
                 else:
                     st.error("No combined text available for summarization. Please filter articles first.")
             except Exception as e:
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Optional, Tuple
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+# Function to spell a MeSH term the ways it appears as an element of a meshMajor list string, e.g. 'Asthma'
+# or "Alzheimer's Disease"
+def _quoted(term):
+    return f"'{term}'", f'"{term}"'
+
+
+@dataclass(frozen=True)
+class ArticleFilter:
+    """
+    Pre-filter for Article vector searches, applied inside the vector query instead of after it.
+
+    mesh_terms keeps articles whose meshMajor list contains any of the terms (all of them with match_all) as a
+    whole element, so "Neoplasms" does not match "Mouth Neoplasms". The dates bound datePublished inclusively.
+    Instances are hashable, so they can be part of a cache key.
+    """
+
+    mesh_terms: Tuple[str, ...] = ()
+    match_all: bool = False
+    published_after: Optional[date] = None
+    published_before: Optional[date] = None
+
+    def __post_init__(self):
+        object.__setattr__(self, "mesh_terms", tuple(term for term in self.mesh_terms if term))
+        object.__setattr__(self, "published_after", _as_date(self.published_after))
+        object.__setattr__(self, "published_before", _as_date(self.published_before))
+
+    def is_empty(self):
+        return not self.mesh_terms and self.published_after is None and self.published_before is None
+
+    def to_weaviate(self):
+        """Returns the equivalent Weaviate filter, or None when nothing is filtered."""
+        from weaviate.classes.query import Filter
+
+        conditions = []
+        if self.mesh_terms:
+            # meshMajor holds the list as text, so each term is matched as a quoted element like matches() does
+            term_filters = [
+                Filter.any_of([Filter.by_property("meshMajor").like(f"*{element}*") for element in _quoted(term)])
+                for term in self.mesh_terms
+            ]
+            conditions.append(Filter.all_of(term_filters) if self.match_all else Filter.any_of(term_filters))
+        if self.published_after is not None:
+            conditions.append(Filter.by_property("datePublished").greater_or_equal(
+                datetime.combine(self.published_after, datetime.min.time(), tzinfo=timezone.utc)
+            ))
+        if self.published_before is not None:
+            conditions.append(Filter.by_property("datePublished").less_or_equal(
+                datetime.combine(self.published_before, datetime.max.time(), tzinfo=timezone.utc)
+            ))
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else Filter.all_of(conditions)
+
+    def matches(self, properties):
+        """Evaluates the filter on an object's properties, for backends that filter in-process."""
+        if self.mesh_terms:
+            mesh_major = str(properties.get("meshMajor") or "").casefold()
+            found = [
+                any(element.casefold() in mesh_major for element in _quoted(term)) for term in self.mesh_terms
+            ]
+            if not (all(found) if self.match_all else any(found)):
+                return False
+        if self.published_after is not None or self.published_before is not None:
+            published = properties.get("datePublished")
+            if not published:
+                return False
+            published = _as_date(published)
+            if self.published_after is not None and published < self.published_after:
+                return False
+            if self.published_before is not None and published > self.published_before:
+                return False
+        return True
@@ -0,0 +1,197 @@
+"""
+Precomputed lay summaries of single articles, reused by every query that ranks them.
+
+An offline job summarizes each article of the PubMed CSV once and stores the result in a SQLite table, keyed
+by article URI together with a hash of the title and abstract, so an edited article is summarized again.
+Tab 3 can then build its answer from these short summaries instead of the full abstracts.
+
+Precompute (or top up) the table with:
+
+    python -m query_function.article_summaries data/PubMed_Dataset.csv --limit 5000 --workers 8
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from query_function.pubmed_csv import read_article_chunks
+from query_function.summarize import DEFAULT_MODEL, MAP_WORKERS, article_text, build_messages, complete_with_retry
+from query_function.uris import article_uris
+
+ARTICLE_SUMMARY_PROMPT = (
+    "Summarize this article in two or three plain sentences for someone without a medical degree: what was "
+    "studied, how, and what was found."
+)
+
+
+# Function to hash the text an article summary is made from
+def article_content_hash(data):
+    return hashlib.sha256(article_text(data).encode("utf-8")).hexdigest()
+
+
+class ArticleSummaryStore:
+    """SQLite table of article URI -> lay summary, with the content hash each summary was made from."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS article_summaries ("
+            "article_uri TEXT PRIMARY KEY, content_hash TEXT NOT NULL, summary TEXT NOT NULL, "
+            "model TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def get_many(self, articles):
+        """
+        Args:
+            articles (list): (article_uri, data) pairs, data holding title and abstract.
+
+        Returns:
+            dict: article_uri -> summary, for the articles whose summary is up to date with their content.
+        """
+        hashes = {str(uri): article_content_hash(data) for uri, data in articles}
+        summaries = {}
+        uris = list(hashes)
+        with self._lock:
+            for start in range(0, len(uris), 500):
+                batch = uris[start:start + 500]
+                rows = self._connection.execute(
+                    "SELECT article_uri, content_hash, summary FROM article_summaries "
+                    f"WHERE article_uri IN ({', '.join('?' * len(batch))})",
+                    batch
+                )
+                summaries.update({uri: summary for uri, content_hash, summary in rows if hashes[uri] == content_hash})
+        return summaries
+
+    def put_many(self, rows, model=DEFAULT_MODEL):
+        """Stores (article_uri, content_hash, summary) rows."""
+        now = time.time()
+        with self._lock:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO article_summaries VALUES (?, ?, ?, ?, ?)",
+                    [(str(uri), content_hash, summary, model, now) for uri, content_hash, summary in rows]
+                )
+
+    def count(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM article_summaries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_article_summary_store = None
+_article_summary_store_lock = threading.Lock()
+
+
+# Function to get the article summary table at ARTICLE_SUMMARY_STORE_PATH, if the job has written one
+def get_article_summary_store(create=False):
+    global _article_summary_store
+    path = os.getenv("ARTICLE_SUMMARY_STORE_PATH", "data/article_summaries.sqlite")
+    if _article_summary_store is None and (create or os.path.exists(path)):
+        with _article_summary_store_lock:
+            if _article_summary_store is None:
+                _article_summary_store = ArticleSummaryStore(path)
+    return _article_summary_store
+
+
+# Function to swap the abstracts of ranked articles for their precomputed summaries, where there is one
+def with_article_summaries(ranked_articles, store):
+    """
+    Returns (articles, summarized): the ranked (article_uri, data) pairs with data["abstract"] replaced by
+    the stored summary when one is up to date, and how many were replaced. Articles without a summary keep
+    their full abstract.
+    """
+    summaries = store.get_many(ranked_articles) if store is not None else {}
+    articles = [
+        (uri, {**data, "abstract": summaries[str(uri)]}) if str(uri) in summaries else (uri, data)
+        for uri, data in ranked_articles
+    ]
+    return articles, sum(str(uri) in summaries for uri, _ in ranked_articles)
+
+
+# Function to summarize articles concurrently and store the summaries
+def summarize_articles(articles, store, client=None, model=DEFAULT_MODEL, max_workers=MAP_WORKERS):
+    """
+    Args:
+        articles (list): (article_uri, data) pairs to summarize.
+        store (ArticleSummaryStore): Receives the summaries.
+
+    Returns:
+        tuple: (summarized, failed) counts. Failed articles are retried by the next run.
+    """
+    def summarize(article):
+        uri, data = article
+        try:
+            summary = complete_with_retry(
+                build_messages(article_text(data), ARTICLE_SUMMARY_PROMPT), client=client, model=model
+            )
+        except Exception:
+            return None
+        return uri, article_content_hash(data), summary
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        rows = [row for row in executor.map(summarize, articles) if row is not None]
+    store.put_many(rows, model=model)
+    return len(rows), len(articles) - len(rows)
+
+
+# Function to precompute the summaries of every article in the CSV that has no up-to-date summary yet
+def precompute_article_summaries(csv_path, store, limit=None, chunksize=1000, client=None, model=DEFAULT_MODEL,
+                                 max_workers=MAP_WORKERS, progress=None):
+    stats = {"articles": 0, "summarized": 0, "up_to_date": 0, "failed": 0}
+    start = time.perf_counter()
+    for _, chunk in read_article_chunks(csv_path, chunksize=chunksize, limit=limit):
+        articles = [
+            (uri, {"title": title, "abstract": abstract})
+            for uri, title, abstract in zip(article_uris(chunk["Title"]), chunk["Title"], chunk["abstractText"])
+        ]
+        known = store.get_many(articles)
+        missing = [article for article in articles if str(article[0]) not in known]
+        summarized, failed = summarize_articles(missing, store, client=client, model=model, max_workers=max_workers)
+        stats["articles"] += len(articles)
+        stats["up_to_date"] += len(articles) - len(missing)
+        stats["summarized"] += summarized
+        stats["failed"] += failed
+        stats["seconds"] = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute lay summaries of the PubMed articles.")
+    parser.add_argument("csv", help="PubMed CSV, e.g. data/PubMed_Dataset.csv")
+    parser.add_argument("--store", help="Summary table (default: ARTICLE_SUMMARY_STORE_PATH or "
+                                        "data/article_summaries.sqlite)")
+    parser.add_argument("--limit", type=int, help="Only summarize the first LIMIT rows")
+    parser.add_argument("--chunksize", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=MAP_WORKERS, help="Concurrent completion calls")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    args = parser.parse_args(argv)
+
+    store = ArticleSummaryStore(args.store) if args.store else get_article_summary_store(create=True)
+
+    def progress(stats):
+        print(f"{stats['articles']} articles, {stats['summarized']} summarized, {stats['up_to_date']} up to date, "
+              f"{stats['failed']} failed")
+
+    stats = precompute_article_summaries(
+        args.csv, store, limit=args.limit, chunksize=args.chunksize, model=args.model, max_workers=args.workers,
+        progress=progress
+    )
+    print(f"Summarized {stats['summarized']} articles ({stats['up_to_date']} up to date, {stats['failed']} failed) "
+          f"in {stats['seconds']:.1f}s; {store.count()} summaries stored")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query_text(text):
+    """Cache key for a query: case-folded with whitespace collapsed, so "Mouth  Cancer" hits "mouth cancer"."""
+    return " ".join(text.casefold().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query vectors in front of a client-side embedding function.
+
+    With it, searches send near_vector queries instead of near_text, so repeated queries skip the
+    server-side vectorizer entirely. One instance is meant to be shared by article and term search.
+    """
+
+    def __init__(self, embed, maxsize=1024):
+        self.embed_texts = embed
+        self.maxsize = maxsize
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.embed_seconds = 0.0
+
+    def embed(self, query_text):
+        """
+        Returns the (read-only) vector for a query, embedding it only on a cache miss. The normalized text
+        is only the cache key; the query is embedded as typed, like the server-side vectorizer would.
+        """
+        key = normalize_query_text(query_text)
+        with self._lock:
+            vector = self._vectors.get(key)
+            if vector is not None:
+                self._vectors.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        start = time.perf_counter()
+        vector = np.asarray(self.embed_texts([query_text])[0], dtype=np.float32)
+        vector.setflags(write=False)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.misses += 1
+            self.embed_seconds += elapsed
+            self._vectors[key] = vector
+            self._vectors.move_to_end(key)
+            while len(self._vectors) > self.maxsize:
+                self._vectors.popitem(last=False)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            average_embed_seconds = self.embed_seconds / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._vectors),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "average_embed_seconds": average_embed_seconds,
+                "seconds_saved": self.hits * average_embed_seconds,
+            }
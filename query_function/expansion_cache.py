@@ -0,0 +1,162 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExpansionCache:
+    """
+    Bounded LRU cache with per-entry TTL for MeSH expansion lookups, optionally persisted to SQLite.
+
+    Entries are keyed on (source, kind, sanitized term), where kind is "concept_triples" or "narrower_concepts",
+    e.g. ("sparql:https://id.nlm.nih.gov/mesh/sparql", "narrower_concepts", "Mouth Neoplasms"). Answers from one
+    MeSH source (a local store or a SPARQL endpoint) are never served for another. The in-memory layer answers
+    repeat lookups within a process; the SQLite file lets warm entries survive restarts.
+    """
+
+    def __init__(self, maxsize=2048, ttl=7 * 24 * 3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # (source, kind, term) -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._connection = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(expansion_cache)")]
+            if columns and "source" not in columns:
+                # Entries written before the source was part of the key cannot be attributed to one
+                self._connection.execute("DROP TABLE expansion_cache")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS expansion_cache ("
+                "source TEXT NOT NULL, kind TEXT NOT NULL, term TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (source, kind, term))"
+            )
+            self._connection.commit()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _load_from_disk(self, key, now):
+        row = self._connection.execute(
+            "SELECT value, expires_at FROM expansion_cache WHERE source = ? AND kind = ? AND term = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            self._connection.execute("DELETE FROM expansion_cache WHERE source = ? AND kind = ? AND term = ?", key)
+            self._connection.commit()
+            self.expired += 1
+            return None
+        self._connection.execute(
+            "UPDATE expansion_cache SET accessed_at = ? WHERE source = ? AND kind = ? AND term = ?", (now, *key)
+        )
+        self._connection.commit()
+        return expires_at, json.loads(value)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, kind, term, source=""):
+        """Returns a copy of the cached list for (source, kind, term), or None on a miss or expired entry."""
+        key = (source, kind, term)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                # Drop the persisted copy too; it expires at the same time
+                del self._entries[key]
+                if self._connection is not None:
+                    self._connection.execute(
+                        "DELETE FROM expansion_cache WHERE source = ? AND kind = ? AND term = ?", key
+                    )
+                    self._connection.commit()
+                self.expired += 1
+                self.misses += 1
+                return None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+
+            if self._connection is not None:
+                entry = self._load_from_disk(key, now)
+                if entry is not None:
+                    self._remember(key, entry)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return list(entry[1])
+
+            self.misses += 1
+            return None
+
+    def set(self, kind, term, value, source=""):
+        key = (source, kind, term)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, (expires_at, list(value)))
+            if self._connection is not None:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO expansion_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, kind, term, json.dumps(list(value)), expires_at, now)
+                )
+                # Keep the file bounded too: drop expired rows and the least recently used beyond maxsize
+                self._connection.execute("DELETE FROM expansion_cache WHERE expires_at <= ?", (now,))
+                self._connection.execute(
+                    "DELETE FROM expansion_cache WHERE rowid IN ("
+                    "SELECT rowid FROM expansion_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,)
+                )
+                self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM expansion_cache")
+                self._connection.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_expansion_cache = None
+_expansion_cache_lock = threading.Lock()
+
+
+# Function to replace the process-wide expansion cache, e.g. with a different file, size or TTL
+def configure_expansion_cache(path=None, maxsize=2048, ttl=7 * 24 * 3600):
+    global _expansion_cache
+    with _expansion_cache_lock:
+        _expansion_cache = ExpansionCache(maxsize=maxsize, ttl=ttl, path=path)
+    return _expansion_cache
+
+
+# Function to get the process-wide expansion cache, persisted at MESH_EXPANSION_CACHE_PATH
+def get_expansion_cache():
+    global _expansion_cache
+    if _expansion_cache is None:
+        with _expansion_cache_lock:
+            if _expansion_cache is None:
+                _expansion_cache = ExpansionCache(
+                    path=os.getenv("MESH_EXPANSION_CACHE_PATH", "data/mesh_expansion_cache.sqlite")
+                )
+    return _expansion_cache
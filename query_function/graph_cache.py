@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+from rdflib import Graph
+
+from query_function.rdf_snapshot import load_fresh_snapshot_graph, snapshot_path_for
+
+
+class GraphCache:
+    """
+    Process-wide cache of parsed RDF graphs.
+
+    Entries are keyed by the absolute file path and validated against the file's mtime and size,
+    so a graph is parsed once per process and transparently reloaded when the file on disk changes.
+    When an up-to-date compiled snapshot (see rdf_snapshot) sits next to the file it is memory-mapped
+    instead of parsing the file.
+    Because the cache lives at module level it survives Streamlit reruns and is shared by all sessions.
+    """
+
+    def __init__(self):
+        self._entries = {}  # absolute path -> (signature, graph)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.snapshot_loads = 0
+        self.last_load_seconds = 0.0
+        self.total_load_seconds = 0.0
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _signature(self, path):
+        signature = (self._stat(path), self._stat(snapshot_path_for(path)))
+        if signature == (None, None):
+            raise FileNotFoundError(f"RDF file not found: {path}")
+        return signature
+
+    def _lookup(self, path, signature):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def get(self, local_file_path, format="ttl"):
+        """
+        Returns the parsed graph for a file, parsing it only on first use or after the file changed.
+
+        Args:
+            local_file_path (str): Path to the RDF file.
+            format (str): rdflib parser format of the file.
+
+        Returns:
+            Graph: The parsed RDF graph.
+        """
+        path = os.path.abspath(local_file_path)
+        signature = self._signature(path)
+
+        graph = self._lookup(path, signature)
+        if graph is not None:
+            return graph
+
+        # Serialize loads so concurrent sessions don't parse the same file twice
+        with self._load_lock:
+            graph = self._lookup(path, signature)
+            if graph is not None:
+                return graph
+
+            start = time.perf_counter()
+            graph = load_fresh_snapshot_graph(path)
+            from_snapshot = graph is not None
+            if not from_snapshot:
+                graph = Graph()
+                graph.parse(path, format=format)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                if path in self._entries:
+                    self.reloads += 1
+                self.misses += 1
+                self.snapshot_loads += from_snapshot
+                self.last_load_seconds = elapsed
+                self.total_load_seconds += elapsed
+                self._entries[path] = (signature, graph)
+            return graph
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "snapshot_loads": self.snapshot_loads,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "last_load_seconds": self.last_load_seconds,
+                "total_load_seconds": self.total_load_seconds,
+            }
+
+
+_graph_cache = GraphCache()
+
+
+# Function to get a parsed RDF graph from the process-wide cache
+def load_graph(local_file_path, format="ttl"):
+    return _graph_cache.get(local_file_path, format=format)
+
+
+def get_graph_cache_stats():
+    return _graph_cache.stats()
+
+
+def clear_graph_cache():
+    _graph_cache.clear()
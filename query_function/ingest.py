@@ -0,0 +1,432 @@
+"""
+Streaming ingestion of the PubMed CSV into the Article and term vector collections.
+
+The CSV is read in chunks, so memory stays flat however large the dataset is. meshMajor is parsed for a
+whole chunk at once with a regex, and every object gets a deterministic UUID (generate_uuid5 of its URI or
+term), so re-running an ingestion upserts the same objects instead of duplicating them.
+
+With a checkpoint file, ingestion is incremental: a content hash per article is kept in SQLite, so only new
+or changed rows are embedded and upserted, and an interrupted run resumes after its last committed chunk.
+Pointing --graph at the RDF graph regenerates only the triples of those rows. A compiled MeSH term index of
+the graph is kept current through its delta file (see mesh_index); a compiled snapshot goes out of date
+until --recompile (or rdf_snapshot) rebuilds it offline.
+
+Load into Weaviate, or into a local vector store directory usable through LOCAL_VECTOR_STORE_PATH:
+
+    python -m query_function.ingest data/PubMed_Dataset.csv --weaviate
+    python -m query_function.ingest data/PubMed_Dataset.csv --local data/vectors
+    python -m query_function.ingest data/PubMed_Dataset.csv --weaviate \
+        --checkpoint data/ingest_checkpoint.sqlite --graph data/PubMedGraph.ttl [--recompile]
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+from weaviate.util import generate_uuid5
+
+from query_function.mesh_index import compile_mesh_index, mesh_index_path_for, update_mesh_index_delta
+from query_function.pubmed_csv import ARTICLE_COLUMNS, parse_mesh_major_column, read_article_chunks
+from query_function.rdf_build import (
+    MeshTermURIs,
+    apply_graph_delta,
+    article_dates,
+    article_ntriples,
+    ensure_ntriples,
+    term_ntriples,
+)
+from query_function.rdf_snapshot import compile_snapshot, snapshot_path_for
+from query_function.result_cache import bump_collection_epoch
+from query_function.uris import article_uris, get_term_uri_table, term_object_uri
+
+
+# Function to hash the content of every row of a chunk, to detect changed articles between runs
+def content_hashes(chunk):
+    return pd.util.hash_pandas_object(chunk[ARTICLE_COLUMNS], index=False).map("{:016x}".format).tolist()
+
+
+# Function to collapse rows of a chunk that map to the same article (same title, so same URI and UUID)
+def collapse_duplicate_articles(chunk):
+    """
+    Keeps the last row of every article URI, like a later chunk overwrites an earlier one, so duplicates
+    reach the sink and checkpoint once. Returns the collapsed chunk and the number of rows merged away.
+    """
+    duplicated = article_uris(chunk["Title"]).duplicated(keep="last")
+    return chunk[~duplicated.to_numpy()], int(duplicated.sum())
+
+
+# Function to turn a chunk into Article objects and the list of MeSH terms of every row
+def build_article_objects(chunk):
+    """Returns the article URIs and parsed MeSH terms (Series aligned with the chunk), UUIDs and properties."""
+    uris = article_uris(chunk["Title"])
+    mesh_terms = parse_mesh_major_column(chunk["meshMajor"])
+    uuids = [generate_uuid5(uri) for uri in uris]
+    properties = [
+        {
+            "title": title,
+            "abstractText": abstract,
+            "article_URI": uri,
+            "meshMajor": mesh_major,
+            "datePublished": f"{published}T00:00:00Z",
+        }
+        for title, abstract, uri, mesh_major, published in zip(
+            chunk["Title"], chunk["abstractText"], uris, chunk["meshMajor"], article_dates(uris)
+        )
+    ]
+    return uris, mesh_terms, uuids, properties
+
+
+# Function to build term objects for terms not seen before
+def build_term_objects(new_terms):
+    uuids = [generate_uuid5(term) for term in new_terms]
+    properties = [{"meshTerm": term, "URI": term_object_uri(term)} for term in new_terms]
+    return uuids, properties
+
+
+class IngestCheckpoint:
+    """
+    SQLite record of what has been ingested: a content hash per article UUID, the MeSH terms already
+    loaded, the row to resume each source from, and graph updates not applied yet.
+
+    Each chunk is committed in one transaction after the sink has stored it, so a crash loses at most the
+    chunk in flight, and re-sending that chunk is an idempotent upsert.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS articles (uuid TEXT PRIMARY KEY, content_hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS runs (source TEXT PRIMARY KEY, next_row INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS graph_pending (
+                subject TEXT PRIMARY KEY, replaces INTEGER NOT NULL, ntriples TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS graphs (path TEXT PRIMARY KEY);
+            """
+        )
+        self._connection.commit()
+
+    def _lookup(self, query, keys, batch_size=500):
+        keys = list(keys)
+        rows = []
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            rows.extend(self._connection.execute(query.format(",".join("?" * len(batch))), batch))
+        return rows
+
+    def article_hashes(self, uuids):
+        """Returns {uuid: content_hash} for the UUIDs already ingested."""
+        return dict(self._lookup("SELECT uuid, content_hash FROM articles WHERE uuid IN ({})", uuids))
+
+    def known_terms(self, terms):
+        return {row[0] for row in self._lookup("SELECT term FROM terms WHERE term IN ({})", terms)}
+
+    def resume_row(self, source):
+        row = self._connection.execute("SELECT next_row FROM runs WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else 0
+
+    def commit_chunk(self, source, next_row, article_hashes, terms, graph_updates):
+        """
+        Records one stored chunk: its article hashes, new terms, pending graph updates (subject, replaces,
+        ntriples) and the row to resume from.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?)", list(article_hashes.items())
+            )
+            self._connection.executemany("INSERT OR IGNORE INTO terms VALUES (?)", [(term,) for term in terms])
+            self._connection.executemany(
+                "INSERT INTO graph_pending VALUES (?, ?, ?) ON CONFLICT(subject) DO UPDATE SET "
+                "replaces = MAX(replaces, excluded.replaces), ntriples = excluded.ntriples",
+                graph_updates
+            )
+            self._connection.execute("INSERT OR REPLACE INTO runs VALUES (?, ?)", (source, next_row))
+
+    def finish_run(self, source):
+        with self._connection:
+            self._connection.execute("DELETE FROM runs WHERE source = ?", (source,))
+
+    def graph_initialized(self, graph_path):
+        row = self._connection.execute(
+            "SELECT 1 FROM graphs WHERE path = ?", (os.path.abspath(graph_path),)
+        ).fetchone()
+        return row is not None
+
+    def _pending_ntriples(self):
+        for (ntriples,) in self._connection.execute("SELECT ntriples FROM graph_pending"):
+            yield ntriples
+
+    def apply_graph_updates(self, graph_path):
+        """
+        Streams the pending graph updates into an N-Triples graph file and its indexes (see
+        update_graph_indexes); returns the number of subjects updated.
+        """
+        pending = self._connection.execute("SELECT COUNT(*) FROM graph_pending").fetchone()[0]
+        if pending:
+            replaced = [row[0] for row in self._connection.execute(
+                "SELECT subject FROM graph_pending WHERE replaces"
+            )]
+            stat = os.stat(graph_path)
+            apply_graph_delta(graph_path, self._pending_ntriples(), replaced)
+            update_graph_indexes(graph_path, self._pending_ntriples(), replaced, (stat.st_mtime_ns, stat.st_size))
+        with self._connection:
+            self._connection.execute("DELETE FROM graph_pending")
+            self._connection.execute("INSERT OR IGNORE INTO graphs VALUES (?)", (os.path.abspath(graph_path),))
+        return pending
+
+    def close(self):
+        self._connection.close()
+
+
+class WeaviateSink:
+    """Writes objects to Weaviate collections with dynamic batching."""
+
+    def __init__(self, client):
+        self.client = client
+        self.failed = 0
+
+    def write(self, collection, uuids, properties):
+        """Stores the objects and returns the UUIDs that failed."""
+        collection = self.client.collections.get(collection)
+        with collection.batch.dynamic() as batch:
+            for object_uuid, props in zip(uuids, properties):
+                batch.add_object(properties=props, uuid=object_uuid)
+        failed = {str(failed_object.object_.uuid) for failed_object in collection.batch.failed_objects}
+        self.failed += len(failed)
+        return failed
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalVectorSink:
+    """
+    Writes objects to a LocalVectorBackend. flush() appends the rows written since the last flush to the
+    store's journal in `directory`, and close() saves the whole store once.
+    """
+
+    TEXT_FIELDS = {"Article": ("title", "abstractText"), "term": ("meshTerm",)}
+
+    def __init__(self, backend, directory):
+        self.backend = backend
+        self.directory = directory
+        self.failed = 0
+        self._pending = []
+
+    def write(self, collection, uuids, properties):
+        vectors = self.backend.embed_objects(properties, self.TEXT_FIELDS.get(collection))
+        self.backend.upsert(collection, uuids, properties, vectors=vectors)
+        self._pending.append((collection, uuids, properties, vectors))
+        return set()
+
+    def flush(self):
+        for collection, uuids, properties, vectors in self._pending:
+            self.backend.append_journal(self.directory, collection, uuids, properties, vectors)
+        self._pending = []
+
+    def close(self):
+        self._pending = []
+        self.backend.build_index()
+        self.backend.save(self.directory)
+
+
+# Function to bring the compiled indexes of an updated graph up to date where that can be done incrementally
+def update_graph_indexes(graph_path, ntriples, replaced_uris, previous_source):
+    """
+    Records the updates in the delta file of the graph's compiled MeSH index, if it has one. A snapshot
+    cannot be extended, so graph loads parse the file again until recompile_graph rebuilds it.
+    """
+    if os.path.exists(mesh_index_path_for(graph_path)):
+        if not update_mesh_index_delta(graph_path, ntriples, replaced_uris, previous_source):
+            print(f"The MeSH index of {graph_path} is out of date; recompile it with --recompile")
+    if os.path.exists(snapshot_path_for(graph_path)):
+        print(f"The snapshot of {graph_path} is out of date; recompile it with --recompile")
+
+
+# Function to recompile the snapshot and MeSH index of an updated graph, for the ones that exist
+def recompile_graph(graph_path):
+    if os.path.exists(snapshot_path_for(graph_path)):
+        compile_snapshot(graph_path, mesh_index=os.path.exists(mesh_index_path_for(graph_path)))
+    elif os.path.exists(mesh_index_path_for(graph_path)):
+        compile_mesh_index(graph_path)
+
+
+# Function to stream a PubMed CSV into a sink
+def ingest_articles(csv_path, sink, chunksize=10000, limit=None, include_terms=True, progress=None,
+                    checkpoint=None, graph_path=None, term_uri_table=None):
+    """
+    Streams the CSV into the Article (and term) collections of a sink and bumps their epochs.
+
+    Args:
+        csv_path (str): PubMed CSV with Title, abstractText and meshMajor columns.
+        sink (WeaviateSink | LocalVectorSink): Destination of the objects.
+        chunksize (int): Number of CSV rows read and written per batch.
+        limit (int): Only ingest the first `limit` rows.
+        include_terms (bool): Also load the distinct MeSH terms into the term collection.
+        progress (callable): Called with the running stats dict after every chunk.
+        checkpoint (IngestCheckpoint): Makes the run incremental and resumable.
+        graph_path (str): RDF graph to keep in sync with the ingested rows (requires a checkpoint). It is
+            converted to N-Triples on first use, and the first run synced with it re-ingests every row.
+        term_uri_table (TermURITable): Records the graph URI of every MeSH term ingested.
+
+    Returns:
+        dict: rows, articles, unchanged, merged (duplicate rows of one article), terms, failed, graph_updates,
+            seconds and rows_per_second.
+    """
+    if graph_path is not None and checkpoint is None:
+        raise ValueError("Updating the graph requires a checkpoint")
+
+    start_row = checkpoint.resume_row(csv_path) if checkpoint is not None else 0
+    rebuild_graph = False
+    if graph_path is not None:
+        ensure_ntriples(graph_path)
+        # The first run synced with a graph is a full load that replaces what the graph holds for every row
+        rebuild_graph = not checkpoint.graph_initialized(graph_path)
+
+    stats = {"rows": 0, "articles": 0, "unchanged": 0, "merged": 0, "terms": 0, "graph_updates": 0}
+    seen_terms = set()
+    term_uris = MeshTermURIs()
+    start = time.perf_counter()
+    for next_row, chunk in read_article_chunks(csv_path, chunksize=chunksize, limit=limit, start_row=start_row):
+        chunk, merged = collapse_duplicate_articles(chunk)
+        stats["merged"] += merged
+        uris, mesh_terms, uuids, properties = build_article_objects(chunk)
+        hashes = content_hashes(chunk)
+        known = checkpoint.article_hashes(uuids) if checkpoint is not None and not rebuild_graph else {}
+        changed = [i for i, (object_uuid, content_hash) in enumerate(zip(uuids, hashes))
+                   if known.get(object_uuid) != content_hash]
+
+        failed = set()
+        if changed:
+            failed = sink.write("Article", [uuids[i] for i in changed], [properties[i] for i in changed])
+            changed = [i for i in changed if uuids[i] not in failed]
+
+        new_terms = []
+        if include_terms:
+            for i in changed:
+                for term in mesh_terms.iloc[i]:
+                    if term not in seen_terms:
+                        seen_terms.add(term)
+                        new_terms.append(term)
+            if checkpoint is not None and not rebuild_graph and new_terms:
+                known_terms = checkpoint.known_terms(new_terms)
+                new_terms = [term for term in new_terms if term not in known_terms]
+            if new_terms:
+                term_uuids, term_properties = build_term_objects(new_terms)
+                failed_terms = sink.write("term", term_uuids, term_properties)
+                new_terms = [
+                    term for term, object_uuid in zip(new_terms, term_uuids) if object_uuid not in failed_terms
+                ]
+
+        if term_uri_table is not None and new_terms:
+            term_uri_table.add({term: term_uris[term] for term in new_terms})
+        if checkpoint is not None:
+            graph_updates = []
+            if graph_path is not None and changed:
+                rows = chunk.iloc[changed]
+                ntriples = article_ntriples(
+                    uris.iloc[changed], rows["Title"], rows["abstractText"], mesh_terms.iloc[changed], term_uris
+                )
+                graph_updates.extend(
+                    (uris.iloc[i], int(rebuild_graph or uuids[i] in known), text)
+                    for i, text in zip(changed, ntriples)
+                )
+                graph_updates.extend(
+                    (term_uris[term], int(rebuild_graph), term_ntriples(term, term_uris[term])) for term in new_terms
+                )
+            if changed:
+                sink.flush()
+            checkpoint.commit_chunk(
+                csv_path, next_row, {uuids[i]: hashes[i] for i in changed}, new_terms, graph_updates
+            )
+
+        stats["rows"] = next_row - start_row
+        stats["articles"] += len(changed)
+        stats["unchanged"] += len(uuids) - len(changed) - len(failed)
+        stats["terms"] += len(new_terms)
+        stats["seconds"] = time.perf_counter() - start
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress is not None:
+            progress(stats)
+
+    sink.close()
+    if checkpoint is not None:
+        if graph_path is not None:
+            stats["graph_updates"] = checkpoint.apply_graph_updates(graph_path)
+        checkpoint.finish_run(csv_path)
+    stats["failed"] = sink.failed
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+
+    # Invalidate cached searches of the collections now that they have new objects
+    if stats["articles"]:
+        bump_collection_epoch("Article")
+    if stats["terms"]:
+        bump_collection_epoch("term")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the PubMed CSV into the Article and term collections.")
+    parser.add_argument("csv", help="PubMed CSV, e.g. data/PubMed_Dataset.csv")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--weaviate", action="store_true", help="Load into the Weaviate Cloud cluster from config")
+    target.add_argument("--local", metavar="DIRECTORY", help="Load into a local vector store directory")
+    parser.add_argument("--chunksize", type=int, default=10000, help="CSV rows per batch")
+    parser.add_argument("--limit", type=int, help="Only ingest the first LIMIT rows")
+    parser.add_argument("--no-terms", action="store_true", help="Skip the term collection")
+    parser.add_argument("--checkpoint", help="SQLite checkpoint for incremental, resumable ingestion")
+    parser.add_argument("--graph", help="RDF graph to update with the ingested rows (requires --checkpoint)")
+    parser.add_argument("--recompile", action="store_true",
+                        help="Recompile the graph's snapshot and MeSH index after the run (requires --graph)")
+    args = parser.parse_args(argv)
+    if args.graph and not args.checkpoint:
+        parser.error("--graph requires --checkpoint")
+    if args.recompile and not args.graph:
+        parser.error("--recompile requires --graph")
+
+    if args.weaviate:
+        from query_function.weaviate_queries import get_weaviate_client
+
+        sink = WeaviateSink(get_weaviate_client())
+    else:
+        from query_function.vector_backends import LocalVectorBackend
+
+        backend = LocalVectorBackend.load(args.local) if os.path.isdir(args.local) else LocalVectorBackend()
+        sink = LocalVectorSink(backend, args.local)
+    checkpoint = IngestCheckpoint(args.checkpoint) if args.checkpoint else None
+
+    def progress(stats):
+        print(
+            f"{stats['rows']} rows, {stats['articles']} upserted, {stats['unchanged']} unchanged, "
+            f"{stats['merged']} duplicates merged, {stats['terms']} terms, {stats['rows_per_second']:.0f} rows/s"
+        )
+
+    try:
+        stats = ingest_articles(
+            args.csv, sink, chunksize=args.chunksize, limit=args.limit, include_terms=not args.no_terms,
+            progress=progress, checkpoint=checkpoint, graph_path=args.graph,
+            term_uri_table=get_term_uri_table(create=True)
+        )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    if args.recompile:
+        recompile_graph(args.graph)
+    print(
+        f"Ingested {stats['articles']} articles ({stats['unchanged']} unchanged, {stats['merged']} duplicate rows "
+        f"merged) and {stats['terms']} terms "
+        f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s, {stats['failed']} failed, "
+        f"{stats['graph_updates']} graph subjects updated)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,552 @@
+"""
+Inverted MeSH term index over the PubMed graph.
+
+The index can be compiled offline next to the graph (it is also written by ``rdf_snapshot``), so query-time
+loading only memory-maps a file. Ingestion runs that update the graph keep their triples in a small delta
+file next to the index instead of recompiling it, and loading merges the two; compiling again folds the
+delta in:
+
+    python -m query_function.mesh_index data/PubMedGraph.ttl
+"""
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from rdflib import Graph, Namespace, RDF, URIRef
+
+from query_function.graph_cache import load_graph
+from query_function.rdf_snapshot import decode_term, encode_term
+
+SCHEMA = Namespace("http://schema.org/")
+EX = Namespace("http://example.org/")
+
+MAGIC = b"MESHIDX\x01"
+# magic, source mtime (ns), source size, number of articles, number of terms, number of postings
+HEADER = struct.Struct("<8sqqIII")
+DELTA_MAGIC = "meshidx-delta"
+
+
+def mesh_index_path_for(local_file_path):
+    """Returns the default compiled index location for an RDF file, e.g. data/PubMedGraph.meshidx."""
+    return os.path.splitext(local_file_path)[0] + ".meshidx"
+
+
+def mesh_index_delta_path_for(local_file_path):
+    """Returns where graph updates since the index was compiled are kept, e.g. data/PubMedGraph.meshdelta.nt."""
+    return os.path.splitext(local_file_path)[0] + ".meshdelta.nt"
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+class _ByteTable:
+    """Byte strings stored as an offsets array and one blob, decoded only when accessed."""
+
+    def __init__(self, offsets, blob, decode):
+        self._offsets = offsets
+        self._blob = blob
+        self._decode = decode
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def key(self, position):
+        return bytes(self._blob[self._offsets[position]:self._offsets[position + 1]])
+
+    def __getitem__(self, position):
+        return self._decode(self.key(position))
+
+    def find(self, key):
+        """Binary search for a key in a sorted table; returns its position or None."""
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self.key(lo) == key else None
+
+
+class _ArticleIDs:
+    """Article URI string -> ID lookups over the sorted article URI table of a compiled index."""
+
+    def __init__(self, article_uris):
+        self._article_uris = article_uris
+
+    def get(self, uri, default=None):
+        position = self._article_uris.find(encode_term(URIRef(uri)))
+        return default if position is None else position
+
+    def __contains__(self, uri):
+        return self.get(uri) is not None
+
+    def __getitem__(self, uri):
+        position = self.get(uri)
+        if position is None:
+            raise KeyError(uri)
+        return position
+
+
+class _Postings:
+    """Term URI string -> sorted article ID array, sliced out of a compiled index."""
+
+    def __init__(self, terms, offsets, ids):
+        self._terms = terms
+        self._offsets = offsets
+        self._ids = ids
+
+    def __len__(self):
+        return len(self._terms)
+
+    def get(self, term_uri, default=None):
+        position = self._terms.find(term_uri.encode("utf-8"))
+        if position is None:
+            return default
+        return self._ids[self._offsets[position]:self._offsets[position + 1]]
+
+
+class MeshTermIndex:
+    """
+    Inverted index from MeSH term URI to the articles about it, built once from the PubMed graph.
+
+    Articles get dense integer IDs in URI order. Each term keeps a sorted array of article IDs (its posting
+    list) and article metadata lives in parallel sequences indexed by ID, so filtering and ranking are set
+    intersections instead of SPARQL evaluation. save() writes the index to a file that open() memory-maps.
+    """
+
+    def __init__(self, article_uris, titles, abstracts, dates, access, postings, article_ids=None, source=None):
+        self.article_uris = article_uris
+        self.titles = titles
+        self.abstracts = abstracts
+        self.dates = dates
+        self.access = access
+        self.postings = postings
+        if article_ids is None:
+            article_ids = {str(uri): i for i, uri in enumerate(article_uris)}
+        self.article_ids = article_ids
+        self.source = source  # (mtime_ns, size) of the RDF file a compiled index was built from
+
+    @classmethod
+    def from_graph(cls, g):
+        articles = {}
+        for article in g.subjects(RDF.type, EX.Article):
+            fields = (
+                g.value(article, SCHEMA.name),
+                g.value(article, SCHEMA.description),
+                g.value(article, SCHEMA.datePublished),
+                g.value(article, EX.access),
+            )
+            # Same requirement as the SPARQL filter query: every field must be present
+            if article not in articles and all(field is not None for field in fields):
+                articles[article] = fields
+
+        # IDs follow URI order, so a compiled index can look articles up by binary search
+        article_uris = sorted(articles, key=encode_term)
+        article_ids = {article: i for i, article in enumerate(article_uris)}
+        titles, abstracts, dates, access = [], [], [], []
+        for article in article_uris:
+            for column, field in zip((titles, abstracts, dates, access), articles[article]):
+                column.append(field)
+
+        mesh_terms = set(g.subjects(RDF.type, EX.MeSHTerm))
+        postings = {}
+        for article, _, term in g.triples((None, SCHEMA.about, None)):
+            if article in article_ids and term in mesh_terms:
+                postings.setdefault(str(term), set()).add(article_ids[article])
+
+        return cls(
+            article_uris, titles, abstracts, dates, access,
+            {term: array("I", sorted(ids)) for term, ids in postings.items()},
+        )
+
+    def save(self, index_path, source):
+        """
+        Writes the index as a memory-mappable file.
+
+        Args:
+            index_path (str): Destination path, replaced atomically.
+            source (tuple): (mtime_ns, size) of the RDF file the index was built from, checked by is_fresh().
+        """
+        terms = sorted(self.postings)
+        posting_offsets = array("Q", [0])
+        for term in terms:
+            posting_offsets.append(posting_offsets[-1] + len(self.postings[term]))
+        columns = (self.article_uris, self.titles, self.abstracts, self.dates, self.access)
+
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            def write_aligned(data):
+                f.write(data)
+                f.write(b"\x00" * (_align(f.tell()) - f.tell()))
+
+            def write_table(keys):
+                offsets = array("Q", [0])
+                for key in keys:
+                    offsets.append(offsets[-1] + len(key))
+                write_aligned(offsets.tobytes())
+                write_aligned(b"".join(keys))
+
+            write_aligned(HEADER.pack(MAGIC, source[0], source[1], len(self.article_uris), len(terms),
+                                      posting_offsets[-1]))
+            for column in columns:
+                write_table([encode_term(value) for value in column])
+            write_table([term.encode("utf-8") for term in terms])
+            write_aligned(posting_offsets.tobytes())
+            for term in terms:
+                f.write(array("I", self.postings[term]).tobytes())
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def open(cls, index_path):
+        """Memory-maps an index written by save(). Article fields and postings are only decoded when used."""
+        if sys.byteorder != "little":
+            raise ValueError("Compiled MeSH indexes can only be loaded on little-endian platforms.")
+        with open(index_path, "rb") as f:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+        magic, source_mtime_ns, source_size, n_articles, n_terms, n_postings = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not a compiled MeSH index.")
+        position = _align(HEADER.size)
+
+        def read_table(length, decode):
+            nonlocal position
+            offsets = buffer[position:position + (length + 1) * 8].cast("Q")
+            position = _align(position + (length + 1) * 8)
+            blob = buffer[position:position + offsets[length]]
+            position = _align(position + offsets[length])
+            return _ByteTable(offsets, blob, decode)
+
+        article_uris, titles, abstracts, dates, access = (read_table(n_articles, decode_term) for _ in range(5))
+        terms = read_table(n_terms, lambda key: key.decode("utf-8"))
+        posting_offsets = buffer[position:position + (n_terms + 1) * 8].cast("Q")
+        position = _align(position + (n_terms + 1) * 8)
+        ids = buffer[position:position + n_postings * 4].cast("I")
+
+        return cls(
+            article_uris, titles, abstracts, dates, access, _Postings(terms, posting_offsets, ids),
+            article_ids=_ArticleIDs(article_uris), source=(source_mtime_ns, source_size),
+        )
+
+    def is_fresh(self, local_file_path):
+        """True when a compiled index was built from the current version of the RDF file."""
+        try:
+            stat = os.stat(local_file_path)
+        except FileNotFoundError:
+            return True
+        return self.source == (stat.st_mtime_ns, stat.st_size)
+
+    def _matching_ids(self, term_uri, allowed_ids):
+        posting = self.postings.get(str(term_uri))
+        if not posting:
+            return []
+        if allowed_ids is None:
+            return posting
+        if len(allowed_ids) < len(posting):
+            # Probe the posting list for each allowed article
+            matches = []
+            for article_id in allowed_ids:
+                position = bisect_left(posting, article_id)
+                if position < len(posting) and posting[position] == article_id:
+                    matches.append(article_id)
+            return matches
+        return [article_id for article_id in posting if article_id in allowed_ids]
+
+    def count_matches(self, mesh_term_uris, article_uris=None):
+        """
+        Counts, per article ID, which of the given term URIs it is about.
+
+        Args:
+            mesh_term_uris (list): MeSH term URIs, in selection order.
+            article_uris (list): Optional article URIs to restrict the search to.
+
+        Returns:
+            dict: Article ID -> list of matched term URI strings, in selection order.
+        """
+        allowed_ids = None
+        if article_uris is not None:
+            allowed_ids = {self.article_ids[str(uri)] for uri in article_uris if str(uri) in self.article_ids}
+
+        matches = {}
+        for term_uri in dict.fromkeys(str(uri) for uri in mesh_term_uris):
+            for article_id in self._matching_ids(term_uri, allowed_ids):
+                matches.setdefault(article_id, []).append(term_uri)
+        return matches
+
+    def article(self, article_id, mesh_terms):
+        return self.article_uris[article_id], {
+            'title': self.titles[article_id],
+            'abstract': self.abstracts[article_id],
+            'datePublished': self.dates[article_id],
+            'access': self.access[article_id],
+            'meshTerms': set(mesh_terms),
+        }
+
+    def rank(self, mesh_term_uris, article_uris=None, limit=10):
+        """
+        Returns the top (article URI, article data) pairs ranked by the number of matching terms.
+
+        Only match counts are computed for every candidate; a bounded heap picks the winners and article
+        records are built for those alone.
+        """
+        matches = self.count_matches(mesh_term_uris, article_uris)
+        positions = {term: i for i, term in enumerate(dict.fromkeys(str(uri) for uri in mesh_term_uris))}
+        ranked_ids = heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda article_id: (-len(matches[article_id]), positions[matches[article_id][0]], article_id)
+        )
+        return [self.article(article_id, matches[article_id]) for article_id in ranked_ids]
+
+
+class DeltaMeshIndex:
+    """
+    A compiled index merged with the triples ingested since it was compiled (see update_mesh_index_delta).
+
+    The delta is indexed on its own; its articles shadow the compiled ones with the same URI, and ties are
+    broken by URI like the compiled index does, so ranking matches a recompile of the whole graph.
+    """
+
+    def __init__(self, base, delta_graph):
+        # Delta articles may be about terms declared in the compiled part of the graph only
+        for term in set(delta_graph.objects(None, SCHEMA.about)):
+            if (term, RDF.type, EX.MeSHTerm) not in delta_graph and base.postings.get(str(term)) is not None:
+                delta_graph.add((term, RDF.type, EX.MeSHTerm))
+        self.base = base
+        self.delta = MeshTermIndex.from_graph(delta_graph)
+        self.shadowed_ids = {
+            base.article_ids[str(article)] for article in delta_graph.subjects(RDF.type, EX.Article)
+            if str(article) in base.article_ids
+        }
+        self._offset = len(base.article_uris)
+
+    def count_matches(self, mesh_term_uris, article_uris=None):
+        """Same as MeshTermIndex.count_matches; delta article IDs follow the compiled ones."""
+        matches = {
+            article_id: terms for article_id, terms in self.base.count_matches(mesh_term_uris, article_uris).items()
+            if article_id not in self.shadowed_ids
+        }
+        for article_id, terms in self.delta.count_matches(mesh_term_uris, article_uris).items():
+            matches[self._offset + article_id] = terms
+        return matches
+
+    def _uri_key(self, article_id):
+        if article_id < self._offset:
+            return self.base.article_uris.key(article_id)
+        return encode_term(self.delta.article_uris[article_id - self._offset])
+
+    def article(self, article_id, mesh_terms):
+        if article_id < self._offset:
+            return self.base.article(article_id, mesh_terms)
+        return self.delta.article(article_id - self._offset, mesh_terms)
+
+    def rank(self, mesh_term_uris, article_uris=None, limit=10):
+        """Same as MeshTermIndex.rank, over the compiled and the delta articles."""
+        matches = self.count_matches(mesh_term_uris, article_uris)
+        positions = {term: i for i, term in enumerate(dict.fromkeys(str(uri) for uri in mesh_term_uris))}
+        ranked_ids = heapq.nsmallest(
+            limit,
+            matches,
+            key=lambda article_id: (
+                -len(matches[article_id]), positions[matches[article_id][0]], self._uri_key(article_id)
+            )
+        )
+        return [self.article(article_id, matches[article_id]) for article_id in ranked_ids]
+
+
+_indexes = {}  # RDF file path -> (graph, index)
+_compiled_indexes = {}  # RDF file path -> ((mtime_ns, size) of the index file, index)
+_delta_indexes = {}  # RDF file path -> ((mtime_ns, size) of the delta file, compiled index source, merged index)
+_indexes_lock = threading.Lock()
+_last_load = {"source": None, "cached": False, "seconds": 0.0}  # How the latest load_mesh_index call was served
+
+
+# Function to compile the MeSH term index of an RDF file next to it
+def compile_mesh_index(local_file_path, index_path=None, format="ttl", g=None):
+    """
+    Builds the index of an RDF file and saves it where load_mesh_index looks for it.
+
+    Args:
+        local_file_path (str): Path to the source RDF file.
+        index_path (str): Destination path. Defaults to mesh_index_path_for(local_file_path).
+        format (str): rdflib parser format of the source file.
+        g (Graph): The already parsed graph of the file, to skip parsing it again.
+
+    Returns:
+        str: The path the index was written to.
+    """
+    index_path = index_path or mesh_index_path_for(local_file_path)
+    stat = os.stat(local_file_path)
+    if g is None:
+        g = Graph()
+        g.parse(local_file_path, format=format)
+    MeshTermIndex.from_graph(g).save(index_path, (stat.st_mtime_ns, stat.st_size))
+    if index_path == mesh_index_path_for(local_file_path):
+        # The new index already holds what the delta recorded
+        try:
+            os.remove(mesh_index_delta_path_for(local_file_path))
+        except FileNotFoundError:
+            pass
+    return index_path
+
+
+# Function to read the (mtime_ns, size) of the RDF file a compiled index was built from, or None
+def _read_index_source(index_path):
+    try:
+        with open(index_path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return None
+    return HEADER.unpack(header)[1:3]
+
+
+# Function to read the header of a delta file: ((mtime_ns, size) of the index source, (mtime_ns, size) of the
+# graph file the delta brings it up to), or None
+def _read_delta_header(delta_path):
+    try:
+        with open(delta_path, encoding="utf-8") as f:
+            fields = f.readline().split()
+    except FileNotFoundError:
+        return None
+    if len(fields) != 6 or fields[:2] != ["#", DELTA_MAGIC]:
+        return None
+    values = tuple(map(int, fields[2:]))
+    return values[:2], values[2:]
+
+
+# Function to record graph updates next to a compiled MeSH index instead of recompiling it
+def update_mesh_index_delta(local_file_path, ntriples, replaced_uris, previous_source):
+    """
+    Adds the triples just written to an N-Triples graph to the delta file of its compiled MeSH index, which
+    load_mesh_index merges with the index. Only the delta is rewritten, so the cost follows the updates
+    since the last compile rather than the size of the graph.
+
+    Args:
+        local_file_path (str): Graph file the updates were applied to.
+        ntriples (iterable): N-Triples text of the updated subjects.
+        replaced_uris (iterable): Subjects whose earlier triples the updates replace.
+        previous_source (tuple): (mtime_ns, size) of the graph file before the updates.
+
+    Returns:
+        bool: Whether the index is current again. False when there is no compiled index, or it was already
+            out of date before the updates; it then needs compile_mesh_index.
+    """
+    index_source = _read_index_source(mesh_index_path_for(local_file_path))
+    if index_source is None:
+        return False
+    delta_path = mesh_index_delta_path_for(local_file_path)
+    extend = index_source != tuple(previous_source)
+    if extend and _read_delta_header(delta_path) != (index_source, tuple(previous_source)):
+        return False
+
+    subjects = {f"<{uri}> " for uri in replaced_uris}
+    stat = os.stat(local_file_path)
+    tmp_path = f"{delta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as target:
+        target.write(f"# {DELTA_MAGIC} {index_source[0]} {index_source[1]} {stat.st_mtime_ns} {stat.st_size}\n")
+        if extend:
+            with open(delta_path, encoding="utf-8") as source:
+                next(source)
+                for line in source:
+                    if line[:line.find("> ") + 2] not in subjects:
+                        target.write(line)
+        target.writelines(ntriples)
+    os.replace(tmp_path, delta_path)
+    return True
+
+
+# Function to merge a compiled index with its delta file when the delta brings it up to the current graph
+def _load_index_delta(local_file_path, index):
+    delta_path = mesh_index_delta_path_for(local_file_path)
+    try:
+        graph_stat = os.stat(local_file_path)
+        delta_stat = os.stat(delta_path)
+    except FileNotFoundError:
+        return None, False
+    if _read_delta_header(delta_path) != (index.source, (graph_stat.st_mtime_ns, graph_stat.st_size)):
+        return None, False
+    signature = (delta_stat.st_mtime_ns, delta_stat.st_size)
+    with _indexes_lock:
+        entry = _delta_indexes.get(local_file_path)
+        if entry is not None and entry[:2] == (signature, index.source):
+            return entry[2], True
+        g = Graph()
+        g.parse(delta_path, format="nt")
+        merged = DeltaMeshIndex(index, g)
+        _delta_indexes[local_file_path] = (signature, index.source, merged)
+    return merged, False
+
+
+def _load_compiled_index(local_file_path):
+    index_path = mesh_index_path_for(local_file_path)
+    try:
+        stat = os.stat(index_path)
+    except FileNotFoundError:
+        return None, False
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = True
+    with _indexes_lock:
+        entry = _compiled_indexes.get(local_file_path)
+        if entry is None or entry[0] != signature:
+            try:
+                index = MeshTermIndex.open(index_path)
+            except (ValueError, struct.error) as e:
+                print(f"Ignoring unreadable MeSH index {index_path}: {e}")
+                return None, False
+            entry = _compiled_indexes[local_file_path] = (signature, index)
+            cached = False
+    if entry[1].is_fresh(local_file_path):
+        return entry[1], cached
+    return _load_index_delta(local_file_path, entry[1])
+
+
+# Function to get the MeSH term index for an RDF file: the compiled one if it is up to date (with its delta
+# merged in if that brings it up to date), otherwise built from the cached graph and rebuilt whenever the
+# graph is reloaded
+def load_mesh_index(local_file_path):
+    start = time.perf_counter()
+    index, cached = _load_compiled_index(local_file_path)
+    source = "compiled index and delta" if isinstance(index, DeltaMeshIndex) else "compiled index"
+    if index is None:
+        source = "RDF graph"
+        g = load_graph(local_file_path, format="ttl")
+        with _indexes_lock:
+            entry = _indexes.get(local_file_path)
+            cached = entry is not None and entry[0] is g
+            if not cached:
+                entry = _indexes[local_file_path] = (g, MeshTermIndex.from_graph(g))
+            index = entry[1]
+    _last_load.update(source=source, cached=cached, seconds=time.perf_counter() - start)
+    return index
+
+
+# Function to report how the latest MeSH index load was served: source, whether it was cached, and its time
+def get_mesh_index_stats():
+    return dict(_last_load)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the MeSH term index of an RDF file.")
+    parser.add_argument("source", help="RDF file to index, e.g. data/PubMedGraph.ttl")
+    parser.add_argument("-o", "--output", help="Index path (default: <source>.meshidx)")
+    parser.add_argument("--format", default="ttl", help="rdflib parser format of the source file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    path = compile_mesh_index(args.source, args.output, format=args.format)
+    print(f"MeSH index written to {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
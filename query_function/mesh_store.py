@@ -0,0 +1,230 @@
+"""
+Local MeSH vocabulary store.
+
+Imports the MeSH RDF dump (N-Triples, optionally gzipped, or any format rdflib can parse) into an indexed
+SQLite file holding only what term expansion needs: English labels, descriptor -> concept edges and
+broaderDescriptor edges. With a store configured, MeSH expansion in rdf_query answers locally instead of
+calling the NLM SPARQL endpoint.
+
+Build the store once with:
+
+    python -m query_function.mesh_store mesh.nt.gz data/mesh.sqlite
+
+and point the app at it with the MESH_STORE_PATH environment variable.
+"""
+import argparse
+import gzip
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from rdflib import Graph, Literal
+
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+BROADER_DESCRIPTOR = "http://id.nlm.nih.gov/mesh/vocab#broaderDescriptor"
+
+NTRIPLE_PATTERN = re.compile(
+    r'^(<[^>]*>|_:\S+)\s+<([^>]*)>\s+'
+    r'(<[^>]*>|_:\S+|"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<[^>]*>)?)\s*\.\s*$'
+)
+ESCAPE_PATTERN = re.compile(r'\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+SCHEMA = """
+CREATE TABLE labels (subject TEXT NOT NULL, label TEXT NOT NULL, lang TEXT NOT NULL);
+CREATE TABLE concepts (subject TEXT NOT NULL, object TEXT NOT NULL);
+CREATE TABLE broader (narrower TEXT NOT NULL, broader TEXT NOT NULL);
+"""
+INDEXES = """
+CREATE INDEX labels_by_label ON labels (label, lang);
+CREATE INDEX labels_by_subject ON labels (subject);
+CREATE INDEX concepts_by_subject ON concepts (subject);
+CREATE INDEX broader_by_broader ON broader (broader);
+"""
+
+
+def _unescape(value):
+    def replace(match):
+        code = match.group(1) or match.group(2)
+        if code:
+            return chr(int(code, 16))
+        return ESCAPES.get(match.group(3), match.group(3))
+
+    return ESCAPE_PATTERN.sub(replace, value)
+
+
+def _ntriples_rows(dump_path):
+    """Yields (table, row) pairs from an N-Triples dump, one line at a time."""
+    opener = gzip.open if dump_path.endswith(".gz") else open
+    with opener(dump_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            # Cheap substring checks first: most of the dump is irrelevant to expansion
+            if "#label>" not in line and "concept" not in line and "broaderDescriptor" not in line:
+                continue
+            match = NTRIPLE_PATTERN.match(line)
+            if match is None:
+                continue
+            subject, predicate, obj, literal, lang = match.groups()
+            subject = subject.strip("<>")
+            if predicate == RDFS_LABEL and literal is not None:
+                yield "labels", (subject, _unescape(literal), lang or "")
+            elif predicate == BROADER_DESCRIPTOR and literal is None:
+                yield "broader", (subject, obj.strip("<>"))
+            elif "concept" in predicate and literal is None:
+                yield "concepts", (subject, obj.strip("<>"))
+
+
+def _graph_rows(dump_path, format=None):
+    """Yields (table, row) pairs from any RDF file rdflib can parse."""
+    g = Graph()
+    g.parse(dump_path, format=format)
+    for subject, predicate, obj in g:
+        predicate = str(predicate)
+        if predicate == RDFS_LABEL and isinstance(obj, Literal):
+            yield "labels", (str(subject), str(obj), obj.language or "")
+        elif predicate == BROADER_DESCRIPTOR and not isinstance(obj, Literal):
+            yield "broader", (str(subject), str(obj))
+        elif "concept" in predicate and not isinstance(obj, Literal):
+            yield "concepts", (str(subject), str(obj))
+
+
+# Function to import a MeSH RDF dump into a local SQLite store
+def import_mesh_dump(dump_path, store_path, format=None, batch_size=50000):
+    """
+    Imports the parts of a MeSH RDF dump needed for term expansion into an indexed SQLite file.
+
+    Args:
+        dump_path (str): MeSH dump, e.g. mesh.nt or mesh.nt.gz. Non N-Triples files are parsed with rdflib.
+        store_path (str): Destination SQLite file. Replaced atomically once the import finishes.
+        format (str): rdflib format for non N-Triples dumps. Guessed from the extension if omitted.
+        batch_size (int): Number of rows inserted per executemany call.
+
+    Returns:
+        dict: Number of rows imported per table.
+    """
+    if dump_path.endswith((".nt", ".nt.gz")):
+        rows = _ntriples_rows(dump_path)
+    else:
+        rows = _graph_rows(dump_path, format=format)
+
+    tmp_path = store_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    counts = {"labels": 0, "concepts": 0, "broader": 0}
+    placeholders = {"labels": "(?, ?, ?)", "concepts": "(?, ?)", "broader": "(?, ?)"}
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript(SCHEMA)
+        batches = {table: [] for table in counts}
+
+        def flush(table):
+            connection.executemany(f"INSERT INTO {table} VALUES {placeholders[table]}", batches[table])
+            counts[table] += len(batches[table])
+            batches[table].clear()
+
+        for table, row in rows:
+            batches[table].append(row)
+            if len(batches[table]) >= batch_size:
+                flush(table)
+        for table in batches:
+            flush(table)
+
+        connection.executescript(INDEXES)
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, store_path)
+    return counts
+
+
+class MeshVocabularyStore:
+    """Read-only access to a store built by import_mesh_dump. Safe to share between threads."""
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self._connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def _labels(self, query, params):
+        with self._lock:
+            return [row[0] for row in self._connection.execute(query, params)]
+
+    def descriptors(self, label):
+        """Returns the subjects whose English label is exactly the given label."""
+        return self._labels("SELECT DISTINCT subject FROM labels WHERE label = ? AND lang = 'en'", (label,))
+
+    def concept_labels(self, label):
+        """
+        Labels of the objects linked through a *concept* predicate from the subjects labelled `label`.
+        Objects without a label come back as "No label", like the SPARQL query's OPTIONAL.
+        """
+        return self._labels(
+            """
+            SELECT DISTINCT COALESCE(object_label.label, 'No label')
+            FROM labels AS term
+            JOIN concepts ON concepts.subject = term.subject
+            LEFT JOIN labels AS object_label ON object_label.subject = concepts.object
+            WHERE term.label = ? AND term.lang = 'en'
+            """,
+            (label,),
+        )
+
+    def narrower_labels(self, label):
+        """Labels of the descriptors whose broaderDescriptor is labelled `label`."""
+        return self._labels(
+            """
+            SELECT DISTINCT narrower_label.label
+            FROM labels AS term
+            JOIN broader ON broader.broader = term.subject
+            JOIN labels AS narrower_label ON narrower_label.subject = broader.narrower
+            WHERE term.label = ? AND term.lang = 'en'
+            """,
+            (label,),
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_mesh_store = None
+_mesh_store_lock = threading.Lock()
+
+
+# Function to use a local MeSH store for term expansion (None switches back to the NLM endpoint)
+def configure_mesh_store(store_path):
+    global _mesh_store
+    with _mesh_store_lock:
+        _mesh_store = MeshVocabularyStore(store_path) if store_path else None
+    return _mesh_store
+
+
+# Function to get the configured local MeSH store, opening MESH_STORE_PATH on first use
+def get_mesh_store():
+    global _mesh_store
+    if _mesh_store is None:
+        store_path = os.getenv("MESH_STORE_PATH")
+        if store_path and os.path.exists(store_path):
+            with _mesh_store_lock:
+                if _mesh_store is None:
+                    _mesh_store = MeshVocabularyStore(store_path)
+    return _mesh_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a MeSH RDF dump into a local SQLite store.")
+    parser.add_argument("dump", help="MeSH RDF dump, e.g. mesh.nt.gz")
+    parser.add_argument("store", help="SQLite file to create, e.g. data/mesh.sqlite")
+    parser.add_argument("--format", help="rdflib format for non N-Triples dumps")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    counts = import_mesh_dump(args.dump, args.store, format=args.format)
+    print(f"Imported {counts} into {args.store} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Headless GraphRAG pipeline: vector search -> RDF filter -> summarize, without Streamlit.
+
+The stages the app runs from its three tabs are chained here behind one call. Loading the RDF graph and its
+MeSH index starts in the background while the vector search runs, so the filter can begin as soon as the hits
+arrive; when no MeSH terms are given, the term search runs alongside the article search and supplies them.
+Every stage is timed, and a batch runner drives many queries concurrently for load tests or a batch endpoint.
+
+Run one query, or a JSON-lines file of them (one {"query": ..., "mesh_terms": [...]} object per line), with:
+
+    python -m query_function.pipeline --query "oral cancer treatment" --terms "Mouth Neoplasms"
+    python -m query_function.pipeline --batch queries.jsonl --concurrency 8 --no-summary
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from query_function.article_summaries import get_article_summary_store, with_article_summaries
+from query_function.mesh_index import load_mesh_index
+from query_function.rdf_query import query_rdf_index
+from query_function.records import ARTICLE_TABLE_PROPERTIES, to_article_results
+from query_function.summarize import (
+    DEFAULT_CONTEXT_TOKENS,
+    DEFAULT_MODEL,
+    DEFAULT_USER_QUERY,
+    SUMMARY_TIME_BUDGET_SECONDS,
+    article_text,
+    pack_abstracts,
+    stream_map_reduce_summary,
+    stream_summary,
+)
+from query_function.summary_cache import get_summary_cache, summary_key
+from query_function.uris import sanitize_term
+from query_function.weaviate_queries import (
+    get_query_embedding_cache,
+    get_vector_client,
+    query_weaviate_articles,
+    query_weaviate_both,
+)
+
+DEFAULT_RDF_PATH = "data/PubMedGraph.ttl"
+STAGES = ("search", "index_wait", "rdf_filter", "summarize", "total")
+
+
+@dataclass
+class PipelineResult:
+    """Outcome of one pipeline run. Timings are in seconds, keyed by stage (see STAGES)."""
+
+    query: str
+    mesh_terms: List[str] = field(default_factory=list)
+    article_uris: List[str] = field(default_factory=list)
+    ranked_articles: list = field(default_factory=list)  # (article_uri, data) pairs from query_rdf_index
+    summary: Optional[str] = None
+    summary_cached: bool = False
+    timings: dict = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_dict(self):
+        result = asdict(self)
+        result["ranked_articles"] = [
+            {"article_uri": str(uri), "title": str(data["title"]), "mesh_terms": sorted(map(str, data["meshTerms"]))}
+            for uri, data in self.ranked_articles
+        ]
+        return result
+
+
+class GraphRAGPipeline:
+    """
+    Runs article search, MeSH filtering and summarization for a query.
+
+    Args:
+        rdf_path (str): PubMed graph to filter with (loaded once and cached by load_mesh_index).
+        client: Vector client or VectorBackend; defaults to get_vector_client().
+        llm_client (OpenAI): Defaults to the shared client of query_function.summarize.
+        summary_mode (str): "single" (one packed prompt) or "map-reduce".
+        use_summary_cache (bool): Serve and store summaries through the persistent summary cache.
+        use_article_summaries (bool): Summarize from precomputed article summaries where available.
+        context_tokens (int): Token budget of a single-prompt summary.
+        time_budget (float): Wall-clock budget of a map-reduce summary.
+    """
+
+    def __init__(self, rdf_path=DEFAULT_RDF_PATH, client=None, llm_client=None, summary_mode="single",
+                 use_summary_cache=True, use_article_summaries=False, context_tokens=DEFAULT_CONTEXT_TOKENS,
+                 time_budget=SUMMARY_TIME_BUDGET_SECONDS):
+        if summary_mode not in ("single", "map-reduce"):
+            raise ValueError(f"Unknown summary mode: {summary_mode}")
+        self.rdf_path = rdf_path
+        self.client = client
+        self.llm_client = llm_client
+        self.summary_mode = summary_mode
+        self.use_summary_cache = use_summary_cache
+        self.use_article_summaries = use_article_summaries
+        self.context_tokens = context_tokens
+        self.time_budget = time_budget
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="graphrag-preload")
+
+    def preload(self):
+        """Starts loading the graph and MeSH index in the background; returns the future."""
+        return self._executor.submit(load_mesh_index, self.rdf_path)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _search(self, query_text, mesh_terms, limit, term_limit, alpha, filters):
+        client = self.client
+        embedding_cache = get_query_embedding_cache()
+        if mesh_terms is not None:
+            results = query_weaviate_articles(
+                client or get_vector_client(), query_text, limit, embedding_cache,
+                return_properties=ARTICLE_TABLE_PROPERTIES, alpha=alpha, filters=filters
+            )
+            return to_article_results(results), list(mesh_terms)
+        # No terms given: the term search runs alongside the article search and supplies them
+        article_results, term_results = query_weaviate_both(
+            query_text, limit, embedding_cache, client=client, article_properties=ARTICLE_TABLE_PROPERTIES,
+            term_properties=["meshTerm"], alpha=alpha, filters=filters, term_limit=term_limit
+        )
+        terms = dict.fromkeys(sanitize_term(result["properties"].get("meshTerm")) for result in term_results)
+        return to_article_results(article_results), [term for term in terms if term]
+
+    def _summarize(self, ranked_articles, user_query, on_token, timings):
+        """Returns (summary, cached); shares its cache keys with the Filter & Summarize tab."""
+        article_uris = [article_uri for article_uri, _ in ranked_articles]
+        if self.use_article_summaries:
+            ranked_articles, _ = with_article_summaries(ranked_articles, get_article_summary_store())
+        map_reduce = self.summary_mode == "map-reduce"
+        if map_reduce:
+            context = "\n".join(article_text(data) for _, data in ranked_articles)
+        else:
+            context = pack_abstracts(ranked_articles, max_tokens=self.context_tokens)["text"]
+
+        summary_cache = get_summary_cache() if self.use_summary_cache else None
+        cache_key = summary_key(
+            article_uris, user_query, f"{DEFAULT_MODEL}/map-reduce" if map_reduce else DEFAULT_MODEL, context
+        )
+        cached = summary_cache.get(cache_key) if summary_cache is not None else None
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached["summary"])
+            return cached["summary"], True
+
+        stats = {}
+        if map_reduce:
+            pieces = stream_map_reduce_summary(
+                ranked_articles, user_query, client=self.llm_client, time_budget=self.time_budget, stats=stats
+            )
+        else:
+            pieces = stream_summary(context, user_query, client=self.llm_client, timings=stats)
+        parts = []
+        for piece in pieces:
+            if on_token is not None:
+                on_token(piece)
+            parts.append(piece)
+        summary = "".join(parts).strip()
+        if stats.get("first_token_seconds") is not None:
+            timings["first_token"] = stats["first_token_seconds"]
+        if summary_cache is not None and summary and not stats.get("failed_chunks"):
+            summary_cache.set(cache_key, summary, stats["total_seconds"], DEFAULT_MODEL)
+        return summary, False
+
+    def run(self, query_text, mesh_terms=None, limit=10, top_k=10, user_query=DEFAULT_USER_QUERY, alpha=None,
+            filters=None, summarize=True, term_limit=5, on_token=None):
+        """
+        Runs the pipeline for one query.
+
+        Args:
+            query_text (str): Article search query.
+            mesh_terms (list): MeSH terms to filter on; taken from a term search for the query when None.
+            limit (int): Articles returned by the vector search.
+            top_k (int): Articles kept by the RDF filter.
+            user_query (str): Instruction for the summary.
+            alpha (float): Hybrid search weight, None for a pure vector search.
+            filters (ArticleFilter): MeSH / date pre-filters of the article search.
+            summarize (bool): Whether to run the summarize stage.
+            term_limit (int): Terms taken from the term search when mesh_terms is None.
+            on_token (callable): Called with every piece of the summary as it arrives.
+
+        Returns:
+            PipelineResult: Stage errors are reported in `error` rather than raised.
+        """
+        result = PipelineResult(query=query_text)
+        timings = result.timings
+        start = time.perf_counter()
+        index_future = self.preload()
+        try:
+            stage_start = time.perf_counter()
+            records, result.mesh_terms = self._search(query_text, mesh_terms, limit, term_limit, alpha, filters)
+            result.article_uris = [record.article_uri for record in records if record.article_uri]
+            timings["search"] = time.perf_counter() - stage_start
+
+            stage_start = time.perf_counter()
+            index_future.result()
+            timings["index_wait"] = time.perf_counter() - stage_start
+            if not result.article_uris or not result.mesh_terms:
+                return result
+
+            stage_start = time.perf_counter()
+            result.ranked_articles = query_rdf_index(
+                self.rdf_path, result.article_uris, result.mesh_terms, top_k=top_k
+            )
+            timings["rdf_filter"] = time.perf_counter() - stage_start
+
+            if summarize and result.ranked_articles:
+                stage_start = time.perf_counter()
+                result.summary, result.summary_cached = self._summarize(
+                    result.ranked_articles, user_query, on_token, timings
+                )
+                timings["summarize"] = time.perf_counter() - stage_start
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        finally:
+            timings["total"] = time.perf_counter() - start
+        return result
+
+    def run_batch(self, requests, concurrency=4):
+        """
+        Runs many queries concurrently, so the stages of different queries overlap.
+
+        Args:
+            requests (list): Keyword arguments of run() per query, e.g. {"query_text": ..., "mesh_terms": [...]}.
+            concurrency (int): Queries in flight at once.
+
+        Returns:
+            list: PipelineResult per request, in request order.
+        """
+        self.preload().result()  # Load the graph once up front instead of in every first query
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="graphrag-batch") as executor:
+            return list(executor.map(lambda request: self.run(**request), requests))
+
+
+# Function to summarize the stage timings of a batch: count, mean, p50, p95 and max per stage
+def timing_summary(results):
+    summary = {}
+    for stage in STAGES + ("first_token",):
+        values = sorted(result.timings[stage] for result in results if stage in result.timings)
+        if values:
+            summary[stage] = {
+                "count": len(values),
+                "mean": statistics.fmean(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the GraphRAG pipeline without the Streamlit app.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--query", help="Article search query")
+    source.add_argument("--batch", help="JSON-lines file with one {\"query\", \"mesh_terms\"} object per line")
+    parser.add_argument("--terms", nargs="+", help="MeSH terms to filter on (default: from a term search)")
+    parser.add_argument("--rdf", default=DEFAULT_RDF_PATH, help="PubMed graph file")
+    parser.add_argument("--limit", type=int, default=10, help="Articles returned by the vector search")
+    parser.add_argument("--top-k", type=int, default=10, help="Articles kept by the RDF filter")
+    parser.add_argument("--mode", choices=["single", "map-reduce"], default="single", help="Summary mode")
+    parser.add_argument("--no-summary", action="store_true", help="Skip the summarize stage")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch queries in flight at once")
+    args = parser.parse_args(argv)
+
+    with GraphRAGPipeline(rdf_path=args.rdf, summary_mode=args.mode) as pipeline:
+        if args.query:
+            result = pipeline.run(
+                args.query, mesh_terms=args.terms, limit=args.limit, top_k=args.top_k,
+                summarize=not args.no_summary, on_token=lambda piece: print(piece, end="", flush=True)
+            )
+            print()
+            print(json.dumps({key: value for key, value in result.to_dict().items() if key != "summary"}, indent=2))
+            raise SystemExit(1 if result.error else 0)
+
+        with open(args.batch, encoding="utf-8") as f:
+            requests = [
+                {
+                    "query_text": line["query"], "mesh_terms": line.get("mesh_terms", args.terms),
+                    "limit": args.limit, "top_k": args.top_k, "summarize": not args.no_summary,
+                }
+                for line in map(json.loads, filter(str.strip, f))
+            ]
+        start = time.perf_counter()
+        results = pipeline.run_batch(requests, concurrency=args.concurrency)
+        seconds = time.perf_counter() - start
+        for result in results:
+            print(json.dumps(result.to_dict()))
+        errors = sum(result.error is not None for result in results)
+        print(json.dumps({
+            "queries": len(results), "errors": errors, "seconds": seconds,
+            "queries_per_second": len(results) / seconds if seconds else 0.0, "stages": timing_summary(results),
+        }), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
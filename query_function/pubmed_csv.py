@@ -0,0 +1,48 @@
+"""
+Chunked reading and parsing of the PubMed CSV, shared by vector ingestion and the RDF graph builder.
+"""
+import numpy as np
+import pandas as pd
+
+ARTICLE_COLUMNS = ["Title", "abstractText", "meshMajor"]
+# meshMajor holds the repr of a Python list; terms containing an apostrophe are double-quoted
+MESH_TERM_PATTERN = r"'([^']*)'|\"([^\"]*)\""
+
+
+# Function to parse the meshMajor column of a chunk into one list of terms per row
+def parse_mesh_major_column(mesh_major):
+    """
+    Args:
+        mesh_major (pd.Series): meshMajor strings such as "['Mouth Neoplasms', 'Humans']".
+
+    Returns:
+        pd.Series: A list of terms per row, aligned with the input index.
+    """
+    matches = mesh_major.str.extractall(MESH_TERM_PATTERN)
+    terms = matches[0].fillna(matches[1]).str.strip()
+    terms = terms[terms != ""]
+    grouped = terms.groupby(level=0).agg(list)
+    return grouped.reindex(mesh_major.index).apply(lambda value: value if isinstance(value, list) else [])
+
+
+# Function to read the CSV in cleaned chunks (same cleaning as the notebook: no NaN/inf, string columns)
+def read_article_chunks(csv_path, chunksize=10000, limit=None, start_row=0):
+    """
+    Yields (next_row, chunk) pairs. Chunks are indexed by CSV row number (0 = first data row), rows without
+    a title are dropped, and next_row is the row number to resume from after the chunk.
+    """
+    row = start_row
+    with pd.read_csv(
+        csv_path, chunksize=chunksize, usecols=ARTICLE_COLUMNS, skiprows=range(1, start_row + 1)
+    ) as reader:
+        for chunk in reader:
+            if limit is not None:
+                if row >= limit:
+                    return
+                chunk = chunk.iloc[:limit - row]
+            chunk.index = pd.RangeIndex(row, row + len(chunk))
+            row += len(chunk)
+            chunk = chunk.replace([np.inf, -np.inf], np.nan).fillna("")
+            for column in ARTICLE_COLUMNS:
+                chunk[column] = chunk[column].astype(str)
+            yield row, chunk[chunk["Title"].str.strip() != ""]
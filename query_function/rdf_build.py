@@ -0,0 +1,300 @@
+"""
+N-Triples build of the PubMed graph.
+
+Builds the same triples as the graph builder in vector_kg.ipynb, but per CSV chunk with vectorized pandas
+operations (article URIs, seeded dates and access values, literal escaping) and memoized MeSH term URIs,
+streaming N-Triples lines straight to disk instead of holding an rdflib Graph in memory. N-Triples is valid
+Turtle, so query_rdf loads the output unchanged. Being line-based, the file can also be updated in place:
+the triples of changed articles are dropped by subject and new lines are appended, without parsing the graph.
+
+Build the graph, optionally split into shards, or compare against the notebook's rdflib approach with:
+
+    python -m query_function.rdf_build data/PubMed_Dataset.csv data/PubMedGraph.ttl
+    python -m query_function.rdf_build data/PubMed_Dataset.csv data/PubMedGraph.ttl --shards 4
+    python -m query_function.rdf_build data/PubMed_Dataset.csv data/PubMedGraph.ttl --benchmark --limit 10000
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from rdflib import Graph
+
+from query_function.pubmed_csv import parse_mesh_major_column, read_article_chunks
+from query_function.uris import article_uris, convert_to_uri, get_term_uri_table, mesh_term_uri
+
+SCHEMA = "http://schema.org/"
+EX = "http://example.org/"
+RDF_TYPE = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+RDF_PROPERTY = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>"
+RDFS_CLASS = "<http://www.w3.org/2000/01/rdf-schema#Class>"
+RDFS_LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# Class and property declarations at the top of the graph
+GRAPH_HEADER = "".join(
+    f"{subject} {RDF_TYPE} {kind} .\n"
+    for subject, kind in (
+        (f"<{EX}Article>", RDFS_CLASS),
+        (f"<{EX}MeSHTerm>", RDFS_CLASS),
+        (f"<{SCHEMA}name>", RDF_PROPERTY),
+        (f"<{SCHEMA}description>", RDF_PROPERTY),
+        (f"<{SCHEMA}datePublished>", RDF_PROPERTY),
+        (f"<{EX}access>", RDF_PROPERTY),
+    )
+)
+# Publication dates are spread deterministically over the five years before this date
+DATE_ANCHOR = np.datetime64("2024-12-31", "D")
+NTRIPLES_ESCAPES = (("\\", "\\\\"), ('"', '\\"'), ("\n", "\\n"), ("\r", "\\r"))
+
+
+# Function to derive a stable 64-bit seed per article URI, for dates, access values and shards
+def article_seeds(uris):
+    return pd.util.hash_pandas_object(uris, index=False).to_numpy()
+
+
+# Function to derive stable publication dates (ISO strings) for articles, seeded by their URIs
+def article_dates(uris):
+    days = (article_seeds(uris) % (5 * 365)).astype(np.int64).astype("timedelta64[D]")
+    return pd.Series((DATE_ANCHOR - days).astype(str), index=uris.index)
+
+
+# Function to derive stable access values between 1 and 10 for articles, seeded by their URIs
+def article_access(uris):
+    return pd.Series(((article_seeds(uris) >> np.uint64(32)) % np.uint64(10) + np.uint64(1)).astype(np.int64),
+                     index=uris.index)
+
+
+def ntriples_literals(values, datatype):
+    escaped = values.astype(str)
+    for old, new in NTRIPLES_ESCAPES:
+        escaped = escaped.str.replace(old, new, regex=False)
+    return '"' + escaped + f'"^^<{XSD}{datatype}>'
+
+
+class MeshTermURIs(dict):
+    """Memo of MeSH term -> graph URI, filled on first lookup; works directly with Series.map."""
+
+    def __missing__(self, term):
+        uri = self[term] = mesh_term_uri(term)
+        return uri
+
+
+# Function to write the triples of one MeSH term
+def term_ntriples(term, term_uri):
+    label = ntriples_literals(pd.Series([term.replace("_", " ")]), "string").iloc[0]
+    return f"<{term_uri}> {RDF_TYPE} <{EX}MeSHTerm> .\n<{term_uri}> {RDFS_LABEL} {label} .\n"
+
+
+# Function to write the triples of a batch of articles (the MeSH terms themselves come from term_ntriples)
+def article_ntriples(uris, titles, abstracts, mesh_terms, term_uris):
+    """
+    Args:
+        uris, titles, abstracts (pd.Series): One row per article, sharing a unique index.
+        mesh_terms (pd.Series): List of MeSH terms per article.
+        term_uris (MeshTermURIs): Memo used to map terms to graph URIs.
+
+    Returns:
+        pd.Series: The N-Triples text of every article.
+    """
+    subjects = "<" + uris + "> "
+    text = (
+        subjects + f"{RDF_TYPE} <{EX}Article> .\n"
+        + subjects + f"<{SCHEMA}name> " + ntriples_literals(titles, "string") + " .\n"
+        + subjects + f"<{SCHEMA}description> " + ntriples_literals(abstracts, "string") + " .\n"
+        + subjects + f"<{SCHEMA}datePublished> " + ntriples_literals(article_dates(uris), "date") + " .\n"
+        + subjects + f"<{EX}access> " + ntriples_literals(article_access(uris), "integer") + " .\n"
+    )
+    terms = mesh_terms.explode().dropna()
+    if terms.empty:
+        return text
+    about = subjects.loc[terms.index] + f"<{SCHEMA}about> <" + terms.map(term_uris) + "> .\n"
+    return text + about.groupby(level=0).agg("".join).reindex(uris.index, fill_value="")
+
+
+# Function to list the files of a sharded graph, e.g. data/PubMedGraph-000.ttl
+def shard_paths(output_path, shards):
+    if shards == 1:
+        return [output_path]
+    stem, extension = os.path.splitext(output_path)
+    return [f"{stem}-{shard:03d}{extension}" for shard in range(shards)]
+
+
+# Function to build the PubMed graph from the CSV as streamed N-Triples
+def build_graph(csv_path, output_path, chunksize=50000, shards=1, limit=None, term_uri_table=None):
+    """
+    Writes the graph of the CSV to `output_path`, or to `shards` files split by article (see shard_paths).
+    Every shard holds its articles plus the MeSH terms they reference, so each one loads on its own. The
+    minted term URIs are recorded in `term_uri_table` (a TermURITable) if given.
+
+    Returns:
+        dict: articles, terms, seconds and the written paths.
+    """
+    paths = shard_paths(output_path, shards)
+    term_uris = MeshTermURIs()
+    shard_terms = [set() for _ in paths]
+    stats = {"articles": 0, "terms": 0, "paths": paths}
+    start = time.perf_counter()
+
+    files = [open(f"{path}.tmp", "w", encoding="utf-8") for path in paths]
+    try:
+        for f in files:
+            f.write(GRAPH_HEADER)
+        for _, chunk in read_article_chunks(csv_path, chunksize=chunksize, limit=limit):
+            uris = article_uris(chunk["Title"])
+            mesh_terms = parse_mesh_major_column(chunk["meshMajor"])
+            text = article_ntriples(uris, chunk["Title"], chunk["abstractText"], mesh_terms, term_uris)
+            shard_of = article_seeds(uris) % np.uint64(len(paths)) if shards > 1 else np.zeros(len(uris), int)
+            for shard, f in enumerate(files):
+                in_shard = shard_of == shard
+                f.write("".join(text[in_shard]))
+                new_terms = set(mesh_terms[in_shard].explode().dropna()) - shard_terms[shard]
+                shard_terms[shard] |= new_terms
+                f.write("".join(term_ntriples(term, term_uris[term]) for term in sorted(new_terms)))
+            stats["articles"] += len(uris)
+    finally:
+        for f in files:
+            f.close()
+    for path in paths:
+        os.replace(f"{path}.tmp", path)
+
+    if term_uri_table is not None:
+        term_uri_table.add(term_uris)
+    stats["terms"] = len(term_uris)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+# Function to build the graph the way vector_kg.ipynb does (row by row into an rdflib Graph), for benchmarks
+def build_graph_rdflib(csv_path, output_path, limit=None):
+    from rdflib import RDF, RDFS, Literal, Namespace, URIRef
+    from rdflib.namespace import XSD as XSD_NS
+
+    from query_function.uris import article_uri
+
+    df = pd.read_csv(csv_path, nrows=limit).replace([np.inf, -np.inf], np.nan).fillna("")
+    g = Graph()
+    schema, ex = Namespace(SCHEMA), Namespace(EX)
+    g.bind("schema", schema)
+    g.bind("ex", ex)
+    g.add((ex.Article, RDF.type, RDFS.Class))
+    g.add((ex.MeSHTerm, RDF.type, RDFS.Class))
+    for index, row in df.iterrows():
+        uri = URIRef(article_uri(str(row["Title"])))
+        g.add((uri, RDF.type, ex.Article))
+        g.add((uri, schema.name, Literal(str(row["Title"]), datatype=XSD_NS.string)))
+        g.add((uri, schema.description, Literal(str(row["abstractText"]), datatype=XSD_NS.string)))
+        published = datetime.now() - timedelta(days=5 * 365) + timedelta(days=random.randint(0, 5 * 365))
+        g.add((uri, schema.datePublished, Literal(published.date(), datatype=XSD_NS.date)))
+        g.add((uri, ex.access, Literal(random.randint(1, 10), datatype=XSD_NS.integer)))
+        for term in [term.strip() for term in str(row["meshMajor"]).strip("[]'").split(",")]:
+            term_uri = convert_to_uri(term)
+            g.add((term_uri, RDF.type, ex.MeSHTerm))
+            g.add((term_uri, RDFS.label, Literal(term.replace("_", " "), datatype=XSD_NS.string)))
+            g.add((uri, schema.about, term_uri))
+    g.serialize(destination=output_path, format="turtle")
+
+
+# Function to compare build time and peak traced memory of the streamed build and the rdflib build
+def benchmark_build(csv_path, output_path, limit=None, chunksize=50000):
+    results = {}
+    stem, extension = os.path.splitext(output_path)
+    for name, build in (
+        ("rdflib", lambda path: build_graph_rdflib(csv_path, path, limit=limit)),
+        ("streamed", lambda path: build_graph(csv_path, path, chunksize=chunksize, limit=limit)),
+    ):
+        path = f"{stem}.benchmark-{name}{extension}"
+        tracemalloc.start()
+        start = time.perf_counter()
+        build(path)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {"seconds": seconds, "peak_mb": peak / 2 ** 20, "size_mb": os.path.getsize(path) / 2 ** 20}
+        os.remove(path)
+    return results
+
+
+# Function to make sure a graph file is line-based N-Triples, converting a prefixed Turtle file once
+def ensure_ntriples(graph_path):
+    if not os.path.exists(graph_path):
+        with open(graph_path, "w", encoding="utf-8") as f:
+            f.write(GRAPH_HEADER)
+        return
+    with open(graph_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                if line.startswith("<"):
+                    return
+                break
+        else:
+            return
+    g = Graph()
+    g.parse(graph_path, format="ttl")
+    tmp_path = f"{graph_path}.{os.getpid()}.tmp"
+    g.serialize(destination=tmp_path, format="nt", encoding="utf-8")
+    os.replace(tmp_path, graph_path)
+
+
+# Function to replace the triples of some articles and append new ones to an N-Triples graph file
+def apply_graph_delta(graph_path, ntriples, replaced_uris=()):
+    """
+    Args:
+        graph_path (str): N-Triples graph file (see ensure_ntriples).
+        ntriples (iterable): Lines to add, as N-Triples text pieces written one after the other.
+        replaced_uris (iterable): Article URIs whose existing triples are dropped first.
+
+    Only appends when nothing is replaced; otherwise the file is streamed once, dropping the old lines by
+    subject, and swapped in atomically. The added lines are streamed too, so memory follows the largest piece.
+    """
+    if isinstance(ntriples, str):
+        ntriples = [ntriples]
+    subjects = {f"<{uri}> " for uri in replaced_uris}
+    if not subjects:
+        with open(graph_path, "a", encoding="utf-8") as f:
+            f.writelines(ntriples)
+        return
+
+    tmp_path = f"{graph_path}.{os.getpid()}.tmp"
+    with open(graph_path, encoding="utf-8") as source, open(tmp_path, "w", encoding="utf-8") as target:
+        for line in source:
+            if line[:line.find("> ") + 2] not in subjects:
+                target.write(line)
+        target.writelines(ntriples)
+    os.replace(tmp_path, graph_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the PubMed RDF graph from the CSV as N-Triples.")
+    parser.add_argument("csv", help="PubMed CSV, e.g. data/PubMed_Dataset.csv")
+    parser.add_argument("output", help="Graph file to write, e.g. data/PubMedGraph.ttl")
+    parser.add_argument("--shards", type=int, default=1, help="Split the graph into this many files")
+    parser.add_argument("--chunksize", type=int, default=50000, help="CSV rows per chunk")
+    parser.add_argument("--limit", type=int, help="Only use the first LIMIT rows")
+    parser.add_argument("--benchmark", action="store_true", help="Compare with the notebook's rdflib build")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        for name, result in benchmark_build(args.csv, args.output, args.limit, args.chunksize).items():
+            print(
+                f"{name}: {result['seconds']:.2f}s, peak {result['peak_mb']:.1f} MB traced, "
+                f"output {result['size_mb']:.1f} MB"
+            )
+        return
+
+    stats = build_graph(
+        args.csv, args.output, chunksize=args.chunksize, shards=args.shards, limit=args.limit,
+        term_uri_table=get_term_uri_table(create=True)
+    )
+    print(
+        f"Wrote {stats['articles']} articles and {stats['terms']} MeSH terms to {', '.join(stats['paths'])} "
+        f"in {stats['seconds']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
 import requests
 import base64
 from config import DATABRICKS_SERVER_HOSTNAME, DATABRICKS_ACCESS_TOKEN
-from rdflib import Graph, URIRef
-from urllib.parse import quote
 import os
-import urllib.parse
 from SPARQLWrapper import SPARQLWrapper, JSON
 import re
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from query_function.graph_cache import load_graph
+from query_function.mesh_index import load_mesh_index
+from query_function.mesh_store import get_mesh_store
+from query_function.expansion_cache import get_expansion_cache
+from query_function.uris import convert_to_uri, lookup_mesh_term_uri, sanitize_term
+
+MESH_SPARQL_ENDPOINT = os.getenv("MESH_SPARQL_ENDPOINT", "https://id.nlm.nih.gov/mesh/sparql")
 
 
 # Function to download RDF file from Databricks
@@ -53,112 +60,153 @@ def download_rdf_file(workspace_file_path, local_file_path):
         raise Exception(f"Failed to download file (HTTP {response.status_code}): {response.text}")
 
 
-def convert_to_uri(term, base_namespace="http://example.org/mesh/"):
-    """
-    Converts a MeSH term into a standardized URI by replacing spaces and special characters with underscores,
-    ensuring it starts and ends with an underscore, and URL-encoding the term.
-
-    Args:
-        term (str): The MeSH term to convert.
-        base_namespace (str): The base namespace for the URI.
+ARTICLE_FILTER_QUERY = """
+PREFIX schema: <http://schema.org/>
+PREFIX ex: <http://example.org/>
 
-    Returns:
-        URIRef: The formatted URI.
-    """
-    # Step 1: Strip existing leading and trailing underscores
-    stripped_term = term.strip("_")
+SELECT ?article ?title ?abstract ?datePublished ?access ?meshTerm
+WHERE {{
+  ?article a ex:Article ;
+           schema:name ?title ;
+           schema:description ?abstract ;
+           schema:datePublished ?datePublished ;
+           ex:access ?access ;
+           schema:about ?meshTerm .
 
-    # Step 2: Replace spaces, commas, dashes, and other non-alphanumeric characters with underscores
-    # Using regex to replace one or more non-word characters with a single underscore
-    formatted_term = re.sub(r'\W+', '_', stripped_term)
+  ?meshTerm a ex:MeSHTerm .
 
-    # Step 3: Replace multiple consecutive underscores with a single underscore
-    formatted_term = re.sub(r'_+', '_', formatted_term)
-
-    # Step 4: URL-encode the term to handle any remaining special characters
-    encoded_term = quote(formatted_term)
-
-    # Step 5: Ensure single leading and trailing underscores
-    uri = f"{base_namespace}_{encoded_term}_"
-
-    return URIRef(uri)
+  FILTER (?article IN ({article_uris}))
+}}
+"""
 
 
-import re
-from rdflib import Graph, URIRef
-from urllib.parse import quote
-import pandas as pd
+# Function to build the article filter query for the URIs returned by the vector search
+def build_article_filter_query(article_uris):
+    article_uris_string = ", ".join([f"<{str(uri)}>" for uri in article_uris])
+    return ARTICLE_FILTER_QUERY.format(article_uris=article_uris_string)
 
 
-# Updated convert_to_uri function assumed to be present
-def convert_to_uri(term, base_namespace="http://example.org/mesh/"):
-    """
-    Converts a MeSH term into a standardized URI by replacing spaces and special characters with underscores,
-    ensuring it starts and ends with a single underscore, and URL-encoding the term.
+# Function to add a VALUES block binding a variable to several URIs at the start of the WHERE clause
+def add_values_clause(query, variable, uris):
+    match = re.search(r'WHERE\s*\{', query, flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError("The SPARQL query has no WHERE clause to add a VALUES block to.")
+    values = " ".join(f"<{uri}>" for uri in uris)
+    return f"{query[:match.end()]}\n  VALUES ?{variable} {{ {values} }}\n{query[match.end():]}"
 
-    Args:
-        term (str): The MeSH term to convert.
-        base_namespace (str): The base namespace for the URI.
 
-    Returns:
-        URIRef: The formatted URI.
-    """
-    if pd.isna(term):
-        return None  # Handle NaN or None terms gracefully
+# Function to reduce a SELECT query to the article and MeSH term variables, for counting matches
+def project_article_terms(query):
+    projected, count = re.subn(
+        r'SELECT\s.*?(?=\bWHERE\b)', 'SELECT ?article ?meshTerm ', query, count=1,
+        flags=re.IGNORECASE | re.DOTALL
+    )
+    if not count:
+        raise ValueError("The SPARQL query has no SELECT ... WHERE clause to project.")
+    return projected
 
-    # Step 1: Strip existing leading and trailing non-word characters (including underscores)
-    stripped_term = re.sub(r'^\W+|\W+$', '', term)
 
-    # Step 2: Replace non-word characters with underscores (one or more)
-    formatted_term = re.sub(r'\W+', '_', stripped_term)
+def _collect_article_rows(results, article_data):
+    for row in results:
+        article_uri = row['article']
+        if article_uri not in article_data:
+            article_data[article_uri] = {
+                'title': row['title'],
+                'abstract': row['abstract'],
+                'datePublished': row['datePublished'],
+                'access': row['access'],
+                'meshTerms': set()
+            }
+        article_data[article_uri]['meshTerms'].add(str(row['meshTerm']))
 
-    # Step 3: Replace multiple consecutive underscores with a single underscore
-    formatted_term = re.sub(r'_+', '_', formatted_term)
 
-    # Step 4: URL-encode the term to handle any remaining special characters
-    encoded_term = quote(formatted_term)
+# Function to rank articles by match count with a bounded heap, fetching the full fields only for the winners
+def _query_rdf_top_k(g, query, term_positions, top_k):
+    # Pass 1: count matching terms per article without materializing titles and abstracts
+    matched_terms = {}
+    results = g.query(add_values_clause(project_article_terms(query), "meshTerm", term_positions))
+    for row in results:
+        matched_terms.setdefault(row['article'], set()).add(str(row['meshTerm']))
+
+    arrival = {article_uri: i for i, article_uri in enumerate(matched_terms)}
+    winners = heapq.nsmallest(
+        top_k,
+        matched_terms,
+        key=lambda article_uri: (
+            -len(matched_terms[article_uri]),
+            min(term_positions[term] for term in matched_terms[article_uri]),
+            arrival[article_uri]
+        )
+    )
 
-    # Step 5: Add single leading and trailing underscores
-    term_with_underscores = f"_{encoded_term}_"
+    # Pass 2: run the caller's query again for the top_k articles only, so they get exactly its columns
+    article_data = {}
+    if winners:
+        restricted = add_values_clause(add_values_clause(query, "meshTerm", term_positions), "article", winners)
+        _collect_article_rows(g.query(restricted), article_data)
+    return [(article_uri, article_data[article_uri]) for article_uri in winners]
 
-    # Step 6: Concatenate with base_namespace without adding an extra underscore
-    uri = f"{base_namespace}{term_with_underscores}"
 
-    return URIRef(uri)
+# Function to query RDF using SPARQL
+def query_rdf(local_file_path, query, mesh_terms, base_namespace="http://example.org/mesh/", batched=False,
+              top_k=10, lazy=False):
+    """
+    Runs the article query for the selected MeSH terms and ranks articles by the number of matching terms.
 
+    Args:
+        local_file_path (str): Path to the RDF file.
+        query (str): SPARQL query selecting ?article ?title ?abstract ?datePublished ?access ?meshTerm.
+        mesh_terms (list): The selected MeSH terms.
+        base_namespace (str): The base namespace of the MeSH term URIs.
+        batched (bool): Evaluate the query once with all term URIs bound through a VALUES block instead of
+            once per term, so the cost stays flat as more terms are selected.
+        top_k (int): Number of articles to return.
+        lazy (bool): Count matches per article with the query projected to ?article ?meshTerm, keep the
+            top_k in a bounded heap and run the full query again for those articles only, so titles and
+            abstracts are only materialized for the winners. Implies a single batched pass for counting.
 
-# Function to query RDF using SPARQL
-def query_rdf(local_file_path, query, mesh_terms, base_namespace="http://example.org/mesh/"):
+    Returns:
+        list: The top_k (article URI, article data) pairs.
+    """
     if not mesh_terms:
         raise ValueError("The list of MeSH terms is empty or invalid.")
 
     # print("SPARQL Query:", query)
 
-    # Create and parse the RDF graph
-    g = Graph()
-    g.parse(local_file_path, format="ttl")
+    # Reuse the parsed RDF graph from the process-wide cache
+    g = load_graph(local_file_path, format="ttl")
 
     article_data = {}
 
+    if batched or lazy:
+        # Position of each term URI in the selection, used to keep the per-term ranking order for ties
+        term_positions = {}
+        for term in mesh_terms:
+            term_positions.setdefault(str(lookup_mesh_term_uri(term, base_namespace)), len(term_positions))
+
+        if lazy:
+            return _query_rdf_top_k(g, query, term_positions, top_k)
+
+        results = g.query(add_values_clause(query, "meshTerm", term_positions))
+        _collect_article_rows(results, article_data)
+
+        ranked_articles = sorted(
+            article_data.items(),
+            key=lambda item: (
+                -len(item[1]['meshTerms']),
+                min(term_positions[term] for term in item[1]['meshTerms'])
+            )
+        )
+        return ranked_articles[:top_k]
+
     for term in mesh_terms:
         # Convert the term to a valid URI
-        mesh_term_uri = convert_to_uri(term, base_namespace)
+        mesh_term_uri = lookup_mesh_term_uri(term, base_namespace)
         # print("Term:", term, "URI:", mesh_term_uri)
 
         # Perform SPARQL query with initBindings
         results = g.query(query, initBindings={'meshTerm': mesh_term_uri})
-
-        for row in results:
-            article_uri = row['article']
-            if article_uri not in article_data:
-                article_data[article_uri] = {
-                    'title': row['title'],
-                    'abstract': row['abstract'],
-                    'datePublished': row['datePublished'],
-                    'access': row['access'],
-                    'meshTerms': set()
-                }
-            article_data[article_uri]['meshTerms'].add(str(row['meshTerm']))
+        _collect_article_rows(results, article_data)
         # print("DEBUG article_data:", article_data)
 
     # Rank articles by the number of matching MeSH terms
@@ -167,111 +215,221 @@ def query_rdf(local_file_path, query, mesh_terms, base_namespace="http://example
         key=lambda item: len(item[1]['meshTerms']),
         reverse=True
     )
-    return ranked_articles[:10]
+    return ranked_articles[:top_k]
 
 
-def sanitize_term(term):
+# Function to rank articles for MeSH terms using the precomputed inverted index
+def query_rdf_index(local_file_path, article_uris, mesh_terms, base_namespace="http://example.org/mesh/",
+                    top_k=10):
     """
-    Clean and format the term:
-    - Remove leading/trailing quotes (single or double)
-    - Replace underscores with spaces
-    - Ensure no unwanted characters remain
+    Index-backed equivalent of query_rdf with the article filter query: restricts to the given article URIs,
+    ranks them by the number of matching MeSH terms and returns the top_k.
     """
-    if not term:
-        return term
-    term = term.strip("'\"")  # Remove single or double quotes
-    term = term.replace("_", " ")  # Replace underscores with spaces
-    return term.strip()
+    if not mesh_terms:
+        raise ValueError("The list of MeSH terms is empty or invalid.")
 
+    index = load_mesh_index(local_file_path)
+    mesh_term_uris = [lookup_mesh_term_uri(term, base_namespace) for term in mesh_terms]
+    return index.rank(mesh_term_uris, article_uris, limit=top_k)
 
-# Fetch alternative names and triples for a MeSH term
-def get_concept_triples_for_term(term):
-    term = sanitize_term(term)  # Sanitize input term
-    sparql = SPARQLWrapper("https://id.nlm.nih.gov/mesh/sparql")
+
+# Function to write a label as a SPARQL English string literal
+def _sparql_label(label):
+    escaped = label.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"@en'
+
+
+def _chunks(items, chunk_size):
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+# Fetch alternative names and triples for several MeSH labels in one round trip, raising on lookup errors
+def _fetch_concept_triples(terms, mesh_store=None):
+    # Answer from the local MeSH store when one is configured
+    if mesh_store is not None:
+        return {
+            term: list({sanitize_term(label) for label in mesh_store.concept_labels(term)} | {term})
+            for term in terms
+        }
+
+    sparql = SPARQLWrapper(MESH_SPARQL_ENDPOINT)
     query = f"""
     PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX meshv: <http://id.nlm.nih.gov/mesh/vocab#>
     PREFIX mesh: <http://id.nlm.nih.gov/mesh/>
 
-    SELECT ?subject ?p ?pLabel ?o ?oLabel
+    SELECT ?label ?subject ?p ?o ?oLabel
     FROM <http://id.nlm.nih.gov/mesh>
     WHERE {{
-        ?subject rdfs:label "{term}"@en .
+        VALUES ?label {{ {" ".join(_sparql_label(term) for term in terms)} }}
+        ?subject rdfs:label ?label .
         ?subject ?p ?o .
         FILTER(CONTAINS(STR(?p), "concept"))
-        OPTIONAL {{ ?p rdfs:label ?pLabel . }}
         OPTIONAL {{ ?o rdfs:label ?oLabel . }}
     }}
     """
-    try:
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        results = sparql.query().convert()
-
-        triples = set()
-        for result in results["results"]["bindings"]:
+    sparql.setQuery(query)
+    sparql.setReturnFormat(JSON)
+    results = sparql.query().convert()
+
+    # Add each sanitized term itself to ensure it's included
+    triples = {term: {term} for term in terms}
+    for result in results["results"]["bindings"]:
+        label = result.get("label", {}).get("value")
+        if label in triples:
             obj_label = result.get("oLabel", {}).get("value", "No label")
-            triples.add(sanitize_term(obj_label))  # Sanitize term before adding
-
-        # Add the sanitized term itself to ensure it's included
-        triples.add(sanitize_term(term))
-        return list(triples)
+            triples[label].add(sanitize_term(obj_label))  # Sanitize term before adding
+    return {term: list(labels) for term, labels in triples.items()}
 
-    except Exception as e:
-        print(f"Error fetching concept triples for term '{term}': {e}")
-        return []
 
+# Fetch narrower concepts for several MeSH labels in one round trip, raising on lookup errors
+def _fetch_narrower_concepts(terms, mesh_store=None):
+    # Answer from the local MeSH store when one is configured
+    if mesh_store is not None:
+        return {term: list({sanitize_term(label) for label in mesh_store.narrower_labels(term)}) for term in terms}
 
-# Fetch narrower concepts for a MeSH term
-def get_narrower_concepts_for_term(term):
-    term = sanitize_term(term)  # Sanitize input term
-    sparql = SPARQLWrapper("https://id.nlm.nih.gov/mesh/sparql")
+    sparql = SPARQLWrapper(MESH_SPARQL_ENDPOINT)
     query = f"""
     PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
     PREFIX meshv: <http://id.nlm.nih.gov/mesh/vocab#>
     PREFIX mesh: <http://id.nlm.nih.gov/mesh/>
 
-    SELECT ?narrowerConcept ?narrowerConceptLabel
+    SELECT ?label ?narrowerConcept ?narrowerConceptLabel
     WHERE {{
-        ?broaderConcept rdfs:label "{term}"@en .
+        VALUES ?label {{ {" ".join(_sparql_label(term) for term in terms)} }}
+        ?broaderConcept rdfs:label ?label .
         ?narrowerConcept meshv:broaderDescriptor ?broaderConcept .
         ?narrowerConcept rdfs:label ?narrowerConceptLabel .
     }}
     """
-    try:
-        sparql.setQuery(query)
-        sparql.setReturnFormat(JSON)
-        results = sparql.query().convert()
-
-        concepts = set()
-        for result in results["results"]["bindings"]:
+    sparql.setQuery(query)
+    sparql.setReturnFormat(JSON)
+    results = sparql.query().convert()
+
+    concepts = {term: set() for term in terms}
+    for result in results["results"]["bindings"]:
+        label = result.get("label", {}).get("value")
+        if label in concepts:
             subject_label = result.get("narrowerConceptLabel", {}).get("value", "No label")
-            concepts.add(sanitize_term(subject_label))  # Sanitize term before adding
+            concepts[label].add(sanitize_term(subject_label))  # Sanitize term before adding
+    return {term: list(labels) for term, labels in concepts.items()}
+
+
+# Function to name where MeSH expansions come from, so answers cached from another source are not reused
+def _expansion_source(mesh_store):
+    if mesh_store is not None:
+        return f"store:{os.path.abspath(mesh_store.store_path)}"
+    return f"sparql:{MESH_SPARQL_ENDPOINT}"
+
+
+def _cached_batch_lookup(kind, fetch, terms, chunk_size):
+    terms = list(dict.fromkeys(sanitize_term(term) for term in terms))  # Sanitize input terms
+    expansion_cache = get_expansion_cache()
+    # Resolve the source once, so every chunk is fetched from and cached under the same one
+    mesh_store = get_mesh_store()
+    source = _expansion_source(mesh_store)
 
-        return list(concepts)
+    found = {}
+    missing = []
+    for term in terms:
+        cached = expansion_cache.get(kind, term, source)
+        if cached is None:
+            missing.append(term)
+        else:
+            found[term] = cached
 
-    except Exception as e:
-        print(f"Error fetching narrower concepts for term '{term}': {e}")
-        return []
+    for chunk in _chunks(missing, chunk_size):
+        try:
+            fetched = fetch(chunk, mesh_store)
+        except Exception as e:
+            print(f"Error fetching {kind.replace('_', ' ')} for terms {chunk}: {e}")
+            found.update((term, []) for term in chunk)
+            continue
+        for term, labels in fetched.items():
+            expansion_cache.set(kind, term, labels, source)
+        found.update(fetched)
 
+    return {term: found[term] for term in terms}
 
-# Recursive function to fetch narrower concepts to a given depth
-def get_all_narrower_concepts(term, depth=2, current_depth=1):
+
+# Fetch alternative names and triples for several MeSH terms, one SPARQL request per chunk of uncached terms
+def get_concept_triples_for_terms(terms, chunk_size=50):
+    return _cached_batch_lookup("concept_triples", _fetch_concept_triples, terms, chunk_size)
+
+
+# Fetch narrower concepts for several MeSH terms, one SPARQL request per chunk of uncached terms
+def get_narrower_concepts_for_terms(terms, chunk_size=50):
+    return _cached_batch_lookup("narrower_concepts", _fetch_narrower_concepts, terms, chunk_size)
+
+
+# Fetch alternative names and triples for a MeSH term
+def get_concept_triples_for_term(term):
+    return get_concept_triples_for_terms([term])[sanitize_term(term)]
+
+
+# Fetch narrower concepts for a MeSH term
+def get_narrower_concepts_for_term(term):
+    return get_narrower_concepts_for_terms([term])[sanitize_term(term)]
+
+
+# Breadth-first function to fetch narrower concepts to a given depth, one concurrent batch per level
+def get_all_narrower_concepts(term, depth=2, current_depth=1, max_workers=8, time_budget=None, chunk_size=50):
+    """
+    Expands a MeSH term level by level. Each level's frontier is resolved with batched VALUES lookups whose
+    chunks run concurrently on a bounded thread pool, and terms reached through several branches are only
+    fetched once.
+
+    Args:
+        term (str): The MeSH term to expand.
+        depth (int): Deepest level to expand, counting the term itself as level 1.
+        current_depth (int): Level of `term`.
+        max_workers (int): Maximum number of concurrent lookups.
+        time_budget (float): Optional overall budget in seconds. Terms still pending when it runs out are
+            left out of the result.
+        chunk_size (int): Maximum number of labels per SPARQL request.
+
+    Returns:
+        dict: Each expanded term mapped to its list of narrower concepts.
+    """
     term = sanitize_term(term)  # Sanitize input term
     all_concepts = {}
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    executor = ThreadPoolExecutor(max_workers=max_workers)
     try:
-        narrower_concepts = get_narrower_concepts_for_term(term)
-        all_concepts[sanitize_term(term)] = narrower_concepts
-
-        if current_depth < depth:
-            for concept in narrower_concepts:
-                child_concepts = get_all_narrower_concepts(concept, depth, current_depth + 1)
-                all_concepts.update(child_concepts)
-
-    except Exception as e:
-        print(f"Error fetching all narrower concepts for term '{term}': {e}")
+        frontier = [term]
+        while frontier and current_depth <= depth:
+            futures = {
+                executor.submit(get_narrower_concepts_for_terms, chunk, chunk_size): chunk
+                for chunk in _chunks(frontier, chunk_size)
+            }
+            timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            done, pending = wait(futures, timeout=timeout)
+
+            level_concepts = {}
+            for future, chunk in futures.items():
+                if future in done:
+                    try:
+                        level_concepts.update(future.result())
+                    except Exception as e:
+                        print(f"Error fetching all narrower concepts for terms {chunk}: {e}")
+            all_concepts.update(level_concepts)
+            if pending:
+                skipped = sum(len(futures[future]) for future in pending)
+                print(f"Time budget exceeded expanding '{term}', skipped {skipped} terms.")
+                break
+
+            if current_depth < depth:
+                next_frontier = {}
+                for concept in frontier:
+                    for child in all_concepts.get(concept, []):
+                        if child not in all_concepts:
+                            next_frontier[child] = None
+                frontier = list(next_frontier)
+            current_depth += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return all_concepts
 
@@ -0,0 +1,326 @@
+"""
+Compiled binary snapshots of RDF graphs.
+
+A snapshot stores every distinct term once (sorted, so terms can be looked up by binary search) and the
+triples as integer term IDs in three sort orders (SPO, POS, OSP). Loading a snapshot only memory-maps the
+file, so a fresh worker can answer SPARQL queries through ``SnapshotStore`` without parsing any Turtle.
+Compiling a snapshot also writes the MeSH term index (see mesh_index) next to the source file.
+
+Compile a snapshot offline with:
+
+    python -m query_function.rdf_snapshot data/PubMedGraph.ttl
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.store import Store
+
+MAGIC = b"RDFSNAP\x01"
+# magic, source mtime (ns), source size, number of terms, number of triples, namespace block length
+HEADER = struct.Struct("<8sqqIII")
+
+# Column order of each index, as positions in an (s, p, o) triple
+INDEX_ORDERS = {
+    "spo": (0, 1, 2),
+    "pos": (1, 2, 0),
+    "osp": (2, 0, 1),
+}
+
+
+def snapshot_path_for(local_file_path):
+    """Returns the default snapshot location for an RDF file, e.g. data/PubMedGraph.rdfsnap."""
+    return os.path.splitext(local_file_path)[0] + ".rdfsnap"
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+def encode_term(term):
+    """Encodes an rdflib term into the byte key used in the snapshot term table."""
+    if isinstance(term, URIRef):
+        return b"U" + str(term).encode("utf-8")
+    if isinstance(term, BNode):
+        return b"B" + str(term).encode("utf-8")
+    if isinstance(term, Literal):
+        datatype = str(term.datatype) if term.datatype else ""
+        language = term.language or ""
+        return b"L" + "\x00".join((str(term), datatype, language)).encode("utf-8")
+    raise TypeError(f"Unsupported RDF term type: {type(term).__name__}")
+
+
+def decode_term(data):
+    kind, payload = data[:1], data[1:].decode("utf-8")
+    if kind == b"U":
+        return URIRef(payload)
+    if kind == b"B":
+        return BNode(payload)
+    lexical, datatype, language = payload.split("\x00")
+    return Literal(lexical, datatype=URIRef(datatype) if datatype else None, lang=language or None)
+
+
+# Function to compile an RDF file into a binary snapshot
+def compile_snapshot(local_file_path, snapshot_path=None, format="ttl", mesh_index=True):
+    """
+    Parses an RDF file once and writes it as a memory-mappable snapshot.
+
+    Args:
+        local_file_path (str): Path to the source RDF file.
+        snapshot_path (str): Destination path. Defaults to snapshot_path_for(local_file_path).
+        format (str): rdflib parser format of the source file.
+        mesh_index (bool): Also compile the MeSH term index from the parsed graph.
+
+    Returns:
+        str: The path the snapshot was written to.
+    """
+    snapshot_path = snapshot_path or snapshot_path_for(local_file_path)
+    stat = os.stat(local_file_path)
+
+    g = Graph()
+    g.parse(local_file_path, format=format)
+
+    # Intern terms: sort the encoded keys so IDs follow byte order and can be binary searched
+    keys = {}
+    for triple in g:
+        for term in triple:
+            if term not in keys:
+                keys[term] = encode_term(term)
+    sorted_keys = sorted(set(keys.values()))
+    term_ids = {key: i for i, key in enumerate(sorted_keys)}
+    triples = [tuple(term_ids[keys[term]] for term in triple) for triple in g]
+
+    offsets = array("Q", [0])
+    for key in sorted_keys:
+        offsets.append(offsets[-1] + len(key))
+    blob = b"".join(sorted_keys)
+
+    namespaces = json.dumps({prefix: str(namespace) for prefix, namespace in g.namespaces()}).encode("utf-8")
+
+    tmp_path = snapshot_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        def write_aligned(data):
+            f.write(data)
+            f.write(b"\x00" * (_align(f.tell()) - f.tell()))
+
+        write_aligned(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, len(sorted_keys), len(triples),
+                                  len(namespaces)))
+        write_aligned(namespaces)
+        write_aligned(offsets.tobytes())
+        write_aligned(blob)
+        for order in INDEX_ORDERS.values():
+            ordered = sorted(tuple(t[i] for i in order) for t in triples)
+            for column in range(3):
+                write_aligned(array("I", (row[column] for row in ordered)).tobytes())
+    os.replace(tmp_path, snapshot_path)
+
+    if mesh_index:
+        # Imported here: mesh_index loads graphs through graph_cache, which imports this module
+        from query_function.mesh_index import compile_mesh_index
+
+        compile_mesh_index(local_file_path, g=g)
+    return snapshot_path
+
+
+class RDFSnapshot:
+    """Read-only view over a memory-mapped snapshot file."""
+
+    def __init__(self, snapshot_path):
+        if sys.byteorder != "little":
+            raise ValueError("RDF snapshots can only be loaded on little-endian platforms.")
+        with open(snapshot_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+
+        magic, self.source_mtime_ns, self.source_size, n_terms, n_triples, ns_len = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{snapshot_path} is not an RDF snapshot.")
+        self.n_terms = n_terms
+        self.n_triples = n_triples
+
+        position = _align(HEADER.size)
+        self.namespaces = {
+            prefix: URIRef(namespace)
+            for prefix, namespace in json.loads(bytes(buffer[position:position + ns_len]) or b"{}").items()
+        }
+        position = _align(position + ns_len)
+
+        self._offsets = buffer[position:position + (n_terms + 1) * 8].cast("Q")
+        position = _align(position + (n_terms + 1) * 8)
+        blob_size = self._offsets[n_terms] if n_terms else 0
+        self._blob = buffer[position:position + blob_size]
+        position = _align(position + blob_size)
+
+        self._indexes = {}
+        for name in INDEX_ORDERS:
+            columns = []
+            for _ in range(3):
+                columns.append(buffer[position:position + n_triples * 4].cast("I"))
+                position = _align(position + n_triples * 4)
+            self._indexes[name] = columns
+
+        self._terms = {}
+        self._ids = {}
+
+    def is_fresh(self, local_file_path):
+        """True when the snapshot was compiled from the current version of the source file."""
+        try:
+            stat = os.stat(local_file_path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_mtime_ns, stat.st_size) == (self.source_mtime_ns, self.source_size)
+
+    def _key(self, term_id):
+        return bytes(self._blob[self._offsets[term_id]:self._offsets[term_id + 1]])
+
+    def term(self, term_id):
+        term = self._terms.get(term_id)
+        if term is None:
+            term = self._terms[term_id] = decode_term(self._key(term_id))
+        return term
+
+    def term_id(self, term):
+        """Returns the ID of a term, or None if the term does not occur in the snapshot."""
+        if term in self._ids:
+            return self._ids[term]
+        try:
+            key = encode_term(term)
+        except TypeError:
+            return None
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        term_id = lo if lo < self.n_terms and self._key(lo) == key else None
+        self._ids[term] = term_id
+        return term_id
+
+    def triple_ids(self, pattern):
+        """Yields (s, p, o) ID triples matching a pattern of IDs, where None is a wildcard."""
+        s, p, o = pattern
+        if s is not None:
+            name = "osp" if o is not None and p is None else "spo"
+        elif p is not None:
+            name = "pos"
+        elif o is not None:
+            name = "osp"
+        else:
+            name = "spo"
+
+        order = INDEX_ORDERS[name]
+        columns = self._indexes[name]
+        bound = [pattern[i] for i in order]
+
+        # Narrow the row range column by column while the leading columns are bound
+        lo, hi = 0, self.n_triples
+        for column, value in zip(columns, bound):
+            if value is None:
+                break
+            lo, hi = bisect_left(column, value, lo, hi), bisect_right(column, value, lo, hi)
+            if lo >= hi:
+                return
+
+        first, second, third = columns
+        for row in range(lo, hi):
+            ids = [0, 0, 0]
+            ids[order[0]], ids[order[1]], ids[order[2]] = first[row], second[row], third[row]
+            if all(b is None or b == i for b, i in zip(pattern, ids)):
+                yield tuple(ids)
+
+    def triples(self, pattern):
+        ids = []
+        for term in pattern:
+            if term is None:
+                ids.append(None)
+                continue
+            term_id = self.term_id(term)
+            if term_id is None:
+                return
+            ids.append(term_id)
+        for s, p, o in self.triple_ids(tuple(ids)):
+            yield self.term(s), self.term(p), self.term(o)
+
+
+class SnapshotStore(Store):
+    """Read-only rdflib store backed by an RDFSnapshot, so Graph.query() works unchanged."""
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, snapshot):
+        super().__init__()
+        self.snapshot = snapshot
+
+    def triples(self, triple_pattern, context=None):
+        for triple in self.snapshot.triples(triple_pattern):
+            yield triple, iter(())
+
+    def __len__(self, context=None):
+        return self.snapshot.n_triples
+
+    def add(self, triple, context, quoted=False):
+        raise TypeError("SnapshotStore is read-only.")
+
+    def remove(self, triple, context=None):
+        raise TypeError("SnapshotStore is read-only.")
+
+    def namespaces(self):
+        yield from self.snapshot.namespaces.items()
+
+    def namespace(self, prefix):
+        return self.snapshot.namespaces.get(prefix)
+
+    def prefix(self, namespace):
+        for prefix, bound in self.snapshot.namespaces.items():
+            if bound == namespace:
+                return prefix
+        return None
+
+
+# Function to open a snapshot as an rdflib Graph
+def load_snapshot_graph(snapshot_path):
+    return Graph(store=SnapshotStore(RDFSnapshot(snapshot_path)))
+
+
+# Function to open the snapshot for an RDF file if it exists and is up to date
+def load_fresh_snapshot_graph(local_file_path, snapshot_path=None):
+    snapshot_path = snapshot_path or snapshot_path_for(local_file_path)
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        snapshot = RDFSnapshot(snapshot_path)
+    except (ValueError, struct.error) as e:
+        print(f"Ignoring unreadable RDF snapshot {snapshot_path}: {e}")
+        return None
+    if not snapshot.is_fresh(local_file_path):
+        return None
+    return Graph(store=SnapshotStore(snapshot))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile an RDF file into a memory-mappable snapshot.")
+    parser.add_argument("source", help="RDF file to compile, e.g. data/PubMedGraph.ttl")
+    parser.add_argument("-o", "--output", help="Snapshot path (default: <source>.rdfsnap)")
+    parser.add_argument("--format", default="ttl", help="rdflib parser format of the source file")
+    parser.add_argument("--no-mesh-index", action="store_true", help="Skip compiling the MeSH term index")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    path = compile_snapshot(args.source, args.output, format=args.format, mesh_index=not args.no_mesh_index)
+    print(f"Snapshot written to {path} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
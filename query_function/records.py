@@ -0,0 +1,56 @@
+import ast
+import uuid as uuid_module
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# Article properties shown in the Tab 1 results table; the abstract is fetched separately, on demand
+ARTICLE_TABLE_PROPERTIES = ("title", "article_URI", "meshMajor")
+
+
+def parse_mesh_major(value):
+    """
+    Parses a meshMajor property into a list of terms.
+
+    The CSV stores it as the string form of a Python list ("['Mouth Neoplasms', 'Humans']"); objects that
+    already hold a list are returned as is.
+    """
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    try:
+        terms = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        terms = value.strip("[]").split(",")
+    return [str(term).strip().strip("'\"") for term in terms if str(term).strip()]
+
+
+@dataclass
+class ArticleResult:
+    """One Article search result, decoded once from the raw {"uuid", "properties", "distance"} dict."""
+
+    uuid: uuid_module.UUID
+    distance: Optional[float]
+    title: str = "N/A"
+    article_uri: Optional[str] = None
+    mesh_terms: List[str] = field(default_factory=list)
+    abstract: Optional[str] = None  # None when abstractText was not among the returned properties
+    score: Optional[float] = None  # Fused score of a hybrid search
+
+    @classmethod
+    def from_result(cls, result):
+        properties = result["properties"]
+        return cls(
+            uuid=result["uuid"],
+            distance=result.get("distance"),
+            title=properties.get("title") or "N/A",
+            article_uri=properties.get("article_URI"),
+            mesh_terms=parse_mesh_major(properties.get("meshMajor")),
+            abstract=properties.get("abstractText"),
+            score=result.get("score"),
+        )
+
+
+# Function to decode raw article search results into ArticleResult records
+def to_article_results(results):
+    return [ArticleResult.from_result(result) for result in results]
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from query_function.embedding_cache import normalize_query_text
+
+
+class CollectionEpochs:
+    """
+    Per-collection version numbers kept in a small JSON file.
+
+    Ingestion bumps a collection's epoch after loading new objects; readers only stat the file and reload
+    it when it changed, so checking for staleness costs no network I/O and works across processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._epochs = {}
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._epochs, self._signature = {}, None
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with open(self.path, encoding="utf-8") as f:
+                self._epochs = json.load(f)
+            self._signature = signature
+
+    def get(self, collection):
+        with self._lock:
+            self._refresh()
+            return self._epochs.get(collection, 0)
+
+    def bump(self, collection):
+        with self._lock:
+            self._refresh()
+            epochs = dict(self._epochs)
+            epochs[collection] = epochs.get(collection, 0) + 1
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(epochs, f)
+            os.replace(tmp_path, self.path)
+            self._signature = None
+            return epochs[collection]
+
+
+class SearchResultCache:
+    """
+    TTL + LRU cache of vector search results keyed on (collection, normalized query, limit, options).
+
+    Every entry remembers the collection epoch it was computed under; an entry from an older epoch is
+    evicted on lookup, so a bump after ingestion invalidates all cached searches of that collection.
+    """
+
+    def __init__(self, epochs, maxsize=256, ttl=600):
+        self.epochs = epochs
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, epoch, results)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(collection, query_text, limit, *options):
+        return (collection, normalize_query_text(query_text), limit) + tuple(options)
+
+    def get(self, key):
+        epoch = self.epochs.get(key[0])
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_epoch, results = entry
+                if entry_epoch != epoch:
+                    del self._entries[key]
+                    self.stale_evictions += 1
+                elif expires_at <= now:
+                    del self._entries[key]
+                    self.expired += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(results)
+            self.misses += 1
+            return None
+
+    def set(self, key, results):
+        epoch = self.epochs.get(key[0])
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, epoch, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stale_evictions": self.stale_evictions,
+                "expired": self.expired,
+            }
+
+
+_collection_epochs = CollectionEpochs(os.getenv("COLLECTION_EPOCHS_PATH", "data/collection_epochs.json"))
+_search_result_cache = SearchResultCache(_collection_epochs)
+
+
+# Function to invalidate cached searches of a collection, called by ingestion after loading new objects
+def bump_collection_epoch(collection):
+    return _collection_epochs.bump(collection)
+
+
+def get_search_result_cache():
+    return _search_result_cache
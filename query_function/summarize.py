@@ -0,0 +1,298 @@
+"""
+LLM summarization of the filtered articles (Tab 3).
+
+Abstracts are packed into the prompt by rank until a token budget is spent, counted with the model's tiktoken
+encoding, so the prompt size stays bounded however many articles are kept. The completion is streamed, so the
+first tokens show up as soon as the model produces them instead of after the whole summary.
+
+Result sets too large for one prompt are summarized map-reduce style: the ranked articles are split into
+token-budgeted chunks, the chunks are summarized concurrently by a bounded worker pool (with retries and
+backoff), and the partial summaries are reduced into one streamed answer, all within a wall-clock budget.
+
+The OpenAI client honors OPENAI_BASE_URL, which points it at any compatible completion server.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+
+import openai
+import tiktoken
+from openai import OpenAI
+
+from config import OPENAI_API_KEY
+
+GPT_MODELS = ["gpt-4o", "gpt-4o-mini"]
+DEFAULT_MODEL = GPT_MODELS[1]
+SYSTEM_PROMPT = "You summarize medical texts."
+DEFAULT_USER_QUERY = (
+    "Summarize the key information here in bullet points. Make it understandable to someone without a medical "
+    "degree."
+)
+# Tokens of abstracts packed into one prompt, well within the context window of GPT_MODELS
+DEFAULT_CONTEXT_TOKENS = 12000
+# A partial abstract shorter than this is left out rather than cut
+MIN_TRUNCATED_TOKENS = 64
+
+# Map-reduce summarization defaults
+MAP_CHUNK_TOKENS = 4000
+MAP_WORKERS = 4
+MAP_RETRIES = 3
+MAP_BACKOFF_SECONDS = 1.0
+SUMMARY_TIME_BUDGET_SECONDS = 60.0
+# Share of the time budget kept for the reduce step
+REDUCE_BUDGET_SHARE = 0.3
+MAP_PROMPT = (
+    "Summarize the findings of these articles that are relevant to the request below, in a few bullet points. "
+    "Keep article titles next to their findings.\n\nRequest: {user_query}"
+)
+REDUCE_PROMPT = (
+    "The text below holds partial summaries of groups of articles, best ranked groups first. Combine them into "
+    "one answer to this request: {user_query}"
+)
+# Errors worth retrying: rate limits, timeouts, dropped connections and server errors
+RETRYABLE_ERRORS = (
+    openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError
+)
+
+_openai_client = None
+_openai_client_lock = threading.Lock()
+
+
+# Function to get the shared OpenAI client
+def get_openai_client():
+    global _openai_client
+    if _openai_client is None:
+        with _openai_client_lock:
+            if _openai_client is None:
+                _openai_client = OpenAI(api_key=OPENAI_API_KEY)
+    return _openai_client
+
+
+# Function to get the tiktoken encoding of a model, loaded once
+@lru_cache(maxsize=None)
+def get_encoding(model=DEFAULT_MODEL):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+# Function to format one ranked article for the prompt
+def article_text(data):
+    return f"Title: {data['title']} Abstract: {data['abstract']}"
+
+
+# Function to pack the abstracts of ranked articles into a token budget, best ranked first
+def pack_abstracts(ranked_articles, max_tokens=DEFAULT_CONTEXT_TOKENS, model=DEFAULT_MODEL):
+    """
+    Adds whole articles in rank order while they fit; the first one that does not fit is cut to the tokens
+    left (unless fewer than MIN_TRUNCATED_TOKENS remain after other articles) and packing stops there.
+
+    Args:
+        ranked_articles (list): (article_uri, data) pairs as returned by query_rdf_index.
+        max_tokens (int): Token budget of the packed text.
+        model (str): Model whose encoding counts the tokens.
+
+    Returns:
+        dict: text (the packed context), tokens, articles (number packed, the last one possibly cut),
+            truncated (whether an article was cut) and total (number of ranked articles).
+    """
+    encoding = get_encoding(model)
+    separator_tokens = len(encoding.encode(" "))
+    parts, tokens, truncated = [], 0, False
+    for _, data in ranked_articles:
+        text = article_text(data)
+        encoded = encoding.encode(text)
+        separator = separator_tokens if parts else 0
+        if tokens + separator + len(encoded) <= max_tokens:
+            parts.append(text)
+            tokens += separator + len(encoded)
+            continue
+        remaining = max_tokens - tokens - separator
+        if remaining >= MIN_TRUNCATED_TOKENS or not parts:
+            parts.append(encoding.decode(encoded[:remaining]))
+            tokens += separator + remaining
+            truncated = True
+        break
+    return {
+        "text": " ".join(parts),
+        "tokens": tokens,
+        "articles": len(parts),
+        "truncated": truncated,
+        "total": len(ranked_articles),
+    }
+
+
+def build_messages(context, user_query):
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"{user_query}\n\n{context}"},
+    ]
+
+
+# Function to stream a summary of the packed context, yielding text as it arrives
+def stream_summary(context, user_query, client=None, model=DEFAULT_MODEL, timings=None):
+    """
+    Args:
+        context (str): Packed abstracts (see pack_abstracts).
+        user_query (str): Instruction for the model.
+        client (OpenAI): Defaults to the shared client.
+        model (str): Chat model to use.
+        timings (dict): If given, receives first_token_seconds (time to first token) and total_seconds.
+
+    Yields:
+        str: Pieces of the summary, in order.
+    """
+    client = client or get_openai_client()
+    start = time.perf_counter()
+    stream = client.chat.completions.create(
+        messages=build_messages(context, user_query),
+        model=model,
+        temperature=0,
+        stream=True,
+    )
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if timings is not None and "first_token_seconds" not in timings:
+                    timings["first_token_seconds"] = time.perf_counter() - start
+                yield delta
+    finally:
+        stream.close()
+        if timings is not None:
+            timings["total_seconds"] = time.perf_counter() - start
+
+
+# Function to generate the whole summary at once (the streamed pieces joined)
+def generate_summary(context, user_query, client=None, model=DEFAULT_MODEL, timings=None):
+    return "".join(stream_summary(context, user_query, client=client, model=model, timings=timings)).strip()
+
+
+# Function to split ranked articles into chunks of at most `chunk_tokens` tokens, keeping rank order
+def chunk_articles(ranked_articles, chunk_tokens=MAP_CHUNK_TOKENS, model=DEFAULT_MODEL):
+    """
+    Returns a list of chunks, each a list of (article_uri, data) pairs. An article longer than a chunk gets
+    a chunk of its own (and is cut by pack_abstracts when the chunk is packed).
+    """
+    encoding = get_encoding(model)
+    chunks, current, tokens = [], [], 0
+    for article in ranked_articles:
+        cost = len(encoding.encode(article_text(article[1]))) + 1
+        if current and tokens + cost > chunk_tokens:
+            chunks.append(current)
+            current, tokens = [], 0
+        current.append(article)
+        tokens += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Function to run one completion with retries and exponential backoff, giving up at `deadline`
+def complete_with_retry(messages, client=None, model=DEFAULT_MODEL, retries=MAP_RETRIES,
+                        backoff=MAP_BACKOFF_SECONDS, deadline=None):
+    """
+    Each attempt's timeout is the time left until `deadline` (a time.monotonic() value), and no retry
+    starts after it. Raises the last error once retries or time run out.
+    """
+    client = client or get_openai_client()
+    for attempt in range(retries + 1):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError("Summary time budget exhausted")
+        try:
+            response = client.with_options(timeout=remaining, max_retries=0).chat.completions.create(
+                messages=messages, model=model, temperature=0
+            )
+            return response.choices[0].message.content.strip()
+        except RETRYABLE_ERRORS:
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            if attempt == retries or (deadline is not None and time.monotonic() + delay >= deadline):
+                raise
+            time.sleep(delay)
+
+
+# Function to summarize chunks of articles concurrently, in rank order, within a deadline
+def map_summaries(chunks, user_query, client=None, model=DEFAULT_MODEL, max_workers=MAP_WORKERS,
+                  deadline=None, chunk_tokens=MAP_CHUNK_TOKENS):
+    """
+    Returns (summaries, failed): the partial summary of every chunk finished before `deadline` in chunk
+    order (None for the others), and the number of chunks that failed or ran out of time.
+    """
+    client = client or get_openai_client()
+    prompt = MAP_PROMPT.format(user_query=user_query)
+    summaries = [None] * len(chunks)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(
+                complete_with_retry,
+                build_messages(pack_abstracts(chunk, max_tokens=chunk_tokens, model=model)["text"], prompt),
+                client, model, deadline=deadline
+            ): i
+            for i, chunk in enumerate(chunks)
+        }
+        pending = set(futures)
+        while pending:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break  # Out of time: the remaining chunks are left out of the answer
+            for future in done:
+                if future.exception() is None:
+                    summaries[futures[future]] = future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return summaries, sum(summary is None for summary in summaries)
+
+
+# Function to stream a map-reduce summary of ranked articles, finishing within `time_budget` seconds
+def stream_map_reduce_summary(ranked_articles, user_query, client=None, model=DEFAULT_MODEL,
+                              chunk_tokens=MAP_CHUNK_TOKENS, max_workers=MAP_WORKERS,
+                              time_budget=SUMMARY_TIME_BUDGET_SECONDS, stats=None):
+    """
+    Args:
+        ranked_articles (list): (article_uri, data) pairs as returned by query_rdf_index.
+        user_query (str): Instruction for the model.
+        client (OpenAI): Defaults to the shared client.
+        model (str): Chat model used for both steps.
+        chunk_tokens (int): Token budget of one map chunk.
+        max_workers (int): Chunks summarized at once.
+        time_budget (float): Seconds for the whole summary; the map step gets all but REDUCE_BUDGET_SHARE.
+        stats (dict): If given, receives chunks, failed_chunks, map_seconds, first_token_seconds and
+            total_seconds.
+
+    Yields:
+        str: Pieces of the final summary, in order.
+    """
+    client = client or get_openai_client()
+    start = time.monotonic()
+    chunks = chunk_articles(ranked_articles, chunk_tokens=chunk_tokens, model=model)
+    map_deadline = start + time_budget * (1 - REDUCE_BUDGET_SHARE)
+    summaries, failed = map_summaries(
+        chunks, user_query, client=client, model=model, max_workers=max_workers, deadline=map_deadline,
+        chunk_tokens=chunk_tokens
+    )
+    if stats is not None:
+        stats.update({"chunks": len(chunks), "failed_chunks": failed, "map_seconds": time.monotonic() - start})
+    partials = [summary for summary in summaries if summary]
+    if not partials:
+        raise RuntimeError(f"None of the {len(chunks)} chunks could be summarized in time")
+    if len(partials) == 1:
+        pieces = iter(partials)
+    else:
+        reduce_client = client.with_options(timeout=max(start + time_budget - time.monotonic(), 1.0))
+        pieces = stream_summary(
+            "\n\n".join(partials), REDUCE_PROMPT.format(user_query=user_query), client=reduce_client, model=model
+        )
+    for piece in pieces:
+        if stats is not None and "first_token_seconds" not in stats:
+            stats["first_token_seconds"] = time.monotonic() - start
+        yield piece
+    if stats is not None:
+        stats["total_seconds"] = time.monotonic() - start
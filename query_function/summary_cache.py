@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# Function to derive the cache key of a summary from everything that determines it
+def summary_key(article_uris, user_query, model, context=""):
+    """
+    Hashes the ranked article URIs (order matters), the prompt and the model. The packed context is hashed
+    in as well, so a summary is recomputed when the abstracts behind the same URIs change.
+    """
+    payload = json.dumps(
+        {
+            "articles": [str(uri) for uri in article_uris],
+            "prompt": user_query.strip(),
+            "model": model,
+            "context": hashlib.sha256(context.encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    Persistent cache of LLM summaries in SQLite, bounded to `maxsize` entries by least recent use.
+
+    Each entry keeps how long the completion took, so a hit can report the latency it saved.
+    """
+
+    def __init__(self, path, maxsize=512):
+        self.path = path
+        self.maxsize = maxsize
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS summary_cache ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, summary TEXT NOT NULL, "
+            "generation_seconds REAL NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def get(self, key):
+        """Returns {"summary", "generation_seconds", "created_at"} for a cached summary, or None on a miss."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT summary, generation_seconds, created_at FROM summary_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE summary_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+            self.hits += 1
+            self.seconds_saved += row[1]
+            return {"summary": row[0], "generation_seconds": row[1], "created_at": row[2]}
+
+    def set(self, key, summary, generation_seconds, model=""):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO summary_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, summary, generation_seconds, now, now)
+            )
+            # Drop the least recently used summaries beyond maxsize
+            self._connection.execute(
+                "DELETE FROM summary_cache WHERE rowid IN ("
+                "SELECT rowid FROM summary_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)
+            )
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM summary_cache")
+            self._connection.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM summary_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "seconds_saved": self.seconds_saved,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+
+
+# Function to replace the process-wide summary cache, e.g. with a different file or size
+def configure_summary_cache(path, maxsize=512):
+    global _summary_cache
+    with _summary_cache_lock:
+        _summary_cache = SummaryCache(path, maxsize=maxsize)
+    return _summary_cache
+
+
+# Function to get the process-wide summary cache, persisted at SUMMARY_CACHE_PATH
+def get_summary_cache():
+    global _summary_cache
+    if _summary_cache is None:
+        with _summary_cache_lock:
+            if _summary_cache is None:
+                _summary_cache = SummaryCache(os.getenv("SUMMARY_CACHE_PATH", "data/summary_cache.sqlite"))
+    return _summary_cache
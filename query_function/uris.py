@@ -0,0 +1,206 @@
+"""
+Canonical URI minting for the PubMed graph and the vector collections.
+
+Ingestion, the graph builder and the query path all mint URIs here, so a title or MeSH term always maps to
+the same URI on both sides. Patterns are compiled once and minted URIs are memoized. Ingestion and the graph
+builder also record every MeSH term they mint in a small SQLite table, so the query path resolves the
+selected terms with dictionary lookups.
+
+Check that a recorded table and a CSV agree with the minting functions with:
+
+    python -m query_function.uris data/term_uris.sqlite --csv data/PubMed_Dataset.csv
+"""
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import urllib.parse
+from functools import lru_cache
+
+import pandas as pd
+from rdflib import URIRef
+
+MESH_BASE_URI = "http://example.org/mesh/"
+ARTICLE_BASE_URI = "http://example.org/article"
+# Base of the URI property of objects in the term vector collection (differs from the graph URIs)
+TERM_OBJECT_BASE_URI = "http://example.org/mesh"
+
+EDGE_NON_WORD_PATTERN = re.compile(r'^\W+|\W+$')
+NON_WORD_PATTERN = re.compile(r'\W+')
+UNDERSCORES_PATTERN = re.compile(r'_+')
+# Characters dropped from or replaced in titles and term objects before URL-encoding, like the notebook does
+TEXT_REPLACEMENTS = ((" ", "_"), ('"', ""), ("<", ""), (">", ""), ("'", "_"))
+
+
+# Function to mint the graph URI of a MeSH term
+@lru_cache(maxsize=65536)
+def mesh_term_uri(term, base_namespace=MESH_BASE_URI):
+    """
+    Strips leading and trailing non-word characters, replaces runs of non-word characters with a single
+    underscore, URL-encodes the result and wraps it in single underscores, e.g.
+    "Carcinoma, Squamous Cell" -> http://example.org/mesh/_Carcinoma_Squamous_Cell_
+    """
+    formatted_term = NON_WORD_PATTERN.sub('_', EDGE_NON_WORD_PATTERN.sub('', term))
+    formatted_term = UNDERSCORES_PATTERN.sub('_', formatted_term)
+    return f"{base_namespace}_{urllib.parse.quote(formatted_term)}_"
+
+
+def convert_to_uri(term, base_namespace=MESH_BASE_URI):
+    """
+    Converts a MeSH term into its graph URI (see mesh_term_uri).
+
+    Args:
+        term (str): The MeSH term to convert.
+        base_namespace (str): The base namespace for the URI.
+
+    Returns:
+        URIRef: The formatted URI, or None for a missing term.
+    """
+    if term is None or pd.isna(term):
+        return None  # Handle NaN or None terms gracefully
+    return URIRef(mesh_term_uri(term, base_namespace))
+
+
+def _replace_text(text):
+    text = text.strip()
+    for old, new in TEXT_REPLACEMENTS:
+        text = text.replace(old, new)
+    return text
+
+
+# Function to mint the URI of an article from its title
+@lru_cache(maxsize=65536)
+def article_uri(title):
+    return f"{ARTICLE_BASE_URI}/{urllib.parse.quote(_replace_text(title))}"
+
+
+# Function to mint the URIs of a column of titles at once, identical to article_uri per title
+def article_uris(titles):
+    sanitized = titles.str.strip()
+    for old, new in TEXT_REPLACEMENTS:
+        sanitized = sanitized.str.replace(old, new, regex=False)
+    return ARTICLE_BASE_URI + "/" + sanitized.map(urllib.parse.quote)
+
+
+# Function to mint the URI stored with an object of the term vector collection
+@lru_cache(maxsize=65536)
+def term_object_uri(term):
+    return f"{TERM_OBJECT_BASE_URI}/{urllib.parse.quote(_replace_text(term))}"
+
+
+def sanitize_term(term):
+    """
+    Clean and format the term:
+    - Remove leading/trailing quotes (single or double)
+    - Replace underscores with spaces
+    - Ensure no unwanted characters remain
+    """
+    if not term:
+        return term
+    term = term.strip("'\"")  # Remove single or double quotes
+    term = term.replace("_", " ")  # Replace underscores with spaces
+    return term.strip()
+
+
+class TermURITable:
+    """Persisted MeSH term -> graph URI table, read into a dict on first lookup."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS term_uris (term TEXT PRIMARY KEY, uri TEXT NOT NULL)")
+        self._connection.commit()
+        self._uris = None
+        self._lock = threading.Lock()
+
+    def uris(self):
+        with self._lock:
+            if self._uris is None:
+                self._uris = dict(self._connection.execute("SELECT term, uri FROM term_uris"))
+            return self._uris
+
+    def get(self, term):
+        return self.uris().get(term)
+
+    def lookup(self, term, base_namespace=MESH_BASE_URI):
+        """Resolves a term like the query path does: the recorded URI, minted if the term is missing."""
+        uri = self.get(term) if base_namespace == MESH_BASE_URI else None
+        return URIRef(uri if uri is not None else mesh_term_uri(term, base_namespace))
+
+    def add(self, term_uris):
+        """Records a {term: uri} mapping."""
+        with self._lock:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO term_uris VALUES (?, ?)", term_uris.items())
+            if self._uris is not None:
+                self._uris.update(term_uris)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_term_uri_table = None
+_term_uri_table_lock = threading.Lock()
+
+
+# Function to get the term URI table at TERM_URI_TABLE_PATH, if ingestion has written one
+def get_term_uri_table(create=False):
+    global _term_uri_table
+    path = os.getenv("TERM_URI_TABLE_PATH", "data/term_uris.sqlite")
+    if _term_uri_table is None and (create or os.path.exists(path)):
+        with _term_uri_table_lock:
+            if _term_uri_table is None:
+                _term_uri_table = TermURITable(path)
+    return _term_uri_table
+
+
+# Function to resolve the graph URI of a MeSH term on the query path: a table lookup, minted if missing
+def lookup_mesh_term_uri(term, base_namespace=MESH_BASE_URI):
+    table = get_term_uri_table()
+    if table is not None:
+        return table.lookup(term, base_namespace)
+    return URIRef(mesh_term_uri(term, base_namespace))
+
+
+# Function to check that recorded term URIs and the URIs minted for a CSV match the minting functions
+def check_consistency(table, csv_path=None, limit=None):
+    """
+    Returns a list of (kind, input, recorded or vectorized URI, minted URI) mismatches; empty when the
+    ingest and query sides agree.
+    """
+    from query_function.pubmed_csv import parse_mesh_major_column, read_article_chunks
+
+    mismatches = [
+        ("term", term, uri, mesh_term_uri(term)) for term, uri in table.uris().items() if uri != mesh_term_uri(term)
+    ]
+    if csv_path is not None:
+        for _, chunk in read_article_chunks(csv_path, limit=limit):
+            for title, uri in zip(chunk["Title"], article_uris(chunk["Title"])):
+                if uri != article_uri(title):
+                    mismatches.append(("article", title, uri, article_uri(title)))
+            for term in set(parse_mesh_major_column(chunk["meshMajor"]).explode().dropna()):
+                if str(table.lookup(term)) != mesh_term_uri(term):
+                    mismatches.append(("lookup", term, str(table.lookup(term)), mesh_term_uri(term)))
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check recorded term URIs against the canonical minting.")
+    parser.add_argument("table", help="Term URI table, e.g. data/term_uris.sqlite")
+    parser.add_argument("--csv", help="Also check the article and term URIs minted for this PubMed CSV")
+    parser.add_argument("--limit", type=int, help="Only check the first LIMIT CSV rows")
+    args = parser.parse_args(argv)
+
+    table = TermURITable(args.table)
+    mismatches = check_consistency(table, args.csv, args.limit)
+    for kind, text, found, expected in mismatches[:20]:
+        print(f"{kind} {text!r}: {found} != {expected}")
+    print(f"{len(table.uris())} recorded terms, {len(mismatches)} mismatches")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""
+Pluggable vector search backends.
+
+query_weaviate_articles / query_weaviate_terms accept either a Weaviate client or a VectorBackend. Every
+backend returns the same result dicts ({"uuid", "properties", "distance", "score"}), so the app does not care
+whether a search ran against Weaviate Cloud or in-process against a local index.
+"""
+import hashlib
+import heapq
+import json
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+class VectorBackend:
+    """Interface of a vector search backend."""
+
+    def search(self, collection, query_text, limit=10, vector=None, alpha=None, filters=None):
+        """
+        Returns up to `limit` result dicts with "uuid", "properties" and "distance" (cosine).
+
+        `vector` is an already embedded query. With `alpha`, the search is hybrid: vector and BM25 scores are
+        fused as alpha * vector + (1 - alpha) * keyword and results carry a "score". `filters` is an
+        ArticleFilter applied before ranking.
+        """
+        raise NotImplementedError
+
+    def fetch_objects(self, collection, uuids, return_properties=None):
+        """Returns {uuid: properties} for the given UUIDs, restricted to `return_properties` if given."""
+        raise NotImplementedError
+
+    def property_names(self, collection):
+        """Returns the names of the properties objects of the collection have."""
+        raise NotImplementedError
+
+
+class HashingEmbedder:
+    """
+    Dependency-free local embedding function: hashed bag of words and word bigrams, L2-normalized.
+    Good enough for offline development and tests; any callable mapping a list of texts to an
+    (n, dim) array can be used instead.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                vectors[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return _normalize(vectors)
+
+
+class OpenAIEmbedder:
+    """
+    Embeds texts with the OpenAI embeddings API. Use the same model as the collection's text2vec-openai
+    vectorizer, otherwise query vectors and stored vectors are not comparable.
+    """
+
+    def __init__(self, api_key, model="text-embedding-3-small"):
+        from openai import OpenAI
+
+        self.client = OpenAI(api_key=api_key)
+        self.model = model
+
+    def __call__(self, texts):
+        response = self.client.embeddings.create(input=list(texts), model=self.model)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LocalCollection:
+    """
+    Vectors of one collection in a (n, dim) float32 matrix plus object UUIDs and properties.
+
+    Small collections are searched exhaustively. Calling build_index() adds an IVF index (k-means
+    centroids with one inverted list per centroid), after which only the `n_probe` closest lists are scanned.
+    """
+
+    def __init__(self, vectors=None, uuids=None, properties=None):
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        self.uuids = list(uuids or [])
+        self.properties = list(properties or [])
+        self._positions = {object_uuid: i for i, object_uuid in enumerate(self.uuids)}
+        self.centroids = None
+        self.lists = None
+        self._keywords = None
+
+    def __len__(self):
+        return len(self.uuids)
+
+    def upsert(self, uuids, properties, vectors):
+        """Inserts objects, replacing the vector and properties of UUIDs that already exist."""
+        vectors = _normalize(vectors)
+        if len(self.uuids) == 0:
+            self.vectors = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        else:
+            self.vectors = np.array(self.vectors)  # Copy out of a read-only memory map before writing
+
+        new_rows = []
+        for object_uuid, props, vector in zip(uuids, properties, vectors):
+            object_uuid = uuid.UUID(str(object_uuid))
+            position = self._positions.get(object_uuid)
+            if position is None:
+                self._positions[object_uuid] = len(self.uuids) + len(new_rows)
+                new_rows.append((object_uuid, props, vector))
+            elif position >= len(self.uuids):
+                # Repeated within this batch: the last copy wins
+                new_rows[position - len(self.uuids)] = (object_uuid, props, vector)
+            else:
+                self.properties[position] = props
+                self.vectors[position] = vector
+
+        if new_rows:
+            self.uuids.extend(row[0] for row in new_rows)
+            self.properties.extend(row[1] for row in new_rows)
+            self.vectors = np.vstack([self.vectors, np.stack([row[2] for row in new_rows])])
+        # Any existing IVF and keyword index no longer covers every object
+        self.centroids = self.lists = None
+        self._keywords = None
+
+    def build_index(self, n_lists=None, n_iter=10, seed=0):
+        n = len(self.uuids)
+        if n == 0:
+            return
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        vectors = np.asarray(self.vectors)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for k in range(n_lists):
+                members = vectors[assignment == k]
+                if len(members):
+                    centroids[k] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == k) for k in range(n_lists)]
+
+    def allowed(self, filters):
+        """Boolean mask of the objects passing `filters`, or None when nothing is filtered."""
+        if filters is None or filters.is_empty():
+            return None
+        return np.fromiter((filters.matches(props) for props in self.properties), dtype=bool, count=len(self))
+
+    def _keyword_index(self):
+        # token -> (positions, term frequencies) over all string properties, plus document lengths
+        if self._keywords is None:
+            postings = {}
+            lengths = np.zeros(len(self.uuids), dtype=np.float32)
+            for position, props in enumerate(self.properties):
+                tokens = TOKEN_PATTERN.findall(
+                    " ".join(value for value in props.values() if isinstance(value, str)).lower()
+                )
+                lengths[position] = len(tokens)
+                for token, frequency in Counter(tokens).items():
+                    postings.setdefault(token, ([], []))
+                    postings[token][0].append(position)
+                    postings[token][1].append(frequency)
+            postings = {
+                token: (np.array(positions), np.array(frequencies, dtype=np.float32))
+                for token, (positions, frequencies) in postings.items()
+            }
+            self._keywords = (postings, lengths)
+        return self._keywords
+
+    def keyword_scores(self, query_text, k1=1.2, b=0.75):
+        """BM25 score of every object for the query."""
+        postings, lengths = self._keyword_index()
+        n = len(self.uuids)
+        scores = np.zeros(n, dtype=np.float32)
+        average_length = float(lengths.mean()) if n and lengths.mean() > 0 else 1.0
+        for token in set(TOKEN_PATTERN.findall(query_text.lower())):
+            if token not in postings:
+                continue
+            positions, frequencies = postings[token]
+            idf = np.log(1.0 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = k1 * (1.0 - b + b * lengths[positions] / average_length)
+            scores[positions] += idf * frequencies * (k1 + 1.0) / (frequencies + norm)
+        return scores
+
+    def _vector_top(self, query_vector, limit, n_probe, allowed):
+        # Positions and cosine similarities of the `limit` nearest allowed objects
+        if self.centroids is not None:
+            probes = np.argsort(-(self.centroids @ query_vector))[:n_probe]
+            candidates = np.concatenate([self.lists[k] for k in probes])
+        else:
+            candidates = np.arange(len(self.uuids))
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+            if len(candidates) < limit and self.centroids is not None:
+                # A selective filter can leave the probed lists short; scan every allowed object instead
+                candidates = np.flatnonzero(allowed)
+
+        similarities = np.asarray(self.vectors[candidates]) @ query_vector
+        limit = min(limit, len(candidates))
+        if limit <= 0:
+            return candidates[:0], similarities[:0]
+        top = np.argpartition(-similarities, limit - 1)[:limit]
+        top = top[np.argsort(-similarities[top])]
+        return candidates[top], similarities[top]
+
+    def _result(self, position, similarity, score=None):
+        return {
+            "uuid": self.uuids[position],
+            "properties": self.properties[position],
+            "distance": float(1.0 - similarity),
+            "score": score,
+        }
+
+    def search_vector(self, query_vector, limit=10, n_probe=8, filters=None):
+        if len(self.uuids) == 0:
+            return []
+        query_vector = _normalize(np.atleast_2d(query_vector))[0]
+        positions, similarities = self._vector_top(query_vector, limit, n_probe, self.allowed(filters))
+        return [self._result(position, similarity) for position, similarity in zip(positions, similarities)]
+
+    def search_hybrid(self, query_vector, query_text, alpha, limit=10, n_probe=8, filters=None, pool=100):
+        """
+        Fuses the top `pool` vector and BM25 hits like Weaviate's relative score fusion: each score list is
+        min-max scaled to [0, 1] and combined as alpha * vector + (1 - alpha) * keyword. alpha=0 is a pure
+        keyword search and alpha=1 a pure vector search.
+        """
+        if len(self.uuids) == 0 or limit <= 0:
+            return []
+        query_vector = _normalize(np.atleast_2d(query_vector))[0]
+        allowed = self.allowed(filters)
+        pool = max(pool, limit)
+
+        if alpha > 0:
+            vector_positions, similarities = self._vector_top(query_vector, pool, n_probe, allowed)
+        else:
+            vector_positions, similarities = np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+        keyword = self.keyword_scores(query_text) if alpha < 1 else np.zeros(len(self.uuids), dtype=np.float32)
+        if allowed is not None:
+            keyword[~allowed] = 0.0
+        keyword_positions = np.flatnonzero(keyword)
+        if len(keyword_positions) > pool:
+            keyword_positions = keyword_positions[np.argpartition(-keyword[keyword_positions], pool - 1)[:pool]]
+
+        def scaled(values):
+            if len(values) == 0:
+                return values
+            low, high = float(values.min()), float(values.max())
+            return np.ones_like(values) if high == low else (values - low) / (high - low)
+
+        fused = {}
+        for position, value in zip(vector_positions, scaled(similarities)):
+            fused[position] = alpha * float(value)
+        for position, value in zip(keyword_positions, scaled(keyword[keyword_positions])):
+            fused[position] = fused.get(position, 0.0) + (1.0 - alpha) * float(value)
+
+        ranked = heapq.nlargest(limit, fused.items(), key=lambda item: (item[1], -item[0]))
+        vectors = np.asarray(self.vectors)
+        return [
+            self._result(position, float(vectors[position] @ query_vector), score)
+            for position, score in ranked
+        ]
+
+
+class LocalVectorBackend(VectorBackend):
+    """In-process vector store with the same search results as Weaviate, persisted as .npy + JSON lines."""
+
+    def __init__(self, embed=None, n_probe=8):
+        self.embed = embed or HashingEmbedder()
+        self.n_probe = n_probe
+        self.collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self.collections:
+                self.collections[name] = LocalCollection()
+            return self.collections[name]
+
+    def embed_objects(self, properties, text_fields=None):
+        """Embeds objects from their concatenated `text_fields` (all string properties by default)."""
+        return self.embed([
+            " ".join(
+                str(value) for key, value in props.items()
+                if (key in text_fields if text_fields else isinstance(value, str))
+            )
+            for props in properties
+        ])
+
+    def upsert(self, collection, uuids, properties, vectors=None, text_fields=None):
+        """
+        Adds or replaces objects. Without precomputed `vectors`, they are embedded with the backend's
+        embedding function (see embed_objects).
+        """
+        if vectors is None:
+            vectors = self.embed_objects(properties, text_fields)
+        with self._lock:
+            self.collections.setdefault(collection, LocalCollection()).upsert(uuids, properties, vectors)
+
+    def build_index(self, n_lists=None):
+        for collection in self.collections.values():
+            collection.build_index(n_lists=n_lists)
+
+    def search(self, collection, query_text, limit=10, vector=None, alpha=None, filters=None):
+        local_collection = self.collections.get(collection)
+        if local_collection is None:
+            return []
+        if vector is None:
+            vector = self.embed([query_text])[0]
+        if alpha is not None:
+            return local_collection.search_hybrid(
+                vector, query_text, alpha, limit=limit, n_probe=self.n_probe, filters=filters
+            )
+        return local_collection.search_vector(vector, limit=limit, n_probe=self.n_probe, filters=filters)
+
+    def fetch_objects(self, collection, uuids, return_properties=None):
+        local_collection = self.collections.get(collection)
+        if local_collection is None:
+            return {}
+        objects = {}
+        for object_uuid in uuids:
+            object_uuid = uuid.UUID(str(object_uuid))
+            position = local_collection._positions.get(object_uuid)
+            if position is None:
+                continue
+            props = local_collection.properties[position]
+            if return_properties is not None:
+                props = {key: props.get(key) for key in return_properties}
+            objects[object_uuid] = props
+        return objects
+
+    def property_names(self, collection):
+        local_collection = self.collections.get(collection)
+        if local_collection is None:
+            return set()
+        return set().union(*local_collection.properties)
+
+    def append_journal(self, directory, collection, uuids, properties, vectors):
+        """
+        Appends upserted objects to the collection's journal in `directory`, so a saved store picks them up
+        without rewriting its files; load() replays the journal and save() folds it in.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{collection}.journal.jsonl"), "a", encoding="utf-8") as f:
+            for object_uuid, props, vector in zip(uuids, properties, _normalize(vectors)):
+                f.write(json.dumps({"uuid": str(object_uuid), "properties": props, "vector": vector.tolist()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay_journal(self, directory, name):
+        uuids, properties, vectors = [], [], []
+        with open(os.path.join(directory, f"{name}.journal.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # A line cut short by a crash; everything before it was flushed
+                uuids.append(record["uuid"])
+                properties.append(record["properties"])
+                vectors.append(record["vector"])
+        if uuids:
+            self.collection(name).upsert(uuids, properties, np.array(vectors, dtype=np.float32))
+
+    def save(self, directory):
+        # Files are written next to the targets and swapped in, since loaded vectors may be memory-mapped
+        # from the very file being replaced
+        os.makedirs(directory, exist_ok=True)
+        for name, collection in self.collections.items():
+            vectors_path = os.path.join(directory, f"{name}.vectors.npy")
+            with open(f"{vectors_path}.tmp", "wb") as f:
+                np.save(f, np.asarray(collection.vectors))
+            objects_path = os.path.join(directory, f"{name}.objects.jsonl")
+            with open(f"{objects_path}.tmp", "w", encoding="utf-8") as f:
+                for object_uuid, props in zip(collection.uuids, collection.properties):
+                    f.write(json.dumps({"uuid": str(object_uuid), "properties": props}) + "\n")
+            os.replace(f"{vectors_path}.tmp", vectors_path)
+            os.replace(f"{objects_path}.tmp", objects_path)
+            # The journal is part of the saved files now; replaying it again would be a no-op anyway
+            journal_path = os.path.join(directory, f"{name}.journal.jsonl")
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+    @classmethod
+    def load(cls, directory, embed=None, n_probe=8, n_lists=None):
+        """
+        Loads a saved store, memory-mapping the vector matrices, replays journaled upserts and builds an IVF
+        index per collection.
+        """
+        backend = cls(embed=embed, n_probe=n_probe)
+        filenames = sorted(os.listdir(directory))
+        for filename in filenames:
+            if not filename.endswith(".vectors.npy"):
+                continue
+            name = filename[:-len(".vectors.npy")]
+            uuids, properties = [], []
+            with open(os.path.join(directory, f"{name}.objects.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    uuids.append(uuid.UUID(record["uuid"]))
+                    properties.append(record["properties"])
+            vectors = np.load(os.path.join(directory, filename), mmap_mode="r")
+            backend.collections[name] = LocalCollection(vectors, uuids, properties)
+        for filename in filenames:
+            if filename.endswith(".journal.jsonl"):
+                backend._replay_journal(directory, filename[:-len(".journal.jsonl")])
+        backend.build_index(n_lists=n_lists)
+        return backend
+
+
+_local_backends = {}
+_local_backends_lock = threading.Lock()
+
+
+# Function to get a process-wide local backend loaded from a directory
+def get_local_vector_backend(directory, embed=None):
+    with _local_backends_lock:
+        if directory not in _local_backends:
+            _local_backends[directory] = LocalVectorBackend.load(directory, embed=embed)
+        return _local_backends[directory]
@@ -1,8 +1,18 @@
+import asyncio
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import weaviate
 from weaviate import Client as WeaviateClient
 from config import WCD_URL, WCD_API_KEY, OPENAI_API_KEY
 from weaviate.classes.init import Auth
-from weaviate.classes.query import MetadataQuery
+from weaviate.classes.query import Filter, MetadataQuery
+from query_function.embedding_cache import QueryEmbeddingCache
+from query_function.result_cache import get_search_result_cache
+from query_function.vector_backends import OpenAIEmbedder, VectorBackend, get_local_vector_backend
 
 
 # Initialize Weaviate Client
@@ -15,41 +25,417 @@ def initialize_weaviate_client():
     return client
 
 
-# Function to query Weaviate for Articles
-def query_weaviate_articles(client, query_text, limit=10):
-    # Perform vector search on Article collection
-    response = client.collections.get("Article").query.near_text(
-        query=query_text,
-        limit=limit,
-        return_metadata=MetadataQuery(distance=True)
+# Initialize async Weaviate Client (connect it with `await client.connect()`)
+def initialize_async_weaviate_client():
+    client = weaviate.use_async_with_weaviate_cloud(
+        cluster_url=WCD_URL,
+        auth_credentials=Auth.api_key(WCD_API_KEY),
+        headers={'X-OpenAI-Api-key': OPENAI_API_KEY}
     )
+    return client
+
+
+class WeaviateClientManager:
+    """
+    Holds one long-lived Weaviate client per process, shared by every Streamlit session and rerun
+    (the same lifetime st.cache_resource gives). The connection is health-checked at most every
+    `health_check_interval` seconds and re-established when it is not ready or has been invalidated.
+    """
+
+    def __init__(self, connect=initialize_weaviate_client, health_check_interval=30.0):
+        self._connect = connect
+        self.health_check_interval = health_check_interval
+        self._client = None
+        self._last_health_check = 0.0
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reconnects = 0
+        self.reuses = 0
+        self.last_connect_seconds = 0.0
+        self.total_connect_seconds = 0.0
+
+    def _is_healthy(self):
+        try:
+            return self._client.is_ready()
+        except Exception:
+            return False
+
+    def _close_client(self):
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception as e:
+                print(f"Error closing Weaviate client: {e}")
+            self._client = None
+
+    def get_client(self):
+        with self._lock:
+            if self._client is not None:
+                now = time.monotonic()
+                if now - self._last_health_check < self.health_check_interval or self._is_healthy():
+                    self._last_health_check = now
+                    self.reuses += 1
+                    return self._client
+                self._close_client()
+                self.reconnects += 1
+
+            start = time.perf_counter()
+            self._client = self._connect()
+            self.last_connect_seconds = time.perf_counter() - start
+            self.total_connect_seconds += self.last_connect_seconds
+            self.connects += 1
+            self._last_health_check = time.monotonic()
+            return self._client
+
+    def invalidate(self):
+        """Drops the current connection, e.g. after a failed query, so the next call reconnects."""
+        with self._lock:
+            if self._client is not None:
+                self._close_client()
+                self.reconnects += 1
+
+    def close(self):
+        with self._lock:
+            self._close_client()
+
+    def stats(self):
+        with self._lock:
+            average_connect_seconds = self.total_connect_seconds / self.connects if self.connects else 0.0
+            return {
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "reuses": self.reuses,
+                "average_connect_seconds": average_connect_seconds,
+                "total_connect_seconds": self.total_connect_seconds,
+                # Handshakes a connect-per-search approach would have paid for on top
+                "seconds_saved": self.reuses * average_connect_seconds,
+            }
+
+
+_client_manager = WeaviateClientManager()
+atexit.register(_client_manager.close)
+
+
+# Function to get the shared, health-checked Weaviate client (do not close it after use)
+def get_weaviate_client():
+    return _client_manager.get_client()
+
+
+# Function to drop the shared client so the next get_weaviate_client() call reconnects
+def reset_weaviate_client():
+    _client_manager.invalidate()
 
-    # Parse response
+
+def get_weaviate_client_stats():
+    return _client_manager.stats()
+
+
+# Function to get the client searches should run against: the local vector store at LOCAL_VECTOR_STORE_PATH
+# when configured, otherwise the shared Weaviate client
+def get_vector_client():
+    local_store_path = os.getenv("LOCAL_VECTOR_STORE_PATH")
+    if local_store_path:
+        return get_local_vector_backend(local_store_path)
+    return get_weaviate_client()
+
+
+_query_embedding_cache = None
+_query_embedding_cache_lock = threading.Lock()
+
+
+# Function to share one query embedding cache between article and term search
+def configure_query_embedding_cache(embed, maxsize=1024):
+    global _query_embedding_cache
+    with _query_embedding_cache_lock:
+        _query_embedding_cache = QueryEmbeddingCache(embed, maxsize=maxsize) if embed is not None else None
+    return _query_embedding_cache
+
+
+# Function to get the shared query embedding cache. It is created on first use when QUERY_EMBEDDING_MODEL
+# names the OpenAI model the collections were vectorized with; otherwise searches stay on near_text
+def get_query_embedding_cache():
+    global _query_embedding_cache
+    model = os.getenv("QUERY_EMBEDDING_MODEL")
+    if _query_embedding_cache is None and model:
+        with _query_embedding_cache_lock:
+            if _query_embedding_cache is None:
+                _query_embedding_cache = QueryEmbeddingCache(OpenAIEmbedder(OPENAI_API_KEY, model=model))
+    return _query_embedding_cache
+
+
+_property_names = {}  # (client id, collection) -> (expires_at, property names)
+
+
+# Function to get the property names of a collection's schema, cached for `ttl` seconds per client
+def collection_property_names(client, collection, ttl=300):
+    key = (id(client), collection)
+    now = time.monotonic()
+    entry = _property_names.get(key)
+    if entry is None or entry[0] <= now:
+        if isinstance(client, VectorBackend):
+            names = client.property_names(collection)
+        else:
+            names = {prop.name for prop in client.collections.get(collection).config.get().properties}
+        entry = _property_names[key] = (now + ttl, frozenset(names))
+    return entry[1]
+
+
+# Function to keep only the requested properties of results from a backend that returns whole objects
+def _project(results, return_properties):
+    if return_properties is None:
+        return results
+    return [
+        {**result, "properties": {key: result["properties"].get(key) for key in return_properties}}
+        for result in results
+    ]
+
+
+# Function to run a vector search on a collection, embedding the query client-side when a cache is given
+# (Weaviate clients only; a VectorBackend embeds queries itself).
+# With return_properties, Weaviate only sends those properties back (None returns all of them). With alpha,
+# the search is hybrid (alpha=1 is pure vector, alpha=0 pure BM25); filters is an ArticleFilter pushed into
+# the query
+def _search_collection(client, collection, query_text, limit, embedding_cache, return_properties=None,
+                       alpha=None, filters=None):
+    if isinstance(client, VectorBackend):
+        # A local store embeds queries with the embedder it was built with; vectors from the shared cache come
+        # from the OpenAI model of the Weaviate collections and may not even have the same dimension
+        results = client.search(collection, query_text, limit, alpha=alpha, filters=filters)
+        return _project(results, return_properties)
+
+    vector = embedding_cache.embed(query_text) if embedding_cache is not None else None
+    response = _run_search(client.collections.get(collection).query, query_text, limit, vector,
+                           return_properties, alpha, filters)
+    return _parse_response(response)
+
+
+# Function to call the right Weaviate query for a search; returns the (possibly awaitable) response
+def _run_search(query, query_text, limit, vector, return_properties, alpha, filters):
+    options = {
+        "limit": limit,
+        "return_properties": list(return_properties) if return_properties is not None else None,
+        "filters": filters.to_weaviate() if filters is not None else None,
+    }
+    vector = [float(value) for value in vector] if vector is not None else None
+    if alpha is not None:
+        return query.hybrid(
+            query=query_text, vector=vector, alpha=alpha, return_metadata=MetadataQuery(score=True), **options
+        )
+    if vector is not None:
+        return query.near_vector(near_vector=vector, return_metadata=MetadataQuery(distance=True), **options)
+    return query.near_text(query=query_text, return_metadata=MetadataQuery(distance=True), **options)
+
+
+# Function to parse a Weaviate search response into result dicts
+def _parse_response(response):
     results = []
     for obj in response.objects:
         results.append({
             "uuid": obj.uuid,
             "properties": obj.properties,
             "distance": obj.metadata.distance,
+            "score": obj.metadata.score,
         })
     return results
 
 
+# Function to build the result cache key of a search; projections, alpha and filters are part of it
+def _result_cache_key(result_cache, collection, query_text, limit, return_properties, alpha, filters):
+    properties = tuple(return_properties) if return_properties is not None else None
+    filters = filters if filters is not None and not filters.is_empty() else None
+    return result_cache.key(collection, query_text, limit, properties, alpha, filters)
+
+
+# Function to run a vector search through the shared result cache. Local backends are in-process already
+# and bypass it
+def _query_collection(client, collection, query_text, limit, embedding_cache, use_cache, return_properties=None,
+                      alpha=None, filters=None):
+    search = (client, collection, query_text, limit, embedding_cache, return_properties, alpha, filters)
+    if not use_cache or isinstance(client, VectorBackend):
+        return _search_collection(*search)
+
+    result_cache = get_search_result_cache()
+    key = _result_cache_key(result_cache, collection, query_text, limit, return_properties, alpha, filters)
+    results = result_cache.get(key)
+    if results is None:
+        results = _search_collection(*search)
+        result_cache.set(key, results)
+    return results
+
+
+# Function to query Weaviate for Articles
+def query_weaviate_articles(client, query_text, limit=10, embedding_cache=None, use_cache=True,
+                            return_properties=None, alpha=None, filters=None):
+    """
+    Vector search over Articles. Pass alpha for hybrid (BM25 + vector) search and an ArticleFilter as
+    `filters` to restrict the candidates by MeSH terms or publication date inside the query.
+    """
+    # Perform vector search on Article collection
+    return _query_collection(
+        client, "Article", query_text, limit, embedding_cache, use_cache, return_properties, alpha, filters
+    )
+
+
 # Function to query Weaviate for MeSH Terms
-def query_weaviate_terms(client, query_text, limit=10):
+def query_weaviate_terms(client, query_text, limit=10, embedding_cache=None, use_cache=True,
+                         return_properties=None, alpha=None):
     # Perform vector search on MeshTerm collection
-    response = client.collections.get("term").query.near_text(
-        query=query_text,
-        limit=limit,
-        return_metadata=MetadataQuery(distance=True)
+    return _query_collection(
+        client, "term", query_text, limit, embedding_cache, use_cache, return_properties, alpha
     )
 
-    # Parse response
-    results = []
-    for obj in response.objects:
-        results.append({
-            "uuid": obj.uuid,
-            "properties": obj.properties,
-            "distance": obj.metadata.distance,
-        })
+
+# Function to fetch properties of Articles by UUID in one request, e.g. full abstracts for a deep-dive view
+def fetch_articles_by_uuid(client, uuids, return_properties=("abstractText",)):
+    """
+    Returns {uuid: properties} for the given Article UUIDs. UUIDs that no longer exist are left out.
+    """
+    uuids = list(uuids)
+    if not uuids:
+        return {}
+    if isinstance(client, VectorBackend):
+        return client.fetch_objects("Article", uuids, return_properties)
+
+    response = client.collections.get("Article").query.fetch_objects(
+        filters=Filter.by_id().contains_any(uuids),
+        limit=len(uuids),
+        return_properties=list(return_properties) if return_properties is not None else None
+    )
+    return {obj.uuid: obj.properties for obj in response.objects}
+
+
+# Async counterpart of _search_collection
+async def _async_search_collection(client, collection, query_text, limit, embedding_cache, return_properties=None,
+                                   alpha=None, filters=None):
+    vector = None
+    if embedding_cache is not None:
+        # A cache miss is a blocking HTTP call; keep it off the event loop shared by concurrent searches
+        vector = await asyncio.to_thread(embedding_cache.embed, query_text)
+    response = await _run_search(client.collections.get(collection).query, query_text, limit, vector,
+                                 return_properties, alpha, filters)
+    return _parse_response(response)
+
+
+# Async counterpart of _query_collection, sharing the same result cache
+async def _async_query_collection(client, collection, query_text, limit, embedding_cache, use_cache,
+                                  return_properties=None, alpha=None, filters=None):
+    search = (client, collection, query_text, limit, embedding_cache, return_properties, alpha, filters)
+    if not use_cache:
+        return await _async_search_collection(*search)
+
+    result_cache = get_search_result_cache()
+    key = _result_cache_key(result_cache, collection, query_text, limit, return_properties, alpha, filters)
+    results = result_cache.get(key)
+    if results is None:
+        results = await _async_search_collection(*search)
+        result_cache.set(key, results)
     return results
+
+
+# Function to query Weaviate for Articles with the async client
+async def async_query_weaviate_articles(client, query_text, limit=10, embedding_cache=None, use_cache=True,
+                                        return_properties=None, alpha=None, filters=None):
+    return await _async_query_collection(
+        client, "Article", query_text, limit, embedding_cache, use_cache, return_properties, alpha, filters
+    )
+
+
+# Function to query Weaviate for MeSH Terms with the async client
+async def async_query_weaviate_terms(client, query_text, limit=10, embedding_cache=None, use_cache=True,
+                                     return_properties=None, alpha=None):
+    return await _async_query_collection(
+        client, "term", query_text, limit, embedding_cache, use_cache, return_properties, alpha
+    )
+
+
+# Function to query Articles and MeSH Terms concurrently, so the latency is the slower of the two.
+# alpha and filters only apply to the Article search; term_limit caps the MeSH Terms returned
+async def async_query_weaviate_both(client, query_text, limit=10, embedding_cache=None, use_cache=True,
+                                    article_properties=None, term_properties=None, alpha=None, filters=None,
+                                    term_limit=10):
+    return await asyncio.gather(
+        async_query_weaviate_articles(
+            client, query_text, limit, embedding_cache, use_cache, article_properties, alpha, filters
+        ),
+        async_query_weaviate_terms(client, query_text, term_limit, embedding_cache, use_cache, term_properties),
+    )
+
+
+class AsyncWeaviateRunner:
+    """
+    Runs coroutines from synchronous code (e.g. Streamlit handlers) on a background event loop that owns one
+    long-lived async Weaviate client, so concurrent queries don't pay a connection handshake per call.
+    """
+
+    def __init__(self, connect=initialize_async_weaviate_client):
+        self._connect = connect
+        self._loop = None
+        self._client = None
+        self._client_lock = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="weaviate-async", daemon=True).start()
+            return self._loop
+
+    async def _get_client(self):
+        if self._client_lock is None:
+            self._client_lock = asyncio.Lock()
+        async with self._client_lock:
+            if self._client is None or not self._client.is_connected():
+                self._client = self._connect()
+                await self._client.connect()
+            return self._client
+
+    def run(self, query_function, *args, timeout=None, **kwargs):
+        """Calls `await query_function(client, *args, **kwargs)` on the background loop and returns its result."""
+        async def call():
+            return await query_function(await self._get_client(), *args, **kwargs)
+
+        return asyncio.run_coroutine_threadsafe(call(), self._ensure_loop()).result(timeout)
+
+    def close(self):
+        if self._loop is not None and self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.close(), self._loop).result(10)
+            self._client = None
+
+
+_async_runner = AsyncWeaviateRunner()
+atexit.register(_async_runner.close)
+
+
+# Function to search Articles and MeSH Terms for the same text in one call, concurrently when on Weaviate
+def query_weaviate_both(query_text, limit=10, embedding_cache=None, use_cache=True, client=None,
+                        article_properties=None, term_properties=None, alpha=None, filters=None, term_limit=10):
+    """
+    Returns (article_results, term_results): up to `limit` Articles and `term_limit` MeSH Terms. A local
+    VectorBackend (passed as `client` or configured through LOCAL_VECTOR_STORE_PATH) is searched in-process.
+    A sync Weaviate client passed as `client` runs both queries at once on two threads; without one, they
+    run at once on the shared async Weaviate client. alpha and filters only apply to the Article search.
+    """
+    if client is None:
+        client = get_vector_client() if os.getenv("LOCAL_VECTOR_STORE_PATH") else None
+    if isinstance(client, VectorBackend):
+        return (
+            query_weaviate_articles(
+                client, query_text, limit, embedding_cache, use_cache, article_properties, alpha, filters
+            ),
+            query_weaviate_terms(client, query_text, term_limit, embedding_cache, use_cache, term_properties),
+        )
+    if client is not None:
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="weaviate-both") as executor:
+            articles = executor.submit(
+                query_weaviate_articles, client, query_text, limit, embedding_cache, use_cache,
+                article_properties, alpha, filters
+            )
+            terms = executor.submit(
+                query_weaviate_terms, client, query_text, term_limit, embedding_cache, use_cache, term_properties
+            )
+            return articles.result(), terms.result()
+    return tuple(_async_runner.run(
+        async_query_weaviate_both, query_text, limit, embedding_cache, use_cache, article_properties,
+        term_properties, alpha, filters, term_limit
+    ))
@@ -0,0 +1,30 @@
+import sys
+import types
+
+import pytest
+
+try:
+    import config  # noqa: F401  (local credentials file, not part of the repository)
+except ImportError:
+    sys.modules["config"] = types.SimpleNamespace(
+        WCD_URL="", WCD_API_KEY="", OPENAI_API_KEY="", DATABRICKS_SERVER_HOSTNAME="", DATABRICKS_ACCESS_TOKEN=""
+    )
+
+from query_function import expansion_cache, mesh_store, result_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_collection_epochs(tmp_path, monkeypatch):
+    """Keeps ingestion's epoch bumps out of the working tree's data/ directory."""
+    monkeypatch.setattr(
+        result_cache, "_collection_epochs", result_cache.CollectionEpochs(str(tmp_path / "collection_epochs.json"))
+    )
+
+
+@pytest.fixture
+def isolated_expansion(monkeypatch):
+    """Fresh in-memory MeSH expansion cache and no local MeSH store, restored after the test."""
+    monkeypatch.setattr(expansion_cache, "_expansion_cache", expansion_cache.ExpansionCache())
+    monkeypatch.setattr(mesh_store, "_mesh_store", None)
+    monkeypatch.delenv("MESH_STORE_PATH", raising=False)
+    return expansion_cache.get_expansion_cache()
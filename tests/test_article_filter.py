@@ -0,0 +1,35 @@
+from query_function.article_filter import ArticleFilter
+
+ARTICLES = {
+    "mouth": {"meshMajor": "['Mouth Neoplasms', 'Humans']"},
+    "neoplasms": {"meshMajor": "['Neoplasms', 'Aged']"},
+    "exercise": {"meshMajor": "['Asthma, Exercise-Induced', 'Child']"},
+    "asthma": {"meshMajor": "['asthma', 'Child']"},
+    "alzheimer": {"meshMajor": "[\"Alzheimer's Disease\", 'Humans']"},
+}
+
+
+def matching(article_filter):
+    return sorted(name for name, properties in ARTICLES.items() if article_filter.matches(properties))
+
+
+def test_terms_match_whole_list_elements_not_superstrings():
+    assert matching(ArticleFilter(mesh_terms=("Neoplasms",))) == ["neoplasms"]
+    assert matching(ArticleFilter(mesh_terms=("Asthma",))) == ["asthma"]
+    assert matching(ArticleFilter(mesh_terms=("Alzheimer's Disease",))) == ["alzheimer"]
+    assert matching(ArticleFilter(mesh_terms=("Humans", "Child"), match_all=True)) == []
+    assert matching(ArticleFilter(mesh_terms=("Humans", "Child"))) == ["alzheimer", "asthma", "exercise", "mouth"]
+
+
+def like_patterns(weaviate_filter):
+    if hasattr(weaviate_filter, "filters"):
+        return [pattern for child in weaviate_filter.filters for pattern in like_patterns(child)]
+    return [weaviate_filter.value]
+
+
+def test_weaviate_filter_anchors_terms_on_quoted_elements():
+    weaviate_filter = ArticleFilter(mesh_terms=("Neoplasms", "Alzheimer's Disease")).to_weaviate()
+
+    assert like_patterns(weaviate_filter) == [
+        "*'Neoplasms'*", '*"Neoplasms"*', "*'Alzheimer's Disease'*", '*"Alzheimer\'s Disease"*'
+    ]
@@ -0,0 +1,33 @@
+import numpy as np
+
+from query_function.embedding_cache import QueryEmbeddingCache
+
+
+class RecordingEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def test_embeds_query_as_typed_and_caches_on_normalized_text():
+    embedder = RecordingEmbedder()
+    cache = QueryEmbeddingCache(embedder)
+
+    cache.embed("Mouth  Cancer")
+    cache.embed("mouth cancer")
+
+    assert embedder.texts == ["Mouth  Cancer"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_evicts_least_recently_used_query():
+    embedder = RecordingEmbedder()
+    cache = QueryEmbeddingCache(embedder, maxsize=2)
+
+    for text in ["a", "b", "a", "c", "b"]:
+        cache.embed(text)
+
+    assert embedder.texts == ["a", "b", "c", "b"]
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+from query_function import expansion_cache, mesh_store, rdf_query
+from query_function.expansion_cache import ExpansionCache
+from query_function.mesh_store import import_mesh_dump
+
+MESH = "http://id.nlm.nih.gov/mesh/"
+LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
+BROADER = "<http://id.nlm.nih.gov/mesh/vocab#broaderDescriptor>"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(expansion_cache.time, "time", clock)
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ExpansionCache(maxsize=2)
+    cache.set("narrower_concepts", "A", ["a"])
+    cache.set("narrower_concepts", "B", ["b"])
+    assert cache.get("narrower_concepts", "A") == ["a"]  # A becomes the most recently used
+
+    cache.set("narrower_concepts", "C", ["c"])
+
+    assert cache.get("narrower_concepts", "B") is None
+    assert cache.get("narrower_concepts", "A") == ["a"]
+    assert cache.get("narrower_concepts", "C") == ["c"]
+
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    cache = ExpansionCache(ttl=60, path=str(tmp_path / "cache.sqlite"))
+    cache.set("narrower_concepts", "A", ["a"])
+
+    clock.now += 59
+    assert cache.get("narrower_concepts", "A") == ["a"]
+    clock.now += 2
+    assert cache.get("narrower_concepts", "A") is None
+    assert cache.stats()["expired"] == 1
+    # The expired row is gone from the file as well, not only from memory
+    assert ExpansionCache(ttl=60, path=str(tmp_path / "cache.sqlite")).get("narrower_concepts", "A") is None
+
+
+def test_file_survives_restart_and_stays_bounded(clock, tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ExpansionCache(maxsize=2, path=path)
+    for term in ["A", "B", "C"]:
+        clock.now += 1
+        cache.set("narrower_concepts", term, [term.lower()])
+
+    reopened = ExpansionCache(maxsize=2, path=path)
+
+    assert reopened.get("narrower_concepts", "A") is None
+    assert reopened.get("narrower_concepts", "C") == ["c"]
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_entries_are_kept_apart_per_source():
+    cache = ExpansionCache()
+    cache.set("narrower_concepts", "A", ["from endpoint"], source="sparql:http://endpoint")
+
+    assert cache.get("narrower_concepts", "A", source="store:/data/mesh.sqlite") is None
+    assert cache.get("narrower_concepts", "A", source="sparql:http://endpoint") == ["from endpoint"]
+
+
+def test_cache_file_without_source_column_is_replaced(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE expansion_cache (kind TEXT NOT NULL, term TEXT NOT NULL, value TEXT NOT NULL, "
+        "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (kind, term))"
+    )
+    connection.execute("INSERT INTO expansion_cache VALUES ('narrower_concepts', 'A', '[\"stale\"]', 1e12, 0)")
+    connection.commit()
+    connection.close()
+
+    cache = ExpansionCache(path=path)
+
+    assert cache.get("narrower_concepts", "A") is None
+    cache.set("narrower_concepts", "A", ["fresh"])
+    assert ExpansionCache(path=path).get("narrower_concepts", "A") == ["fresh"]
+
+
+def test_failed_lookups_are_not_cached(isolated_expansion):
+    calls = []
+
+    def fetch(terms, mesh_store=None):
+        calls.append(list(terms))
+        if len(calls) == 1:
+            raise TimeoutError("endpoint timed out")
+        return {term: [f"{term} child"] for term in terms}
+
+    assert rdf_query._cached_batch_lookup("narrower_concepts", fetch, ["A", "B"], 50) == {"A": [], "B": []}
+    assert isolated_expansion.stats()["entries"] == 0
+
+    assert rdf_query._cached_batch_lookup("narrower_concepts", fetch, ["A", "B"], 50) == {
+        "A": ["A child"], "B": ["B child"]
+    }
+    assert calls == [["A", "B"], ["A", "B"]]
+
+
+def build_store(tmp_path, name, children):
+    dump = tmp_path / f"{name}.nt"
+    lines = [f'<{MESH}D1> {LABEL} "Mouth Neoplasms"@en .']
+    for i, child in enumerate(children, start=2):
+        lines += [f'<{MESH}D{i}> {LABEL} "{child}"@en .', f"<{MESH}D{i}> {BROADER} <{MESH}D1> ."]
+    dump.write_text("\n".join(lines) + "\n")
+    store_path = str(tmp_path / f"{name}.sqlite")
+    import_mesh_dump(str(dump), store_path)
+    return store_path
+
+
+def test_switching_mesh_store_does_not_serve_answers_cached_from_the_old_one(isolated_expansion, tmp_path):
+    old_store = build_store(tmp_path, "old", ["Gingival Neoplasms"])
+    new_store = build_store(tmp_path, "new", ["Gingival Neoplasms", "Tongue Neoplasms"])
+
+    mesh_store.configure_mesh_store(old_store)
+    assert rdf_query.get_narrower_concepts_for_term("Mouth Neoplasms") == ["Gingival Neoplasms"]
+
+    mesh_store.configure_mesh_store(new_store)
+    assert sorted(rdf_query.get_narrower_concepts_for_term("Mouth Neoplasms")) == [
+        "Gingival Neoplasms", "Tongue Neoplasms"
+    ]
+
+    mesh_store.configure_mesh_store(old_store)
+    assert rdf_query.get_narrower_concepts_for_term("Mouth Neoplasms") == ["Gingival Neoplasms"]
+    assert isolated_expansion.stats()["hits"] == 1
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from query_function.graph_cache import GraphCache
+from query_function.rdf_snapshot import compile_snapshot
+
+TRIPLE = '<http://example.org/article/{0}> <http://schema.org/name> "Study {0}" .\n'
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    path = tmp_path / "graph.ttl"
+    path.write_text(TRIPLE.format(1))
+    return str(path)
+
+
+def test_repeat_loads_are_served_from_the_cache(graph_path, tmp_path, monkeypatch):
+    cache = GraphCache()
+    graph = cache.get(graph_path)
+
+    monkeypatch.chdir(tmp_path)
+    # Keyed on the absolute path, so a relative path to the same file is a hit
+    assert cache.get("graph.ttl") is graph
+    assert cache.get(graph_path) is graph
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["reloads"]) == (1, 2, 1, 0)
+
+
+def test_modified_file_is_reloaded(graph_path):
+    cache = GraphCache()
+    graph = cache.get(graph_path)
+    assert len(graph) == 1
+
+    with open(graph_path, "a", encoding="utf-8") as f:
+        f.write(TRIPLE.format(2))
+    reloaded = cache.get(graph_path)
+
+    assert reloaded is not graph
+    assert len(reloaded) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["reloads"]) == (0, 2, 1)
+
+
+def test_same_size_rewrite_is_detected_by_mtime(graph_path):
+    cache = GraphCache()
+    cache.get(graph_path)
+    with open(graph_path, "w", encoding="utf-8") as f:
+        f.write(TRIPLE.format(3))
+    stat = os.stat(graph_path)
+    os.utime(graph_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert {str(o) for o in cache.get(graph_path).objects()} == {"Study 3"}
+    assert cache.stats()["reloads"] == 1
+
+
+def test_fresh_snapshot_is_loaded_instead_of_parsing(graph_path):
+    compile_snapshot(graph_path, mesh_index=False)
+    cache = GraphCache()
+
+    graph = cache.get(graph_path)
+
+    assert cache.stats()["snapshot_loads"] == 1
+    assert {str(o) for o in graph.objects()} == {"Study 1"}
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        GraphCache().get(str(tmp_path / "missing.ttl"))
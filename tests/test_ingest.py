@@ -0,0 +1,155 @@
+import os
+
+import pandas as pd
+
+from query_function.ingest import IngestCheckpoint, LocalVectorSink, collapse_duplicate_articles, ingest_articles
+from query_function import mesh_index
+from query_function.mesh_index import (
+    DeltaMeshIndex,
+    MeshTermIndex,
+    compile_mesh_index,
+    get_mesh_index_stats,
+    load_mesh_index,
+    mesh_index_delta_path_for,
+    mesh_index_path_for,
+)
+from query_function.uris import article_uri, convert_to_uri
+from query_function.vector_backends import HashingEmbedder, LocalVectorBackend
+
+
+def write_csv(path, rows):
+    pd.DataFrame(rows, columns=["Title", "abstractText", "meshMajor"]).to_csv(path, index=False)
+    return str(path)
+
+
+def test_collapse_duplicate_articles_keeps_last_row():
+    chunk = pd.DataFrame({
+        "Title": ["A study", "B study", "A study"],
+        "abstractText": ["first", "other", "second"],
+        "meshMajor": ["['Humans']", "['Aged']", "['Humans']"],
+    })
+
+    collapsed, merged = collapse_duplicate_articles(chunk)
+
+    assert merged == 1
+    assert collapsed["abstractText"].tolist() == ["other", "second"]
+
+
+def test_ingest_merges_rows_sharing_a_title(tmp_path):
+    csv_path = write_csv(tmp_path / "articles.csv", [
+        ("A study", "first", "['Humans']"),
+        ("B study", "other", "['Aged']"),
+        ("A study", "second", "['Humans', 'Male']"),
+    ])
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=64))
+
+    stats = ingest_articles(csv_path, LocalVectorSink(backend, str(tmp_path / "vectors")))
+
+    articles = backend.collections["Article"]
+    assert stats["merged"] == 1
+    assert stats["articles"] == 2
+    assert sorted(props["abstractText"] for props in articles.properties) == ["other", "second"]
+
+
+def test_local_sink_journals_chunks_and_resumes_after_crash(tmp_path):
+    csv_path = write_csv(tmp_path / "articles.csv", [
+        (f"Study {i}", f"abstract {i}", "['Humans']") for i in range(10)
+    ])
+    directory = str(tmp_path / "vectors")
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+
+    def crash_after_second_chunk(stats):
+        if stats["rows"] == 4:
+            raise KeyboardInterrupt
+
+    sink = LocalVectorSink(LocalVectorBackend(embed=HashingEmbedder(dim=64)), directory)
+    try:
+        ingest_articles(csv_path, sink, chunksize=2, checkpoint=checkpoint, progress=crash_after_second_chunk)
+    except KeyboardInterrupt:
+        pass
+    # Chunks were journaled, not saved as a whole store
+    assert sorted(os.listdir(directory)) == ["Article.journal.jsonl", "term.journal.jsonl"]
+
+    backend = LocalVectorBackend.load(directory, embed=HashingEmbedder(dim=64))
+    assert len(backend.collections["Article"]) == 4
+    stats = ingest_articles(csv_path, LocalVectorSink(backend, directory), chunksize=2, checkpoint=checkpoint)
+
+    assert stats["articles"] == 6
+    assert not any(name.endswith(".journal.jsonl") for name in os.listdir(directory))
+    assert len(LocalVectorBackend.load(directory, embed=HashingEmbedder(dim=64)).collections["Article"]) == 10
+
+
+def sync(tmp_path, name, rows, checkpoint, graph_path):
+    directory = str(tmp_path / "vectors")
+    backend = LocalVectorBackend.load(directory, embed=HashingEmbedder(dim=64)) if os.path.isdir(directory) \
+        else LocalVectorBackend(embed=HashingEmbedder(dim=64))
+    return ingest_articles(write_csv(tmp_path / name, rows), LocalVectorSink(backend, directory),
+                           checkpoint=checkpoint, graph_path=graph_path)
+
+
+def ranked_titles(index, terms, article_uris=None):
+    return [str(data["title"]) for _, data in index.rank([convert_to_uri(term) for term in terms], article_uris)]
+
+
+def test_graph_updates_extend_a_compiled_mesh_index_through_its_delta(tmp_path, monkeypatch):
+    graph_path = str(tmp_path / "graph.ttl")
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+    base_rows = [(f"Study {i:03d}", f"abstract {i}", "['Humans', 'Aged']" if i % 2 else "['Humans']")
+                 for i in range(200)]
+    sync(tmp_path, "base.csv", base_rows, checkpoint, graph_path)
+    compile_mesh_index(graph_path)
+    index_stat = os.stat(mesh_index_path_for(graph_path))
+
+    # Graph parses are recorded: after the compile only the delta file may be parsed
+    parsed = []
+    parse = mesh_index.Graph.parse
+    monkeypatch.setattr(mesh_index.Graph, "parse", lambda self, source, **kwargs: (
+        parsed.append(os.path.basename(source)), parse(self, source, **kwargs))[1])
+
+    sync(tmp_path, "first.csv", [("Study 001", "changed", "['Humans']"), ("New study", "new", "['Aged', 'Male']")],
+         checkpoint, graph_path)
+    sync(tmp_path, "second.csv", [("New study", "changed again", "['Aged']"), ("Other study", "x", "['Aged']")],
+         checkpoint, graph_path)
+
+    delta_path = mesh_index_delta_path_for(graph_path)
+    with open(delta_path, encoding="utf-8") as f:
+        delta_subjects = {line.split(" ")[0] for line in f if line.startswith("<")}
+    # The compiled index is untouched and the delta holds the three updated articles and the new term only
+    assert os.stat(mesh_index_path_for(graph_path)).st_mtime_ns == index_stat.st_mtime_ns
+    assert len(delta_subjects) == 4
+
+    index = load_mesh_index(graph_path)
+    assert isinstance(index, DeltaMeshIndex)
+    assert get_mesh_index_stats()["source"] == "compiled index and delta"
+    assert parsed == ["graph.meshdelta.nt"]
+
+    recompiled = MeshTermIndex.open(compile_mesh_index(graph_path, str(tmp_path / "full.meshidx")))
+    for terms in (["Aged"], ["Humans"], ["Male", "Aged"], ["Humans", "Aged"]):
+        for limit in (5, 300):
+            assert index.rank([convert_to_uri(t) for t in terms], limit=limit) == \
+                recompiled.rank([convert_to_uri(t) for t in terms], limit=limit)
+    assert "Study 001" not in ranked_titles(index, ["Aged"])
+    assert ranked_titles(index, ["Male"]) == []
+    candidates = [article_uri("Study 001"), article_uri("New study"), article_uri("Study 003")]
+    assert ranked_titles(index, ["Humans", "Aged"], candidates) == ["Study 003", "Study 001", "New study"]
+
+    # A full compile folds the delta in
+    compile_mesh_index(graph_path)
+    assert not os.path.exists(delta_path)
+    assert isinstance(load_mesh_index(graph_path), MeshTermIndex)
+
+
+def test_graph_updates_leave_a_stale_mesh_index_to_be_recompiled(tmp_path, capsys):
+    graph_path = str(tmp_path / "graph.ttl")
+    checkpoint = IngestCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+    sync(tmp_path, "first.csv", [("A study", "first", "['Humans']")], checkpoint, graph_path)
+    compile_mesh_index(graph_path)
+    with open(graph_path, "a", encoding="utf-8") as f:
+        f.write("\n")
+
+    sync(tmp_path, "second.csv", [("B study", "second", "['Humans']")], checkpoint, graph_path)
+
+    assert "MeSH index of" in capsys.readouterr().out
+    assert not os.path.exists(mesh_index_delta_path_for(graph_path))
+    assert sorted(ranked_titles(load_mesh_index(graph_path), ["Humans"])) == ["A study", "B study"]
+    assert get_mesh_index_stats()["source"] == "RDF graph"
@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+import pytest
+from rdflib import Graph
+
+from query_function import mesh_index
+from query_function.mesh_index import MeshTermIndex, compile_mesh_index, load_mesh_index, mesh_index_path_for
+from query_function.rdf_build import build_graph
+from query_function.rdf_snapshot import compile_snapshot
+from query_function.uris import convert_to_uri
+
+ROWS = [
+    ("Oral cancer in young adults", "abstract 1", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell', 'Humans']"),
+    ("Asthma outcomes in children", "abstract 2", "['Asthma', 'Humans', 'Child']"),
+    ("Tongue carcinoma survival", "abstract 3", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell']"),
+    ("Smoking and oral lesions", "abstract 4", "['Mouth Neoplasms', 'Smoking', 'Humans']"),
+]
+QUERIES = [
+    ["Mouth Neoplasms", "Carcinoma, Squamous Cell"],
+    ["Humans"],
+    ["Asthma", "Smoking", "Not A Term"],
+]
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    csv_path = tmp_path / "articles.csv"
+    pd.DataFrame(ROWS, columns=["Title", "abstractText", "meshMajor"]).to_csv(csv_path, index=False)
+    path = str(tmp_path / "graph.ttl")
+    build_graph(str(csv_path), path)
+    return path
+
+
+def ranked(index, terms, article_uris=None):
+    return [
+        (str(uri), data["title"], data["abstract"], data["datePublished"], data["access"], data["meshTerms"])
+        for uri, data in index.rank([convert_to_uri(term) for term in terms], article_uris, limit=10)
+    ]
+
+
+def test_compiled_index_ranks_like_the_in_memory_index(graph_path):
+    in_memory = MeshTermIndex.from_graph(Graph().parse(graph_path, format="ttl"))
+    compiled = MeshTermIndex.open(compile_mesh_index(graph_path))
+
+    some_articles = [str(uri) for uri in in_memory.article_uris[:2]] + ["http://example.org/article/missing"]
+    for terms in QUERIES:
+        assert ranked(compiled, terms) == ranked(in_memory, terms)
+        assert ranked(compiled, terms, some_articles) == ranked(in_memory, terms, some_articles)
+
+
+def test_opening_a_compiled_index_decodes_only_the_ranked_articles(graph_path, monkeypatch):
+    compile_mesh_index(graph_path)
+    decoded = []
+
+    def counting_decode(data):
+        decoded.append(data)
+        return decode_term(data)
+
+    decode_term = mesh_index.decode_term
+    monkeypatch.setattr(mesh_index, "decode_term", counting_decode)
+    index = MeshTermIndex.open(mesh_index_path_for(graph_path))
+    assert decoded == []
+
+    index.rank([convert_to_uri("Asthma")], limit=1)
+    assert len(decoded) == 5  # URI, title, abstract, date and access of the one ranked article
+
+
+def test_load_mesh_index_uses_the_compiled_index_until_the_graph_changes(graph_path, monkeypatch):
+    compile_snapshot(graph_path)
+    assert os.path.exists(mesh_index_path_for(graph_path))
+
+    def no_graph(*args, **kwargs):
+        raise AssertionError("the graph should not be loaded")
+
+    monkeypatch.setattr(mesh_index, "load_graph", no_graph)
+    assert str(ranked(load_mesh_index(graph_path), ["Asthma"])[0][1]) == "Asthma outcomes in children"
+
+    # A graph changed after compiling falls back to indexing the loaded graph
+    with open(graph_path, "a", encoding="utf-8") as f:
+        f.write("\n")
+    monkeypatch.undo()
+    index = load_mesh_index(graph_path)
+    assert isinstance(index.article_ids, dict)
+    assert str(ranked(index, ["Asthma"])[0][1]) == "Asthma outcomes in children"
+
+
+def test_index_stats_report_how_the_index_was_loaded(graph_path):
+    load_mesh_index(graph_path)
+    assert mesh_index.get_mesh_index_stats()["source"] == "RDF graph"
+
+    compile_mesh_index(graph_path)
+    load_mesh_index(graph_path)
+    assert mesh_index.get_mesh_index_stats() == {
+        "source": "compiled index", "cached": False, "seconds": mesh_index.get_mesh_index_stats()["seconds"]
+    }
+    load_mesh_index(graph_path)
+    assert mesh_index.get_mesh_index_stats()["cached"]
@@ -0,0 +1,65 @@
+import gzip
+
+import pytest
+
+from query_function import mesh_store
+from query_function.mesh_store import MeshVocabularyStore, import_mesh_dump
+
+MESH = "http://id.nlm.nih.gov/mesh/"
+LABEL = "<http://www.w3.org/2000/01/rdf-schema#label>"
+BROADER = "<http://id.nlm.nih.gov/mesh/vocab#broaderDescriptor>"
+CONCEPT = "<http://id.nlm.nih.gov/mesh/vocab#concept>"
+
+TRIPLES = f"""
+<{MESH}D009062> {LABEL} "Mouth Neoplasms"@en .
+<{MESH}D009062> {CONCEPT} <{MESH}M0014252> .
+<{MESH}M0014252> {LABEL} "Mouth Neoplasms"@en .
+<{MESH}D009062> {CONCEPT} <{MESH}M9999999> .
+<{MESH}D005883> {LABEL} "Gingival Neoplasms"@en .
+<{MESH}D005883> {BROADER} <{MESH}D009062> .
+<{MESH}D014062> {LABEL} "Tongue Neoplasms"@en .
+<{MESH}D014062> {BROADER} <{MESH}D009062> .
+<{MESH}D000001> {LABEL} "Calcimycin \\"A23187\\""@en .
+"""
+
+
+@pytest.fixture
+def dump_path(tmp_path):
+    path = tmp_path / "mesh.nt.gz"
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(TRIPLES)
+    return str(path)
+
+
+@pytest.fixture
+def store(dump_path, tmp_path):
+    store_path = str(tmp_path / "mesh.sqlite")
+    import_mesh_dump(dump_path, store_path)
+    store = MeshVocabularyStore(store_path)
+    yield store
+    store.close()
+
+
+def test_import_mesh_dump_counts_relevant_rows(dump_path, tmp_path):
+    counts = import_mesh_dump(dump_path, str(tmp_path / "mesh.sqlite"), batch_size=2)
+
+    assert counts == {"labels": 5, "concepts": 2, "broader": 2}
+    assert not (tmp_path / "mesh.sqlite.tmp").exists()
+
+
+def test_store_answers_expansion_lookups(store):
+    assert store.descriptors("Mouth Neoplasms") == [f"{MESH}D009062", f"{MESH}M0014252"]
+    assert sorted(store.narrower_labels("Mouth Neoplasms")) == ["Gingival Neoplasms", "Tongue Neoplasms"]
+    # Objects without a label come back as "No label", like the SPARQL query's OPTIONAL
+    assert sorted(store.concept_labels("Mouth Neoplasms")) == ["Mouth Neoplasms", "No label"]
+    assert store.descriptors('Calcimycin "A23187"') == [f"{MESH}D000001"]
+
+
+def test_configure_mesh_store_switches_back_to_the_endpoint(store, monkeypatch):
+    monkeypatch.setattr(mesh_store, "_mesh_store", None)
+    monkeypatch.delenv("MESH_STORE_PATH", raising=False)
+
+    assert mesh_store.configure_mesh_store(store.store_path).store_path == store.store_path
+    assert mesh_store.get_mesh_store() is not None
+    assert mesh_store.configure_mesh_store(None) is None
+    assert mesh_store.get_mesh_store() is None
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from query_function import pipeline
+from query_function.ingest import LocalVectorSink, ingest_articles
+from query_function.mesh_index import compile_mesh_index
+from query_function.pipeline import STAGES, GraphRAGPipeline, timing_summary
+from query_function.rdf_build import build_graph
+from query_function.uris import lookup_mesh_term_uri
+from query_function.vector_backends import HashingEmbedder, LocalVectorBackend
+
+ARTICLE_ROWS = [
+    ("Oral cancer in young adults", "Oral cancer incidence in young adults.",
+     "['Mouth Neoplasms', 'Carcinoma, Squamous Cell', 'Humans']"),
+    ("Asthma outcomes in children", "Asthma control and outcomes in children.", "['Asthma', 'Humans', 'Child']"),
+    ("Tongue carcinoma survival", "Survival after tongue carcinoma surgery.",
+     "['Mouth Neoplasms', 'Carcinoma, Squamous Cell']"),
+    ("Smoking and oral lesions", "Oral lesions among smokers.", "['Mouth Neoplasms', 'Smoking', 'Humans']"),
+    ("Childhood smoking exposure", "Second-hand smoking exposure in childhood.", "['Smoking', 'Child', 'Humans']"),
+    ("Gum disease in adults", "Periodontal disease prevalence in adults.", "['Periodontal Diseases', 'Humans']"),
+]
+DELAY = 0.3
+
+
+@pytest.fixture(scope="module")
+def pipeline_data(tmp_path_factory):
+    """A small compiled PubMed graph and a local vector store with its Article and term collections."""
+    directory = tmp_path_factory.mktemp("pipeline")
+    csv_path = str(directory / "articles.csv")
+    pd.DataFrame(ARTICLE_ROWS, columns=["Title", "abstractText", "meshMajor"]).to_csv(csv_path, index=False)
+    rdf_path = str(directory / "graph.ttl")
+    build_graph(csv_path, rdf_path)
+    compile_mesh_index(rdf_path)
+
+    store = str(directory / "store")
+    ingest_articles(csv_path, LocalVectorSink(LocalVectorBackend(embed=HashingEmbedder()), store))
+    return rdf_path, LocalVectorBackend.load(store, embed=HashingEmbedder())
+
+
+@pytest.fixture
+def graphrag(pipeline_data):
+    rdf_path, backend = pipeline_data
+    with GraphRAGPipeline(rdf_path=rdf_path, client=backend, use_summary_cache=False) as graphrag:
+        yield graphrag
+
+
+def test_run_filters_the_search_hits_by_mesh_terms(graphrag):
+    result = graphrag.run("oral cancer", mesh_terms=["Mouth Neoplasms"], limit=6, top_k=2, summarize=False)
+
+    assert result.error is None
+    assert result.mesh_terms == ["Mouth Neoplasms"]
+    assert len(result.article_uris) == 6
+    assert len(result.ranked_articles) == 2
+    term_uri = str(lookup_mesh_term_uri("Mouth Neoplasms"))
+    assert all(term_uri in map(str, data["meshTerms"]) for _, data in result.ranked_articles)
+    assert set(result.timings) == {"search", "index_wait", "rdf_filter", "total"}
+    assert result.timings["total"] >= result.timings["search"] + result.timings["rdf_filter"]
+
+
+def test_run_takes_mesh_terms_from_the_term_search(graphrag):
+    result = graphrag.run("asthma in children", limit=6, top_k=3, summarize=False, term_limit=3)
+
+    assert result.error is None
+    assert 0 < len(result.mesh_terms) <= 3
+    assert result.ranked_articles
+
+
+def test_summarize_stage_is_timed_and_streams_to_on_token(graphrag, monkeypatch):
+    def fake_stream_summary(context, user_query, client=None, timings=None):
+        timings.update(first_token_seconds=0.01, total_seconds=0.02)
+        yield from ("Oral ", "cancer.")
+
+    monkeypatch.setattr(pipeline, "stream_summary", fake_stream_summary)
+    monkeypatch.setattr(pipeline, "pack_abstracts", lambda ranked_articles, max_tokens: {"text": "abstracts"})
+    pieces = []
+
+    result = graphrag.run("oral cancer", mesh_terms=["Mouth Neoplasms"], limit=6, on_token=pieces.append)
+
+    assert result.error is None
+    assert result.summary == "Oral cancer." and not result.summary_cached
+    assert pieces == ["Oral ", "cancer."]
+    assert set(result.timings) == set(STAGES) | {"first_token"}
+
+
+def test_index_load_overlaps_the_search(graphrag, monkeypatch):
+    load_mesh_index, search = pipeline.load_mesh_index, GraphRAGPipeline._search
+
+    def slow_load(path):
+        time.sleep(DELAY)
+        return load_mesh_index(path)
+
+    def slow_search(self, *args):
+        time.sleep(DELAY)
+        return search(self, *args)
+
+    monkeypatch.setattr(pipeline, "load_mesh_index", slow_load)
+    monkeypatch.setattr(GraphRAGPipeline, "_search", slow_search)
+
+    result = graphrag.run("oral cancer", mesh_terms=["Mouth Neoplasms"], summarize=False)
+
+    assert result.error is None
+    assert result.timings["search"] >= DELAY
+    assert result.timings["index_wait"] < DELAY / 2
+    assert result.timings["total"] < 2 * DELAY
+
+
+def test_search_error_is_reported_while_the_index_is_still_loading(graphrag, monkeypatch):
+    release = threading.Event()
+    load_mesh_index = pipeline.load_mesh_index
+
+    def blocked_load(path):
+        release.wait(5)
+        return load_mesh_index(path)
+
+    def failing_search(self, *args):
+        raise ConnectionError("vector store unavailable")
+
+    monkeypatch.setattr(pipeline, "load_mesh_index", blocked_load)
+    monkeypatch.setattr(GraphRAGPipeline, "_search", failing_search)
+
+    start = time.perf_counter()
+    result = graphrag.run("oral cancer", mesh_terms=["Mouth Neoplasms"])
+    seconds = time.perf_counter() - start
+    release.set()
+
+    assert seconds < 1.0  # Returned without waiting for the blocked index load
+    assert result.error == "ConnectionError: vector store unavailable"
+    assert result.ranked_articles == [] and result.summary is None
+    assert set(result.timings) == {"total"}
+
+
+def test_run_batch_returns_results_in_request_order(graphrag):
+    requests = [
+        {"query_text": query, "mesh_terms": terms, "limit": 6, "top_k": 2, "summarize": False}
+        for query, terms in [("oral cancer", ["Mouth Neoplasms"]), ("asthma", ["Asthma"]),
+                             ("smoking", ["Smoking"]), ("gum disease", ["Periodontal Diseases"])] * 3
+    ]
+
+    results = graphrag.run_batch(requests, concurrency=4)
+
+    assert [result.query for result in results] == [request["query_text"] for request in requests]
+    assert all(result.error is None for result in results)
+    for request, result in zip(requests, results):
+        term_uri = str(lookup_mesh_term_uri(request["mesh_terms"][0]))
+        assert result.ranked_articles
+        assert all(term_uri in map(str, data["meshTerms"]) for _, data in result.ranked_articles)
+    summary = timing_summary(results)
+    assert set(summary) == {"search", "index_wait", "rdf_filter", "total"}
+    assert summary["total"]["count"] == len(requests)
+    assert summary["total"]["p50"] <= summary["total"]["p95"] <= summary["total"]["max"]
@@ -0,0 +1,170 @@
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from query_function import rdf_query
+from query_function.rdf_build import build_graph
+from query_function.rdf_query import build_article_filter_query, get_all_narrower_concepts, query_rdf
+from query_function.uris import article_uri
+
+NARROWER = {
+    "Neoplasms": ["Head and Neck Neoplasms", "Digestive System Neoplasms"],
+    "Head and Neck Neoplasms": ["Mouth Neoplasms"],
+    "Digestive System Neoplasms": ["Mouth Neoplasms", "Esophageal Neoplasms"],
+    "Mouth Neoplasms": ["Tongue Neoplasms"],
+}
+LABEL_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"@en')
+
+
+@pytest.fixture
+def sparql_endpoint(monkeypatch, isolated_expansion):
+    """
+    Local stand-in for the MeSH SPARQL endpoint answering narrower-concept queries from NARROWER. Records the
+    labels of each VALUES request and delays answers for the labels in `slow`.
+    """
+    requests = []
+    slow = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)["query"][0]
+            values = next(line for line in query.splitlines() if "VALUES ?label" in line)
+            labels = [json.loads(f'"{label}"') for label in LABEL_PATTERN.findall(values)]
+            requests.append(labels)
+            time.sleep(max([slow.get(label, 0) for label in labels]))
+
+            bindings = [
+                {"label": {"type": "literal", "value": label},
+                 "narrowerConceptLabel": {"type": "literal", "value": child}}
+                for label in labels for child in NARROWER.get(label, [])
+            ]
+            results = {"bindings": bindings}
+            body = json.dumps({"head": {"vars": ["label", "narrowerConceptLabel"]}, "results": results})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/sparql-results+json")
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(rdf_query, "MESH_SPARQL_ENDPOINT", f"http://127.0.0.1:{server.server_port}/sparql")
+    yield requests, slow
+    server.shutdown()
+    server.server_close()
+
+
+def as_sets(concepts):
+    return {term: set(children) for term, children in concepts.items()}
+
+
+def test_breadth_first_expansion_batches_each_level(sparql_endpoint):
+    requests, _ = sparql_endpoint
+
+    concepts = get_all_narrower_concepts("Neoplasms", depth=3)
+
+    assert as_sets(concepts) == {
+        "Neoplasms": {"Head and Neck Neoplasms", "Digestive System Neoplasms"},
+        "Head and Neck Neoplasms": {"Mouth Neoplasms"},
+        "Digestive System Neoplasms": {"Mouth Neoplasms", "Esophageal Neoplasms"},
+        "Mouth Neoplasms": {"Tongue Neoplasms"},
+        "Esophageal Neoplasms": set(),
+    }
+    # One VALUES request per level; "Mouth Neoplasms", reached through two branches, is fetched once
+    assert len(requests) == 3
+    assert requests[0] == ["Neoplasms"]
+    assert sorted(requests[1]) == ["Digestive System Neoplasms", "Head and Neck Neoplasms"]
+    assert sorted(requests[2]) == ["Esophageal Neoplasms", "Mouth Neoplasms"]
+
+
+def test_frontier_is_split_into_chunks_and_cached(sparql_endpoint):
+    requests, _ = sparql_endpoint
+
+    first = get_all_narrower_concepts("Neoplasms", depth=2, chunk_size=1)
+    assert len(requests) == 3
+    assert all(len(labels) == 1 for labels in requests)
+
+    # A second expansion is answered from the expansion cache
+    assert as_sets(get_all_narrower_concepts("Neoplasms", depth=2, chunk_size=1)) == as_sets(first)
+    assert len(requests) == 3
+
+
+def test_time_budget_leaves_out_terms_still_pending(sparql_endpoint):
+    requests, slow = sparql_endpoint
+    slow["Digestive System Neoplasms"] = 2.0
+
+    start = time.perf_counter()
+    concepts = get_all_narrower_concepts("Neoplasms", depth=3, chunk_size=1, time_budget=0.5)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.5
+    assert as_sets(concepts) == {
+        "Neoplasms": {"Head and Neck Neoplasms", "Digestive System Neoplasms"},
+        "Head and Neck Neoplasms": {"Mouth Neoplasms"},
+    }
+    # Expansion stops at the level that ran out of time
+    assert len(requests) == 3
+
+
+ARTICLE_ROWS = [
+    ("Oral cancer in young adults", "abstract 1", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell', 'Humans']"),
+    ("Asthma outcomes in children", "abstract 2", "['Asthma', 'Humans', 'Child']"),
+    ("Tongue carcinoma survival", "abstract 3", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell']"),
+    ("Smoking and oral lesions", "abstract 4", "['Mouth Neoplasms', 'Smoking', 'Humans']"),
+    ("Childhood smoking exposure", "abstract 5", "['Smoking', 'Child', 'Humans']"),
+    ("Gum disease in adults", "abstract 6", "['Periodontal Diseases', 'Humans']"),
+]
+TERM_SELECTIONS = [
+    ["Mouth Neoplasms", "Carcinoma, Squamous Cell"],
+    ["Humans", "Smoking", "Child"],
+    ["Child", "Asthma", "Mouth Neoplasms", "Periodontal Diseases"],
+    ["Not A Term"],
+]
+# A caller's own query: ?abstract is bound to the title, which the lazy pass must not replace
+TITLE_AS_ABSTRACT_QUERY = """
+PREFIX schema: <http://schema.org/>
+PREFIX ex: <http://example.org/>
+
+SELECT ?article ?title ?abstract ?datePublished ?access ?meshTerm
+WHERE {
+  ?article a ex:Article ;
+           schema:name ?title ;
+           schema:name ?abstract ;
+           schema:datePublished ?datePublished ;
+           ex:access ?access ;
+           schema:about ?meshTerm .
+  ?meshTerm a ex:MeSHTerm .
+}
+"""
+
+
+@pytest.fixture
+def article_graph(tmp_path):
+    csv_path = tmp_path / "articles.csv"
+    pd.DataFrame(ARTICLE_ROWS, columns=["Title", "abstractText", "meshMajor"]).to_csv(csv_path, index=False)
+    path = str(tmp_path / "graph.ttl")
+    build_graph(str(csv_path), path)
+    return path
+
+
+@pytest.mark.parametrize("terms", TERM_SELECTIONS)
+@pytest.mark.parametrize("top_k", [2, 10])
+def test_lazy_and_eager_evaluation_rank_and_return_the_same_rows(article_graph, terms, top_k):
+    queries = [
+        build_article_filter_query([article_uri(row[0]) for row in ARTICLE_ROWS]),
+        TITLE_AS_ABSTRACT_QUERY,
+    ]
+    for query in queries:
+        eager = query_rdf(article_graph, query, terms, batched=True, top_k=top_k)
+        lazy = query_rdf(article_graph, query, terms, lazy=True, top_k=top_k)
+
+        assert lazy == eager
+    assert all(data["abstract"] == data["title"] for _, data in lazy)
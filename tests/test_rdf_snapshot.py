@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+from rdflib import Graph, Literal, URIRef
+
+from query_function.rdf_build import build_graph
+from query_function.rdf_query import add_values_clause, build_article_filter_query
+from query_function.rdf_snapshot import (
+    RDFSnapshot,
+    compile_snapshot,
+    load_fresh_snapshot_graph,
+    load_snapshot_graph,
+    snapshot_path_for,
+)
+from query_function.uris import article_uri, convert_to_uri
+
+ROWS = [
+    ("Oral cancer in \"young\" adults", "abstract 1", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell', 'Humans']"),
+    ("Ünïcode asthma outcomes", "abstract 2", "['Asthma', 'Humans']"),
+    ("Tongue carcinoma survival", "abstract 3", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell']"),
+]
+
+MESH_LABEL_QUERY = """
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX ex: <http://example.org/>
+SELECT ?term ?label WHERE { ?term a ex:MeSHTerm ; rdfs:label ?label . }
+"""
+
+
+@pytest.fixture
+def graph_path(tmp_path):
+    csv_path = tmp_path / "articles.csv"
+    pd.DataFrame(ROWS, columns=["Title", "abstractText", "meshMajor"]).to_csv(csv_path, index=False)
+    path = str(tmp_path / "graph.ttl")
+    build_graph(str(csv_path), path)
+    return path
+
+
+def rows(graph, query):
+    return sorted(tuple(row) for row in graph.query(query))
+
+
+def test_snapshot_answers_the_repo_queries_like_the_parsed_file(graph_path):
+    parsed = Graph().parse(graph_path, format="ttl")
+    snapshot = load_snapshot_graph(compile_snapshot(graph_path, mesh_index=False))
+    filter_query = build_article_filter_query([article_uri(row[0]) for row in ROWS[:2]])
+    term_uris = [str(convert_to_uri(term)) for term in ["Mouth Neoplasms", "Asthma"]]
+
+    assert len(snapshot) == len(parsed)
+    for query in (filter_query, add_values_clause(filter_query, "meshTerm", term_uris), MESH_LABEL_QUERY):
+        expected = rows(parsed, query)
+        assert expected
+        assert rows(snapshot, query) == expected
+
+
+def test_snapshot_round_trips_terms_and_rejects_writes(graph_path):
+    snapshot = load_snapshot_graph(compile_snapshot(graph_path, mesh_index=False))
+    title = URIRef("http://schema.org/name")
+
+    assert set(snapshot.objects(URIRef(article_uri(ROWS[1][0])), title)) == set(
+        Graph().parse(graph_path, format="ttl").objects(URIRef(article_uri(ROWS[1][0])), title)
+    )
+    assert list(snapshot.triples((URIRef("http://example.org/missing"), None, None))) == []
+    with pytest.raises(TypeError):
+        snapshot.add((URIRef("http://example.org/a"), title, Literal("b")))
+
+
+def test_snapshot_is_stale_once_the_source_changes(graph_path):
+    compile_snapshot(graph_path, mesh_index=False)
+    assert RDFSnapshot(snapshot_path_for(graph_path)).is_fresh(graph_path)
+    assert load_fresh_snapshot_graph(graph_path) is not None
+
+    with open(graph_path, "a", encoding="utf-8") as f:
+        f.write("\n")
+
+    assert not RDFSnapshot(snapshot_path_for(graph_path)).is_fresh(graph_path)
+    assert load_fresh_snapshot_graph(graph_path) is None
+
+
+@pytest.mark.parametrize("content", [b"", b"RDFS", b"NOTASNAPSHOT" + b"\x00" * 64])
+def test_unreadable_snapshot_is_ignored(graph_path, capsys, content):
+    with open(snapshot_path_for(graph_path), "wb") as f:
+        f.write(content)
+
+    assert load_fresh_snapshot_graph(graph_path) is None
+    assert "Ignoring unreadable RDF snapshot" in capsys.readouterr().out
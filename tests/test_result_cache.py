@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from query_function import result_cache
+from query_function.ingest import LocalVectorSink, ingest_articles
+from query_function.result_cache import CollectionEpochs, SearchResultCache
+from query_function.vector_backends import HashingEmbedder, LocalVectorBackend
+
+RESULTS = [{"uuid": "1", "properties": {"title": "Oral cancer"}, "distance": 0.1}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    return clock
+
+
+def test_key_normalizes_the_query_text():
+    key = SearchResultCache.key("Article", "oral cancer", 10)
+
+    assert SearchResultCache.key("Article", "  Oral   Cancer ", 10) == key
+    assert SearchResultCache.key("Article", "oral cancer", 20) != key
+
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    cache = SearchResultCache(CollectionEpochs(str(tmp_path / "epochs.json")), ttl=60)
+    key = SearchResultCache.key("Article", "oral cancer", 10)
+    cache.set(key, RESULTS)
+
+    clock.now += 59
+    assert cache.get(key) == RESULTS
+    clock.now += 2
+    assert cache.get(key) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = SearchResultCache(CollectionEpochs(str(tmp_path / "epochs.json")), maxsize=2)
+    keys = [SearchResultCache.key("Article", query, 10) for query in ("a", "b", "c")]
+    cache.set(keys[0], RESULTS)
+    cache.set(keys[1], RESULTS)
+    cache.get(keys[0])
+    cache.set(keys[2], RESULTS)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == RESULTS
+
+
+def test_bump_from_another_process_is_seen_through_the_file(tmp_path):
+    path = str(tmp_path / "epochs.json")
+    cache = SearchResultCache(CollectionEpochs(path))
+    key = SearchResultCache.key("term", "asthma", 10)
+    cache.set(key, RESULTS)
+
+    CollectionEpochs(path).bump("term")
+
+    assert cache.get(key) is None
+    assert cache.stats()["stale_evictions"] == 1
+
+
+def test_ingestion_invalidates_cached_searches_of_the_loaded_collections(tmp_path):
+    cache = SearchResultCache(result_cache._collection_epochs)  # The epochs ingestion bumps (see conftest)
+    article_key = SearchResultCache.key("Article", "oral cancer", 10)
+    term_key = SearchResultCache.key("term", "oral cancer", 10)
+    other_key = SearchResultCache.key("Other", "oral cancer", 10)
+    for key in (article_key, term_key, other_key):
+        cache.set(key, RESULTS)
+
+    csv_path = tmp_path / "articles.csv"
+    pd.DataFrame([("A study", "abstract", "['Humans']")], columns=["Title", "abstractText", "meshMajor"]).to_csv(
+        csv_path, index=False
+    )
+    ingest_articles(str(csv_path), LocalVectorSink(LocalVectorBackend(embed=HashingEmbedder(dim=32)),
+                                                   str(tmp_path / "vectors")))
+
+    assert cache.get(article_key) is None
+    assert cache.get(term_key) is None
+    assert cache.get(other_key) == RESULTS
+    assert cache.stats()["stale_evictions"] == 2
@@ -0,0 +1,143 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from openai import OpenAI
+
+from query_function import summarize
+from query_function.summarize import generate_summary, pack_abstracts, stream_summary
+
+
+class WordEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per whitespace-separated word."""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(summarize, "get_encoding", lambda model=None: WordEncoding())
+
+
+def article(title, words):
+    return f"http://example.org/article/{title}", {"title": title, "abstract": " ".join(["word"] * words)}
+
+
+def test_pack_abstracts_empty_list():
+    packed = pack_abstracts([], max_tokens=100)
+
+    assert packed == {"text": "", "tokens": 0, "articles": 0, "truncated": False, "total": 0}
+
+
+def test_pack_abstracts_single_abstract_over_budget_is_cut_to_fit():
+    packed = pack_abstracts([article("A", 200)], max_tokens=50)
+
+    assert packed["articles"] == 1
+    assert packed["truncated"]
+    assert packed["tokens"] == 50
+    assert len(packed["text"].split()) == 50
+
+
+def test_pack_abstracts_exact_fit_keeps_every_article_whole():
+    articles = [article("A", 8), article("B", 8)]  # "Title: A Abstract:" adds 3 tokens, the separator 0
+
+    packed = pack_abstracts(articles, max_tokens=22)
+
+    assert packed["articles"] == 2
+    assert not packed["truncated"]
+    assert packed["tokens"] == 22
+    assert packed["text"] == " ".join(summarize.article_text(data) for _, data in articles)
+
+
+def test_pack_abstracts_stops_in_rank_order_when_the_rest_is_too_small_to_cut():
+    packed = pack_abstracts([article("A", 30), article("B", 30), article("C", 1)], max_tokens=40)
+
+    assert packed["articles"] == 1
+    assert packed["text"].startswith("Title: A ")
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingClient:
+    def __init__(self, chunks):
+        self.stream = FakeStream(chunks)
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        self.requests.append(request)
+        return self.stream
+
+
+def test_stream_summary_yields_chunks_in_order():
+    client = FakeStreamingClient([chunk("- one"), SimpleNamespace(choices=[]), chunk(None), chunk("\n- two")])
+    timings = {}
+
+    pieces = list(stream_summary("Title: A Abstract: text", "Summarize", client=client, timings=timings))
+
+    assert "".join(pieces) == "- one\n- two"
+    assert client.requests[0]["stream"] is True
+    assert client.requests[0]["messages"][1]["content"] == "Summarize\n\nTitle: A Abstract: text"
+    assert client.stream.closed
+    assert set(timings) == {"first_token_seconds", "total_seconds"}
+
+
+@pytest.fixture
+def completion_server():
+    """Local stand-in for the chat completions endpoint, streaming a fixed answer as server-sent events."""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            requests.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in ["Short ", "lay ", "summary."]:
+                event = {
+                    "id": "1", "object": "chat.completion.chunk", "created": 0, "model": "stand-in",
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/v1", requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_summary_against_stand_in_server(completion_server):
+    base_url, requests = completion_server
+    client = OpenAI(api_key="test", base_url=base_url, max_retries=0)
+
+    summary = generate_summary("Title: A Abstract: text", "Summarize", client=client)
+
+    assert summary == "Short lay summary."
+    assert requests[0]["stream"] is True
+    assert requests[0]["model"] == summarize.DEFAULT_MODEL
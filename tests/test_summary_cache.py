@@ -0,0 +1,62 @@
+import pytest
+
+from query_function import summary_cache
+from query_function.summary_cache import SummaryCache, summary_key
+
+URIS = ["http://example.org/article/A", "http://example.org/article/B"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(summary_cache.time, "time", clock)
+    return clock
+
+
+def test_summary_key_covers_everything_that_determines_the_summary():
+    key = summary_key(URIS, "Summarize", "gpt-4o-mini", "Title: A Abstract: text")
+
+    assert summary_key(URIS, "  Summarize\n", "gpt-4o-mini", "Title: A Abstract: text") == key
+    assert summary_key(URIS[::-1], "Summarize", "gpt-4o-mini", "Title: A Abstract: text") != key
+    assert summary_key(URIS[:1], "Summarize", "gpt-4o-mini", "Title: A Abstract: text") != key
+    assert summary_key(URIS, "Summarize briefly", "gpt-4o-mini", "Title: A Abstract: text") != key
+    assert summary_key(URIS, "Summarize", "gpt-4o", "Title: A Abstract: text") != key
+    assert summary_key(URIS, "Summarize", "gpt-4o-mini", "Title: A Abstract: new text") != key
+
+
+def test_least_recently_used_summary_is_evicted(clock, tmp_path):
+    cache = SummaryCache(str(tmp_path / "summaries.sqlite"), maxsize=2)
+    for name in ["a", "b"]:
+        clock.now += 1
+        cache.set(name, f"summary {name}", 1.0)
+    clock.now += 1
+    assert cache.get("a")["summary"] == "summary a"  # a becomes the most recently used
+
+    clock.now += 1
+    cache.set("c", "summary c", 1.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a")["summary"] == "summary a"
+    assert cache.stats()["entries"] == 2
+
+
+def test_summaries_persist_across_reopen(tmp_path):
+    path = str(tmp_path / "summaries.sqlite")
+    SummaryCache(path).set("key", "- one\n- two", 2.5, model="gpt-4o-mini")
+
+    reopened = SummaryCache(path)
+    cached = reopened.get("key")
+    reopened.get("missing")
+
+    assert cached["summary"] == "- one\n- two"
+    assert cached["generation_seconds"] == 2.5
+    stats = reopened.stats()
+    assert (stats["hits"], stats["misses"], stats["seconds_saved"]) == (1, 1, 2.5)
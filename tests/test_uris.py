@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from rdflib import RDF, Graph, URIRef
+
+from query_function import uris
+from query_function.ingest import LocalVectorSink, ingest_articles
+from query_function.pubmed_csv import parse_mesh_major_column
+from query_function.rdf_build import MeshTermURIs, build_graph
+from query_function.rdf_query import convert_to_uri, query_rdf_index
+from query_function.uris import TermURITable, article_uri, article_uris, check_consistency, lookup_mesh_term_uri
+from query_function.vector_backends import HashingEmbedder, LocalVectorBackend
+
+ROWS = [
+    ("Oral cancer in \"young\" adults", "abstract 1", "['Mouth Neoplasms', 'Carcinoma, Squamous Cell', 'Humans']"),
+    ("Children's <b>asthma</b> outcomes", "abstract 2", "[\"Alzheimer's Disease\", 'Asthma', 'Humans']"),
+    ("Ünïcode  title: a/b test ", "abstract 3", "['Tumor Necrosis Factor-alpha', 'Aged, 80 and over']"),
+]
+
+
+@pytest.fixture
+def fixture_csv(tmp_path):
+    path = tmp_path / "articles.csv"
+    pd.DataFrame(ROWS, columns=["Title", "abstractText", "meshMajor"]).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def term_table(tmp_path, monkeypatch):
+    table = TermURITable(str(tmp_path / "term_uris.sqlite"))
+    monkeypatch.setattr(uris, "_term_uri_table", table)  # What lookup_mesh_term_uri reads on the query path
+    yield table
+    table.close()
+
+
+def fixture_terms():
+    return sorted(set(parse_mesh_major_column(pd.Series([row[2] for row in ROWS])).explode()))
+
+
+def test_vectorized_article_uris_match_single_title_minting():
+    titles = pd.Series([row[0] for row in ROWS])
+
+    assert article_uris(titles).tolist() == [article_uri(title) for title in titles]
+
+
+def test_ingest_and_query_sides_mint_identical_term_uris(fixture_csv, tmp_path, term_table):
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=32))
+    ingest_articles(fixture_csv, LocalVectorSink(backend, str(tmp_path / "vectors")), term_uri_table=term_table)
+    ingest_side = MeshTermURIs()
+
+    for term in fixture_terms():
+        expected = ingest_side[term]
+        assert term_table.get(term) == expected
+        assert convert_to_uri(term) == URIRef(expected)
+        assert lookup_mesh_term_uri(term) == URIRef(expected)
+
+    ingested = {props["article_URI"] for props in backend.collections["Article"].properties}
+    assert ingested == {article_uri(row[0]) for row in ROWS}
+
+
+def test_graph_built_at_ingest_time_answers_query_side_lookups(fixture_csv, tmp_path, term_table):
+    graph_path = str(tmp_path / "graph.ttl")
+    build_graph(fixture_csv, graph_path, term_uri_table=term_table)
+    graph = Graph().parse(graph_path, format="ttl")
+
+    articles = {str(subject) for subject in graph.subjects(RDF.type, URIRef("http://example.org/Article"))}
+    assert articles == {article_uri(row[0]) for row in ROWS}
+
+    ranked = query_rdf_index(graph_path, sorted(articles), ["Carcinoma, Squamous Cell", "Alzheimer's Disease"])
+    assert sorted(str(uri) for uri, _ in ranked) == sorted([article_uri(ROWS[0][0]), article_uri(ROWS[1][0])])
+
+
+def test_check_consistency_uses_the_given_table(fixture_csv, tmp_path, term_table, monkeypatch):
+    build_graph(fixture_csv, str(tmp_path / "graph.ttl"), term_uri_table=term_table)
+    assert check_consistency(term_table, fixture_csv) == []
+
+    other = TermURITable(str(tmp_path / "other.sqlite"))
+    other.add({"Humans": "http://example.org/mesh/_Wrong_"})
+    mismatches = check_consistency(other, fixture_csv)
+    # The table configured for the query path must not leak into the check of another table
+    monkeypatch.setattr(uris, "_term_uri_table", other)
+    assert check_consistency(term_table, fixture_csv) == []
+    other.close()
+
+    assert {(kind, term) for kind, term, _, _ in mismatches} == {("term", "Humans"), ("lookup", "Humans")}
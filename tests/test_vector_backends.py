@@ -0,0 +1,181 @@
+import random
+import uuid
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from query_function.article_filter import ArticleFilter
+from query_function.ingest import LocalVectorSink, ingest_articles
+from query_function.vector_backends import HashingEmbedder, LocalCollection, LocalVectorBackend
+
+MESH_TERMS = [
+    "Humans", "Female", "Male", "Adult", "Aged", "Child", "Mouth Neoplasms", "Carcinoma, Squamous Cell", "Asthma",
+    "Diabetes Mellitus, Type 2", "Hypertension", "Obesity", "Smoking", "Breast Neoplasms", "Alzheimer Disease",
+    "Stroke", "Depression", "Pregnancy", "Infant, Newborn", "Tuberculosis", "Malaria", "HIV Infections",
+    "Influenza, Human", "Sepsis", "Myocardial Infarction", "Heart Failure", "Kidney Diseases", "Liver Cirrhosis",
+    "Osteoporosis", "Parkinson Disease",
+]
+TOPIC_WORDS = [
+    "cancer", "tumor", "therapy", "outcomes", "risk", "cohort", "trial", "treatment", "diagnosis", "screening",
+    "inflammation", "genetic", "expression", "survival", "prevalence", "children", "elderly", "women", "patients",
+    "mortality", "biomarker", "imaging", "surgery", "vaccine", "infection", "metabolic", "cardiac", "renal",
+    "neural", "oral",
+]
+ARTICLE_PROPERTIES = {"title", "abstractText", "article_URI", "meshMajor", "datePublished"}
+
+
+def test_upsert_keeps_last_copy_of_uuid_repeated_in_batch():
+    collection = LocalCollection()
+    object_uuid = uuid.uuid4()
+    vectors = np.eye(3, dtype=np.float32)
+
+    collection.upsert([object_uuid, uuid.uuid4(), object_uuid], [{"n": 1}, {"n": 2}, {"n": 3}], vectors)
+
+    assert len(collection) == 2
+    position = collection.uuids.index(object_uuid)
+    assert collection.properties[position] == {"n": 3}
+    np.testing.assert_allclose(collection.vectors[position], vectors[2])
+
+
+def test_upsert_replaces_existing_object():
+    collection = LocalCollection()
+    object_uuid = uuid.uuid4()
+    collection.upsert([object_uuid], [{"n": 1}], np.eye(2, dtype=np.float32)[:1])
+    collection.upsert([object_uuid, object_uuid], [{"n": 2}, {"n": 3}], np.eye(2, dtype=np.float32))
+
+    assert len(collection) == 1
+    assert collection.properties == [{"n": 3}]
+
+
+def test_local_backend_saves_and_loads_batch_with_duplicate_uuids(tmp_path):
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=64))
+    object_uuid = uuid.uuid4()
+    backend.upsert("Article", [object_uuid, object_uuid], [{"title": "old study"}, {"title": "oral cancer"}])
+    backend.save(str(tmp_path))
+
+    results = LocalVectorBackend.load(str(tmp_path), embed=HashingEmbedder(dim=64)).search(
+        "Article", "oral cancer", limit=5
+    )
+
+    assert [result["properties"]["title"] for result in results] == ["oral cancer"]
+
+
+@pytest.fixture(scope="module")
+def pubmed_backend(tmp_path_factory):
+    """
+    Local backend loaded with a 1,000-article PubMed-shaped subset (Title, abstractText and a meshMajor list
+    string, like the CSV the notebook ingests), ingested and saved through the regular pipeline.
+    """
+    rng = random.Random(0)
+    rows = []
+    for i in range(1000):
+        words = rng.sample(TOPIC_WORDS, 4)
+        terms = rng.sample(MESH_TERMS, rng.randint(2, 5))
+        rows.append((
+            f"{words[0].capitalize()} {words[1]} in {terms[0].lower()} study {i}",
+            " ".join(rng.choice(TOPIC_WORDS) for _ in range(40)) + f" {' '.join(words)}",
+            str(terms),
+        ))
+    rows[123] = ("Zygomycosis outbreak after a hurricane", "Rare zygomycosis fungal infection cluster.", "['Humans']")
+
+    directory = tmp_path_factory.mktemp("pubmed")
+    csv_path = directory / "PubMed_subset.csv"
+    pd.DataFrame(rows, columns=["Title", "abstractText", "meshMajor"]).to_csv(csv_path, index=False)
+    ingest_articles(str(csv_path), LocalVectorSink(LocalVectorBackend(embed=HashingEmbedder()), str(directory)),
+                    include_terms=False)
+    return LocalVectorBackend.load(str(directory), embed=HashingEmbedder())
+
+
+def queries():
+    rng = random.Random(1)
+    return [" ".join(rng.sample(TOPIC_WORDS, 3)) for _ in range(20)]
+
+
+def test_search_results_have_the_weaviate_result_shape(pubmed_backend):
+    results = pubmed_backend.search("Article", "oral cancer survival", limit=10)
+
+    assert len(results) == 10
+    for result in results:
+        assert set(result) == {"uuid", "properties", "distance", "score"}
+        assert isinstance(result["uuid"], uuid.UUID)
+        assert set(result["properties"]) == ARTICLE_PROPERTIES
+        assert 0.0 <= result["distance"] <= 2.0
+        assert result["score"] is None
+    distances = [result["distance"] for result in results]
+    assert distances == sorted(distances)
+
+
+def test_distance_is_cosine_distance_to_the_query(pubmed_backend):
+    query_vector = HashingEmbedder()(["cardiac surgery outcomes"])[0]
+    collection = pubmed_backend.collections["Article"]
+
+    for result in pubmed_backend.search("Article", "cardiac surgery outcomes", limit=5):
+        position = collection.uuids.index(result["uuid"])
+        assert result["distance"] == pytest.approx(1.0 - float(collection.vectors[position] @ query_vector), abs=1e-5)
+
+
+def test_ivf_search_recalls_the_exhaustive_neighbours(pubmed_backend):
+    indexed = pubmed_backend.collections["Article"]
+    exhaustive = LocalCollection(indexed.vectors, indexed.uuids, indexed.properties)
+    assert indexed.centroids is not None and exhaustive.centroids is None
+
+    embed = HashingEmbedder()
+    recall = {}
+    for n_probe in (8, 16, len(indexed.lists)):
+        found = expected = 0
+        for query in queries():
+            vector = embed([query])[0]
+            truth = {result["uuid"] for result in exhaustive.search_vector(vector, limit=10)}
+            approximate = indexed.search_vector(vector, limit=10, n_probe=n_probe)
+            found += len(truth & {result["uuid"] for result in approximate})
+            expected += len(truth)
+        recall[n_probe] = found / expected
+
+    # Synthetic abstracts barely cluster, so this is a floor; probing every list is exhaustive
+    assert recall[8] >= 0.7
+    assert recall[16] >= 0.9
+    assert recall[len(indexed.lists)] == 1.0
+
+
+def test_bm25_ranks_the_article_with_a_rare_term_first(pubmed_backend):
+    results = pubmed_backend.search("Article", "zygomycosis", limit=5, alpha=0.0)
+
+    assert results[0]["properties"]["title"] == "Zygomycosis outbreak after a hurricane"
+    assert results[0]["score"] == pytest.approx(1.0)
+    assert len(results) == 1  # No other article mentions the term
+    assert pubmed_backend.collections["Article"].keyword_scores("zygomycosis").astype(bool).sum() == 1
+
+
+def test_hybrid_scores_fuse_vector_and_keyword_ranks(pubmed_backend):
+    query = "renal infection mortality"
+    vector_only = pubmed_backend.search("Article", query, limit=10, alpha=1.0)
+    hybrid = pubmed_backend.search("Article", query, limit=10, alpha=0.5)
+
+    assert [result["uuid"] for result in vector_only] == [
+        result["uuid"] for result in pubmed_backend.search("Article", query, limit=10)
+    ]
+    scores = [result["score"] for result in hybrid]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.0 <= score <= 1.0 for score in scores)
+    assert set(hybrid[0]) == {"uuid", "properties", "distance", "score"}
+
+
+def test_filters_are_applied_before_ranking(pubmed_backend):
+    mesh_filter = ArticleFilter(mesh_terms=("Tuberculosis",))
+    results = pubmed_backend.search("Article", "oral cancer survival", limit=20, filters=mesh_filter)
+
+    assert len(results) == 20
+    assert all("'Tuberculosis'" in result["properties"]["meshMajor"] for result in results)
+
+    both = ArticleFilter(mesh_terms=("Tuberculosis", "Malaria", "Sepsis"), match_all=True)
+    expected = sum(both.matches(props) for props in pubmed_backend.collections["Article"].properties)
+    # Fewer matches than the limit: every matching article is returned, not just those in the probed lists
+    assert 0 < expected < 50
+    assert len(pubmed_backend.search("Article", "cancer", limit=50, filters=both)) == expected
+    assert len(pubmed_backend.search("Article", "cancer", limit=50, alpha=0.5, filters=both)) == expected
+
+    cutoff = date(2022, 1, 1)
+    dated = pubmed_backend.search("Article", "cancer", limit=30, filters=ArticleFilter(published_after=cutoff))
+    assert dated and all(result["properties"]["datePublished"][:10] >= cutoff.isoformat() for result in dated)
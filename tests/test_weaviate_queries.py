@@ -0,0 +1,174 @@
+import asyncio
+import time
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from query_function import weaviate_queries
+from query_function.embedding_cache import QueryEmbeddingCache
+from query_function.vector_backends import HashingEmbedder, LocalVectorBackend
+from query_function.weaviate_queries import (
+    _async_search_collection,
+    collection_property_names,
+    query_weaviate_articles,
+    query_weaviate_both,
+)
+
+
+def openai_sized_embedder(texts):
+    return np.ones((len(texts), 1536), dtype=np.float32)
+
+
+def test_local_backend_search_ignores_shared_embedding_cache():
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=64))
+    backend.upsert("Article", [uuid.uuid4(), uuid.uuid4()], [{"title": "oral cancer"}, {"title": "heart disease"}])
+    embedding_cache = QueryEmbeddingCache(openai_sized_embedder)
+
+    results = query_weaviate_articles(backend, "oral cancer", limit=1, embedding_cache=embedding_cache,
+                                      use_cache=False)
+
+    assert results[0]["properties"]["title"] == "oral cancer"
+    assert embedding_cache.stats()["misses"] == 0
+
+
+class SlowEmbedder:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def __call__(self, texts):
+        time.sleep(self.delay)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeAsyncQuery:
+    async def near_vector(self, near_vector, **options):
+        return SimpleNamespace(objects=[
+            SimpleNamespace(uuid=uuid.uuid4(), properties={"title": "t"},
+                            metadata=SimpleNamespace(distance=0.1, score=None))
+        ])
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.collections = SimpleNamespace(get=lambda name: SimpleNamespace(query=FakeAsyncQuery()))
+
+
+def test_async_searches_embed_concurrently_off_the_event_loop():
+    embedding_cache = QueryEmbeddingCache(SlowEmbedder(0.3))
+    client = FakeAsyncClient()
+
+    async def search_both():
+        return await asyncio.gather(
+            _async_search_collection(client, "Article", "oral cancer", 5, embedding_cache),
+            _async_search_collection(client, "term", "heart disease", 5, embedding_cache),
+        )
+
+    start = time.perf_counter()
+    article_results, term_results = asyncio.run(search_both())
+
+    assert len(article_results) == len(term_results) == 1
+    assert time.perf_counter() - start < 0.55  # Two 0.3s embeddings overlapped instead of running in turn
+
+
+class FakeSchemaClient:
+    """Weaviate client stand-in whose Article schema is the notebook's: no datePublished property."""
+
+    def __init__(self):
+        self.schema_requests = 0
+        config = SimpleNamespace(get=self.get_config)
+        self.collections = SimpleNamespace(get=lambda name: SimpleNamespace(config=config))
+
+    def get_config(self):
+        self.schema_requests += 1
+        names = ["title", "abstractText", "article_URI", "meshMajor"]
+        return SimpleNamespace(properties=[SimpleNamespace(name=name) for name in names])
+
+
+def test_collection_property_names_reads_the_schema_once_per_ttl():
+    client = FakeSchemaClient()
+
+    assert "datePublished" not in collection_property_names(client, "Article", ttl=0)
+    assert "meshMajor" in collection_property_names(client, "Article")  # The first answer expired at once
+    assert client.schema_requests == 2
+    collection_property_names(client, "Article")
+    assert client.schema_requests == 2
+
+
+def test_collection_property_names_of_a_local_backend():
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=64))
+    backend.upsert("Article", [uuid.uuid4(), uuid.uuid4()], [
+        {"title": "oral cancer"}, {"title": "heart disease", "datePublished": "2021-03-04T00:00:00Z"}
+    ])
+
+    assert collection_property_names(backend, "Article") == {"title", "datePublished"}
+    assert collection_property_names(backend, "term") == frozenset()
+
+
+def test_search_both_limits_terms_separately_on_a_local_backend():
+    backend = LocalVectorBackend(embed=HashingEmbedder(dim=64))
+    backend.upsert("Article", [uuid.uuid4() for _ in range(30)], [{"title": f"study {i}"} for i in range(30)])
+    backend.upsert("term", [uuid.uuid4() for _ in range(30)], [{"meshTerm": f"term {i}"} for i in range(30)])
+
+    articles, terms = query_weaviate_both("study", limit=25, client=backend)
+
+    assert len(articles) == 25
+    assert len(terms) == 10
+    assert len(query_weaviate_both("study", limit=25, client=backend, term_limit=3)[1]) == 3
+
+
+class FakeSyncQuery:
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def near_text(self, query, limit, **options):
+        self.calls.append((self.name, limit))
+        return SimpleNamespace(objects=[
+            SimpleNamespace(uuid=uuid.uuid4(), properties={"title": "t", "meshTerm": "m"},
+                            metadata=SimpleNamespace(distance=0.1, score=None))
+            for _ in range(limit)
+        ])
+
+
+class FakeSyncClient:
+    def __init__(self):
+        self.calls = []
+        self.collections = SimpleNamespace(
+            get=lambda name: SimpleNamespace(query=FakeSyncQuery(name, self.calls))
+        )
+
+
+def test_search_both_runs_on_a_passed_sync_client(monkeypatch):
+    def no_async_client(*args, **kwargs):
+        raise AssertionError("the shared async client should not be used")
+
+    monkeypatch.setattr(weaviate_queries._async_runner, "run", no_async_client)
+    client = FakeSyncClient()
+
+    articles, terms = query_weaviate_both("oral cancer", limit=50, client=client, use_cache=False, term_limit=4)
+
+    assert (len(articles), len(terms)) == (50, 4)
+    assert sorted(client.calls) == [("Article", 50), ("term", 4)]
+
+
+@pytest.mark.parametrize("term_limit", [None, 7])
+def test_async_search_both_passes_the_term_limit(term_limit):
+    limits = {}
+
+    class RecordingQuery:
+        def __init__(self, name):
+            self.name = name
+
+        async def near_text(self, query, limit, **options):
+            limits[self.name] = limit
+            return SimpleNamespace(objects=[])
+
+    collections = SimpleNamespace(get=lambda name: SimpleNamespace(query=RecordingQuery(name)))
+    client = SimpleNamespace(collections=collections)
+    options = {} if term_limit is None else {"term_limit": term_limit}
+
+    asyncio.run(weaviate_queries.async_query_weaviate_both(client, "oral cancer", 50, use_cache=False, **options))
+
+    assert limits == {"Article": 50, "term": term_limit or 10}